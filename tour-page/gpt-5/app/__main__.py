@@ -1,5 +1,34 @@
-from .main import _cli
+import sys
 
 
+# python -m app [--days ...]            sample itinerary (see main._cli)
+# python -m app compile-catalog [...]   places.json -> compiled columnar catalog
+# python -m app import-catalog [...]    places.json <-> SQLite catalog with R-tree
+# python -m app ingest SOURCE [...]     stream CSV/GeoJSON/JSON lines into the catalog as a diff
+# python -m app serve [--workers N]      API server, catalog shared across workers
+# python -m app build-static [--out ...] hashed, precompressed SPA assets (app/build)
 if __name__ == "__main__":
-    _cli()
+    if len(sys.argv) > 1 and sys.argv[1] == "compile-catalog":
+        from .compiled import _cli as compile_cli
+
+        compile_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "import-catalog":
+        from .store import _cli as import_cli
+
+        import_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        from .ingest import _cli as ingest_cli
+
+        ingest_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "build-static":
+        from .assets import _cli as build_static_cli
+
+        build_static_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from .prefork import _cli as serve_cli
+
+        serve_cli(sys.argv[2:])
+    else:
+        from .main import _cli
+
+        _cli()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from itertools import combinations, permutations
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .routing import _Deadline, greedy_path
+
+if TYPE_CHECKING:
+    from .indexes import CityEntry, PlaceView
+    from .records import PlaceRecord
+    from .travel import TravelTable
+
+
+# Search space limits: the best-ranked cities, each with its best candidates
+MAX_CITIES = 16
+MAX_CANDIDATES = 8
+# Deterministic bound on the branch-and-bound search; budget_ms is only a safety net
+MAX_NODES = 20_000
+
+LUNCH_MINUTES = 60
+
+# Objective: place value minus small penalties, so equal-value plans prefer cheaper, shorter days
+COST_WEIGHT = 0.001  # per rouble
+TIME_WEIGHT = 0.01  # per minute
+
+
+def place_value(p: "PlaceRecord") -> float:
+    # Mirrors place_score: indoor and few stairs are worth more to the 55+ audience
+    return 100.0 - (0.0 if p.indoor else 20.0) - 10.0 * p.stairs_level
+
+
+@dataclass(frozen=True)
+class DayOption:
+    city: str
+    picks: Tuple[int, ...]  # indexes into the city's candidates
+    minutes: int  # travel + visits + lunch, estimated with the shortest visiting order
+    cost_rub: int  # visits + meals + round-trip transport
+    objective: float
+
+
+@dataclass
+class Allocation:
+    days: List[DayOption]  # trip order: city ranking, then candidate order
+    objective: float
+    cost_rub: int
+    nodes: int
+    optimal: bool  # the search finished instead of hitting MAX_NODES or the time budget
+    solve_ms: float
+
+
+def _shortest_minutes(idx: Sequence[int], inner: Sequence[Sequence[int]], back: Sequence[int]) -> int:
+    # Node 0 is the city center; inner legs and the way back to the origin in the profile's minutes
+    if len(idx) <= 4:
+        orders: Iterable[Sequence[int]] = permutations(idx)
+    else:
+        sub = [[inner[a][b] for b in (0, *idx, 0)] for a in (0, *idx)]
+        orders = [[idx[i - 1] for i in greedy_path(sub, len(idx))[1:-1]]]
+    best: Optional[int] = None
+    for order in orders:
+        total, prev = 0, 0
+        for node in order:
+            total += inner[prev][node]
+            prev = node
+        total += back[prev]
+        if best is None or total < best:
+            best = total
+    return best or 0
+
+
+def day_options(
+    view: "PlaceView",
+    entry: "CityEntry",
+    travel: "TravelTable",
+    per_day: int,
+    day_minutes: int,
+    meals_rub: int,
+    transport_rub: int,
+) -> List[DayOption]:
+    """Every subset of the city's best candidates that fits into one day."""
+    cands = entry.candidates[:MAX_CANDIDATES]
+    # Leg minutes come from the travel table; subsets below only add them up
+    _, minutes = travel.day_matrix(view, entry, range(len(cands)))
+    end_node = len(cands) + 1
+    inner = [row[:end_node] for row in minutes[:end_node]]
+    back = [row[end_node] for row in minutes[:end_node]]
+    to_city = minutes[end_node][0]
+    values = [place_value(p) for p in cands]
+    options: List[DayOption] = []
+    for size in range(1, min(per_day, len(cands)) + 1):
+        for picks in combinations(range(len(cands)), size):
+            visits = sum(cands[i].avg_visit_minutes for i in picks)
+            lunch = LUNCH_MINUTES if size >= 2 else 0
+            minutes = to_city + visits + lunch + _shortest_minutes([i + 1 for i in picks], inner, back)
+            if minutes > day_minutes:
+                continue
+            cost = sum(cands[i].cost_rub for i in picks) + meals_rub + transport_rub
+            objective = sum(values[i] for i in picks) - COST_WEIGHT * cost - TIME_WEIGHT * minutes
+            options.append(DayOption(entry.city, picks, minutes, cost, objective))
+    return options
+
+
+def allocate(
+    view: "PlaceView",
+    days: int,
+    travel: "TravelTable",
+    per_day: int,
+    day_minutes: int,
+    trip_budget_rub: Optional[int],
+    meals_rub: int,
+    transport_rub: Callable[[float], int],
+    seed: int | str = 0,
+    budget_ms: float = 50.0,
+) -> Allocation:
+    """Assign places to days under a per-day time limit and a total trip budget.
+
+    Day options (a city and a subset of its best places that fits into
+    day_minutes) are generated up front; branch and bound then picks up to
+    ``days`` of them with disjoint places and a total cost within
+    trip_budget_rub, maximizing the summed objective. Options are explored
+    best first, so the first descent is the greedy solution and the search
+    can stop at any point with a feasible plan. Ties are ordered by seed.
+    """
+    t0 = time.perf_counter()
+    rank = {city: i for i, (city, _, _) in enumerate(view.ranked)}
+    options: List[DayOption] = []
+    for city, _, _ in view.ranked[: max(MAX_CITIES, days)]:
+        entry = view.cities[city]
+        options.extend(
+            day_options(view, entry, travel, per_day, day_minutes, meals_rub, transport_rub(entry.dist_origin_km) * 2)
+        )
+    r = random.Random(seed)
+    tiebreak = [r.random() for _ in options]
+    order = sorted(range(len(options)), key=lambda i: (-options[i].objective, tiebreak[i]))
+    options = [options[i] for i in order]
+
+    n = len(options)
+    prefix = [0.0]
+    for o in options:
+        prefix.append(prefix[-1] + o.objective)
+    budget = float("inf") if trip_budget_rub is None else trip_budget_rub
+    deadline = _Deadline(budget_ms)
+
+    used: Dict[str, Set[int]] = {}
+    chosen: List[int] = []
+    best: List[int] = []
+    best_value = 0.0
+    nodes = 0
+    stopped = False
+
+    def dfs(start: int, remaining: int, value: float, cost: int) -> None:
+        nonlocal best, best_value, nodes, stopped
+        if value > best_value:
+            best, best_value = list(chosen), value
+        if remaining == 0:
+            return
+        for i in range(start, n):
+            # Options are sorted, so no later i can beat this bound either
+            if value + prefix[min(n, i + remaining)] - prefix[i] <= best_value + 1e-9:
+                return
+            nodes += 1
+            if nodes > MAX_NODES or deadline.expired():
+                stopped = True
+                return
+            o = options[i]
+            if cost + o.cost_rub > budget:
+                continue
+            taken = used.setdefault(o.city, set())
+            if taken.intersection(o.picks):
+                continue
+            taken.update(o.picks)
+            chosen.append(i)
+            dfs(i + 1, remaining - 1, value + o.objective, cost + o.cost_rub)
+            chosen.pop()
+            taken.difference_update(o.picks)
+            if stopped:
+                return
+
+    dfs(0, days, 0.0, 0)
+    picked = sorted((options[i] for i in best), key=lambda o: (rank[o.city], o.picks))
+    return Allocation(
+        days=picked,
+        objective=best_value,
+        cost_rub=sum(o.cost_rub for o in picked),
+        nodes=nodes,
+        optimal=not stopped,
+        solve_ms=(time.perf_counter() - t0) * 1000.0,
+    )
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+from .compression import ENCODINGS, choose_encoding, compress, is_compressible
+
+
+# Build output of `python -m app build-static`:
+#
+#   manifest.json           {"assets": {"app.js": "app.3f2a9c1b0d.js", ...}, "encodings": ["br", "gzip"]}
+#   app.<hash>.js[.gz|.br]  content-hashed copies, served from /assets/ with immutable caching
+#   index.html[.gz|.br]     references rewritten to the hashed names
+#
+# brotli variants are written only when the brotli package is installed.
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+BUILD_DIR = Path(__file__).resolve().parent / "build"
+URL_PREFIX = "/assets/"
+HASHED_ASSETS = ("app.js", "styles.css", "favicon.svg")
+SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.write_bytes(data)
+    if is_compressible(mimetypes.guess_type(path.name)[0] or ""):
+        for enc in ENCODINGS:
+            packed = compress(data, enc, best=True)
+            if len(packed) < len(data):
+                path.with_name(path.name + SUFFIXES[enc]).write_bytes(packed)
+
+
+def build_static(static_dir: Path = STATIC_DIR, out: Path = BUILD_DIR) -> Dict[str, str]:
+    """Write hashed, precompressed copies of the SPA and its rewritten index.html."""
+    out.mkdir(parents=True, exist_ok=True)
+    for old in out.iterdir():
+        if old.is_file():
+            old.unlink()
+    assets: Dict[str, str] = {}
+    for name in HASHED_ASSETS:
+        data = (static_dir / name).read_bytes()
+        assets[name] = hashed_name(name, data)
+        _write(out / assets[name], data)
+    html = (static_dir / "index.html").read_text(encoding="utf-8")
+    pattern = re.compile(r"/static/(" + "|".join(re.escape(n) for n in assets) + r")\b")
+    html = pattern.sub(lambda m: URL_PREFIX + assets[m.group(1)], html)
+    _write(out / "index.html", html.encode("utf-8"))
+    manifest = {"assets": assets, "encodings": list(ENCODINGS)}
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    return assets
+
+
+class Asset:
+    __slots__ = ("media_type", "etag", "variants")
+
+    def __init__(self, media_type: str, etag: str, variants: Dict[Optional[str], bytes]) -> None:
+        self.media_type = media_type
+        self.etag = etag
+        self.variants = variants  # encoding (None = identity) -> body
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        # A strong validator differs per content coding: "<hash>", "<hash>-gz", "<hash>-br"
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{SUFFIXES[encoding].lstrip(".")}"'
+
+
+class AssetStore:
+    """Built assets held in memory (the SPA is a few KB) with their encoded variants."""
+
+    def __init__(self, build_dir: Path = BUILD_DIR) -> None:
+        self.build_dir = build_dir
+        self.assets: Dict[str, Asset] = {}
+        self.index: Optional[Asset] = None
+        manifest = build_dir / "manifest.json"
+        if not manifest.exists():
+            return
+        names = json.loads(manifest.read_text(encoding="utf-8"))["assets"].values()
+        for name in names:
+            self.assets[name] = self._load(name)
+        self.index = self._load("index.html")
+
+    def _load(self, name: str) -> Asset:
+        path = self.build_dir / name
+        data = path.read_bytes()
+        variants: Dict[Optional[str], bytes] = {None: data}
+        for enc, suffix in SUFFIXES.items():
+            packed = path.with_name(name + suffix)
+            if enc in ENCODINGS and packed.exists():
+                variants[enc] = packed.read_bytes()
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        return Asset(media_type, f'"{hashlib.sha256(data).hexdigest()[:16]}"', variants)
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self.assets.get(name)
+
+
+def pick_variant(asset: Asset, accept_encoding: Optional[str]) -> Tuple[Optional[str], bytes]:
+    enc = choose_encoding(accept_encoding, tuple(e for e in ENCODINGS if e in asset.variants))
+    return enc, asset.variants[enc]
+
+
+def _cli(argv: Sequence[str]) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app build-static", description="Hash and precompress the SPA")
+    parser.add_argument("--out", type=Path, default=BUILD_DIR)
+    args = parser.parse_args(list(argv))
+    assets = build_static(STATIC_DIR, args.out)
+    for name, hashed in assets.items():
+        print(f"{name} -> {URL_PREFIX}{hashed}")
+    print(f"{args.out}: encodings {', '.join(ENCODINGS)}")
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+
+
+class _Abandoned(Exception):
+    """The request computing a shared value was cancelled before it finished."""
+
+
+class ResponseCache:
+    """Bounded LRU cache with TTL and single-flight computation.
+
+    Concurrent ``get_or_compute`` calls for the same key share one in-flight
+    computation instead of each running it (no cache stampede). If the
+    computing request is cancelled (its client went away), one of the
+    waiting requests takes the computation over.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, CachedResponse]]" = OrderedDict()
+        self._inflight: Dict[Hashable, "asyncio.Future[CachedResponse]"] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: CachedResponse) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    async def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Awaitable[CachedResponse]]
+    ) -> CachedResponse:
+        while True:
+            hit = self.get(key)
+            if hit is not None:
+                self.hits += 1
+                return hit
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except _Abandoned:
+                continue  # the first waiter back here computes, the others wait for it
+        self.misses += 1
+        fut: "asyncio.Future[CachedResponse]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            fut.set_exception(_Abandoned())
+            fut.exception()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.put(key, value)
+        fut.set_result(value)
+        return value
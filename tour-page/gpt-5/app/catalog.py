@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple, Union
+
+from .compiled import CompiledCatalog, StaleCatalogError
+from .config import settings
+from .records import PlaceRecord, parse_records
+from .travel import TravelTables
+
+if TYPE_CHECKING:
+    from .indexes import CompiledPlannerIndex, PlannerIndex
+    from .store import PlaceStore, SqlPlannerIndex
+
+
+DATA_PATH = Path(__file__).resolve().parent / "data" / "places.json"
+
+log = logging.getLogger(__name__)
+
+
+def parse_places(raw: bytes) -> List[PlaceRecord]:
+    return parse_records(raw)
+
+
+def content_version(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def _mtime_ns(path: Optional[Path]) -> int:
+    if path is None:
+        return 0
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return -1
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    places: Sequence[PlaceRecord]
+    index: Union["PlannerIndex", "CompiledPlannerIndex", "SqlPlannerIndex"]
+    version: str
+    stamp: Tuple[int, int]  # mtimes of (places.json, compiled file)
+    loaded_at: float
+    source: str = "json"  # or "compiled", "sqlite"
+    compiled: Optional[CompiledCatalog] = None  # keeps the mapping alive
+    store: Optional["PlaceStore"] = None  # sqlite backend: rows are read on demand
+    travel: Optional[TravelTables] = None  # travel matrices per speed profile, built on first use
+
+
+class Catalog:
+    """Process-wide place catalog.
+
+    The parsed places and their planner index are kept in an immutable
+    snapshot that is swapped atomically when the source files' mtimes and
+    content hash change, or when ``reload()`` is called explicitly (admin
+    trigger). Readers never see a partially built catalog, and never wait
+    for one either: the thread that notices a change builds the new
+    snapshot while the others keep getting the current one.
+
+    With ``binary_path`` set, the compiled columnar file is loaded instead of
+    parsing JSON, unless it is missing or stale against ``path``. With
+    ``db_path`` set, the SQLite catalog is the source and only its mtime is
+    watched. When ``python -m app ingest`` left the diff between the loaded
+    and the new places.json, only the changed places are validated and only
+    their cities are indexed again.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        check_interval: float = 2.0,
+        binary_path: Optional[Path] = None,
+        db_path: Optional[Path] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.binary_path = Path(binary_path) if binary_path else None
+        self.db_path = Path(db_path) if db_path else None
+        self.check_interval = check_interval
+        self._build_lock = threading.Lock()  # held while a snapshot is built; once one exists readers skip it
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._next_check = 0.0
+
+    def snapshot(self) -> CatalogSnapshot:
+        snap = self._snapshot
+        if snap is None:
+            with self._build_lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load(None)
+                return self._snapshot
+        if self.check_interval >= 0 and time.monotonic() >= self._next_check:
+            return self._refresh(snap)
+        return snap
+
+    def reload(self) -> CatalogSnapshot:
+        # Unconditional reload; on parse errors the previous snapshot stays active
+        with self._build_lock:
+            self._snapshot = self._load(None)
+            return self._snapshot
+
+    def _stamp(self) -> Tuple[int, int]:
+        if self.db_path is not None:
+            return (_mtime_ns(self.db_path), 0)
+        return (_mtime_ns(self.path), _mtime_ns(self.binary_path))
+
+    def _refresh(self, snap: CatalogSnapshot) -> CatalogSnapshot:
+        if not self._build_lock.acquire(blocking=False):
+            return snap  # another thread is checking or rebuilding
+        try:
+            current = self._snapshot or snap
+            self._next_check = time.monotonic() + self.check_interval
+            stamp = self._stamp()
+            if stamp == current.stamp:
+                return current
+            try:
+                self._snapshot = self._load(current)
+                if self._snapshot.version != current.version:
+                    log.info("catalog reloaded: %s -> %s", current.version, self._snapshot.version)
+            except Exception:
+                log.exception("catalog reload failed, keeping version %s", current.version)
+                self._snapshot = replace(current, stamp=stamp)
+            return self._snapshot
+        finally:
+            self._build_lock.release()
+
+    def _load(self, current: Optional[CatalogSnapshot]) -> CatalogSnapshot:
+        stamp = self._stamp()
+        self._next_check = time.monotonic() + self.check_interval
+        if self.db_path is not None:
+            return self._load_db(current, stamp)
+        if self.binary_path is not None and stamp[1] >= 0:
+            from .compiled import CompiledRows
+            from .indexes import CompiledPlannerIndex as CompiledIndex  # planner depends on this module
+
+            try:
+                compiled = CompiledCatalog(self.binary_path)  # closes itself if truncated or corrupt
+            except (ValueError, OSError) as e:
+                log.warning("not using compiled catalog: %s", e)
+            else:
+                try:
+                    compiled.check_fresh(self.path)
+                except (StaleCatalogError, OSError) as e:
+                    compiled.close()
+                    log.warning("not using compiled catalog: %s", e)
+                else:
+                    if current is not None and current.version == compiled.version:
+                        # Touched but unchanged: remember the new mtimes, keep the loaded data
+                        compiled.close()
+                        return replace(current, stamp=stamp)
+                    # The snapshot reads the mapping in place; it stays open as long as the snapshot
+                    places = CompiledRows(compiled, range(len(compiled)))
+                    index = CompiledIndex(compiled)
+                    return self._build(places, compiled.version, stamp, "compiled", compiled, index)
+        raw = self.path.read_bytes()
+        version = content_version(raw)
+        if current is not None and current.version == version:
+            return replace(current, stamp=stamp)
+        if current is not None and current.source == "json":
+            patched = self._patch(current, version, stamp)
+            if patched is not None:
+                return patched
+        return self._build(parse_places(raw), version, stamp, "json", None)
+
+    def _patch(self, current: CatalogSnapshot, version: str, stamp: Tuple[int, int]) -> Optional[CatalogSnapshot]:
+        from .indexes import PlannerIndex  # planner depends on this module
+        from .ingest import apply_changes, changes_path, read_changes
+
+        changes = read_changes(changes_path(self.path), current.version, version)
+        if changes is None:
+            return None
+        places, cities = apply_changes(current.places, changes)
+        index = PlannerIndex(places, base=(current.index, cities))  # type: ignore[arg-type]
+        counts = (len(changes.added), len(changes.changed), len(changes.removed), len(cities))
+        log.info("catalog patched: %d added, %d changed, %d removed in %d cities", *counts)
+        return self._build(places, version, stamp, "json", None, index, previous=current)
+
+    def _load_db(self, current: Optional[CatalogSnapshot], stamp: Tuple[int, int]) -> CatalogSnapshot:
+        from .store import PlaceRows, PlaceStore, SqlPlannerIndex  # store depends on the planner
+
+        store = PlaceStore(self.db_path)  # type: ignore[arg-type]
+        if current is not None and current.version == store.version:
+            return replace(current, stamp=stamp)
+        places = PlaceRows(store, ("1", ()), "seq")
+        return self._build(places, store.version, stamp, "sqlite", None, SqlPlannerIndex(store), store)
+
+    def _build(
+        self,
+        places: Sequence[PlaceRecord],
+        version: str,
+        stamp: Tuple[int, int],
+        source: str,
+        compiled: Optional[CompiledCatalog],
+        index: Optional[Union["PlannerIndex", "CompiledPlannerIndex", "SqlPlannerIndex"]] = None,
+        store: Optional["PlaceStore"] = None,
+        previous: Optional[CatalogSnapshot] = None,
+    ) -> CatalogSnapshot:
+        from .indexes import PlannerIndex  # planner depends on this module
+
+        if index is None:
+            index = PlannerIndex(places)  # type: ignore[arg-type]
+        cache_dir = Path(settings.travel_cache_dir) if settings.travel_cache_dir else None
+        travel = TravelTables(version, index, cache_dir, previous.travel if previous is not None else None)
+        # The default profile is loaded (or built and persisted) with the catalog, off the request path;
+        # after a patch so are the previous catalog's profiles, from its matrices of unchanged cities
+        profiles = [settings.speed_profile]
+        if travel.previous is not None:
+            profiles.extend(p for p in travel.previous.profiles() if p != settings.speed_profile)
+        for name in profiles:
+            travel.table(name)
+        travel.previous = None
+        return CatalogSnapshot(
+            places=places,
+            index=index,
+            version=version,
+            stamp=stamp,
+            loaded_at=time.time(),
+            source=source,
+            compiled=compiled,
+            store=store,
+            travel=travel,
+        )
+
+
+catalog = Catalog(
+    Path(settings.catalog_path) if settings.catalog_path else DATA_PATH,
+    settings.catalog_check_seconds,
+    Path(settings.catalog_binary_path) if settings.catalog_binary_path else None,
+    Path(settings.catalog_db_path) if settings.catalog_db_path else None,
+)
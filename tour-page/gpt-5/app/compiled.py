@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union, overload
+
+from .records import PlaceRecord
+
+
+# Columnar, memory-mapped catalog (places.tpc), compiled from places.json:
+#
+#   header    magic, format version, place count, source size/mtime/sha256, section count
+#   sections  (name, typecode, offset, nbytes) table
+#   data      8-byte aligned little-endian columns
+#
+# Numeric fields are fixed-width columns. All strings (ids, names, cities,
+# notes, categories) are interned into one pool (str.off + str.blob) and
+# referenced by u32 index; NO_STRING marks a missing note.
+
+MAGIC = b"TPCAT\x00\x00\x00"
+FORMAT_VERSION = 1
+NO_STRING = 0xFFFFFFFF
+
+_HEADER = struct.Struct("<8sHHIQq32sI")
+_SECTION = struct.Struct("<16s8sQQ")
+
+# Place field -> (section name, array typecode)
+NUMERIC_COLUMNS: Dict[str, Tuple[str, str]] = {
+    "lat": ("lat", "d"),
+    "lon": ("lon", "d"),
+    "cost_rub": ("cost", "i"),
+    "avg_visit_minutes": ("minutes", "i"),
+    "stairs_level": ("stairs", "B"),
+    "indoor": ("indoor", "B"),
+}
+STRING_COLUMNS = ("id", "name_ru", "name_en", "city_ru", "city_en", "notes_ru", "notes_en")
+
+
+class StaleCatalogError(Exception):
+    """The compiled catalog was built from a different places.json."""
+
+
+def source_fingerprint(source: Path) -> Tuple[int, int]:
+    st = os.stat(source)
+    return st.st_size, st.st_mtime_ns
+
+
+def compile_catalog(source: Path, out: Path) -> Path:
+    """Validate places.json and write the compiled file atomically next to out."""
+    from .catalog import parse_places  # catalog imports this module
+
+    source, out = Path(source), Path(out)
+    raw = source.read_bytes()
+    size, mtime_ns = source_fingerprint(source)
+    places = parse_places(raw)
+
+    pool: Dict[str, int] = {}
+
+    def intern(s: Optional[str]) -> int:
+        if s is None:
+            return NO_STRING
+        ref = pool.get(s)
+        if ref is None:
+            ref = pool[s] = len(pool)
+        return ref
+
+    sections: Dict[str, array] = {}
+    for field, (name, code) in NUMERIC_COLUMNS.items():
+        sections[name] = array(code, (int(getattr(p, field)) if code != "d" else getattr(p, field) for p in places))
+    for field in STRING_COLUMNS:
+        sections[f"s.{field}"] = array("I", (intern(getattr(p, field)) for p in places))
+    cat_off = array("I", [0])
+    cat_ref = array("I")
+    for p in places:
+        cat_ref.extend(intern(c) for c in p.categories)
+        cat_off.append(len(cat_ref))
+    sections["cat.off"] = cat_off
+    sections["cat.ref"] = cat_ref
+    encoded = [s.encode("utf-8") for s in pool]  # dicts keep insertion order = ref order
+    str_off = array("I", [0])
+    for b in encoded:
+        str_off.append(str_off[-1] + len(b))
+    sections["str.off"] = str_off
+    sections["str.blob"] = array("B", b"".join(encoded))
+
+    write_sections(out, sections, len(places), size, mtime_ns, hashlib.sha256(raw).digest())
+    return out
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def write_sections(
+    out: Path,
+    sections: Dict[str, array],
+    count: int,
+    size: int,
+    mtime_ns: int,
+    sha256: bytes,
+    magic: bytes = MAGIC,
+    version: int = FORMAT_VERSION,
+) -> None:
+    if sys.byteorder != "little":
+        raise RuntimeError("compiled catalogs are little-endian only")
+    offset = _align(_HEADER.size + _SECTION.size * len(sections))
+    table = []
+    for name, data in sections.items():
+        nbytes = len(data) * data.itemsize
+        table.append(_SECTION.pack(name.encode(), data.typecode.encode(), offset, nbytes))
+        offset = _align(offset + nbytes)
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(magic, version, 0, count, size, mtime_ns, sha256, len(sections)))
+        f.write(b"".join(table))
+        for data in sections.values():
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            data.tofile(f)
+    # Readers of the old file keep their mapping; new readers see a complete file
+    os.replace(tmp, out)
+
+
+def read_sections(
+    path: Path, magic: bytes = MAGIC, version: int = FORMAT_VERSION
+) -> Tuple[mmap.mmap, Tuple[int, int, int, bytes], Dict[str, memoryview]]:
+    """Map a file written by write_sections: (mapping, (count, size, mtime_ns, sha256), sections).
+
+    A truncated or corrupt file raises ValueError, like a wrong magic or
+    format; the mapping is closed before the error is raised.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buf = memoryview(mm)
+    sections: Dict[str, memoryview] = {}
+    try:
+        what = f"{path} is not a {magic.rstrip(bytes(1)).decode()} file (format {version})"
+        if len(buf) < _HEADER.size:
+            raise ValueError(f"{what}: truncated header")
+        file_magic, fmt, _, count, size, mtime_ns, sha256, n_sections = _HEADER.unpack_from(buf, 0)
+        if file_magic != magic or fmt != version:
+            raise ValueError(what)
+        if _HEADER.size + n_sections * _SECTION.size > len(buf):
+            raise ValueError(f"{what}: truncated section table")
+        for i in range(n_sections):
+            name, code, off, nbytes = _SECTION.unpack_from(buf, _HEADER.size + i * _SECTION.size)
+            if off + nbytes > len(buf):
+                raise ValueError(f"{what}: section {name.rstrip(bytes(1))!r} runs past the end of the file")
+            try:
+                sections[name.rstrip(b"\0").decode()] = buf[off : off + nbytes].cast(code.rstrip(b"\0").decode())
+            except (TypeError, UnicodeDecodeError) as e:  # bad typecode or length
+                raise ValueError(f"{what}: section {i}: {e}") from None
+    except BaseException:
+        buf.release()
+        close_sections(mm, sections)
+        raise
+    buf.release()  # the sections are views of their own
+    return mm, (count, size, mtime_ns, sha256), sections
+
+
+def close_sections(mm: mmap.mmap, sections: Dict[str, memoryview]) -> None:
+    for view in sections.values():
+        view.release()
+    mm.close()
+
+
+class CompiledCatalog:
+    """Memory-mapped view over a compiled catalog file.
+
+    Columns are memoryviews into the mapping and are read in place:
+    indexes.CompiledPlannerIndex builds its views from them as row numbers,
+    and a PlaceRecord is only built for a row the planner reads (place()).
+    Pages of the file are shared by every process that maps it. Strings are
+    decoded on first use. Cross references are checked when the file is
+    opened, so a corrupt file is refused before any request reads it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._mm, header, self.sections = read_sections(self.path)
+        self.count: int = header[0]
+        self.source_size: int = header[1]
+        self.source_mtime_ns: int = header[2]
+        self.source_sha256: bytes = header[3]
+        try:
+            self._check()
+        except BaseException:
+            self.close()
+            raise
+        cols = {field: self.sections[name] for field, (name, _) in NUMERIC_COLUMNS.items()}
+        self.lat, self.lon = cols["lat"], cols["lon"]
+        self.cost_rub, self.avg_visit_minutes = cols["cost_rub"], cols["avg_visit_minutes"]
+        self.stairs_level, self.indoor = cols["stairs_level"], cols["indoor"]
+        self._strings: Dict[int, str] = {}
+
+    def _check(self) -> None:
+        expected = {name: self.count for name, _ in NUMERIC_COLUMNS.values()}
+        expected.update({f"s.{field}": self.count for field in STRING_COLUMNS})
+        expected["cat.off"] = self.count + 1
+        for name, n in [*expected.items(), ("cat.ref", -1), ("str.off", -1), ("str.blob", -1)]:
+            if name not in self.sections:
+                raise ValueError(f"{self.path}: missing section {name}")
+            if n >= 0 and len(self.sections[name]) != n:
+                raise ValueError(f"{self.path}: section {name} has {len(self.sections[name])} entries, expected {n}")
+        # Rows are read lazily, so every reference they hold is checked now
+        self._str_off, self._str_blob = self.sections["str.off"], self.sections["str.blob"]
+        str_off = self._str_off.tolist()
+        if not str_off or str_off[0] != 0 or str_off[-1] != len(self._str_blob) or str_off != sorted(str_off):
+            raise ValueError(f"{self.path}: corrupt string offsets")
+        n_strings = len(str_off) - 1
+        for field in STRING_COLUMNS:
+            refs = set(self.sections[f"s.{field}"].tolist())
+            if field.startswith("notes"):
+                refs.discard(NO_STRING)  # notes are optional
+            if refs and max(refs) >= n_strings:
+                raise ValueError(f"{self.path}: section s.{field} refers past the string pool")
+        cat_off, cat_ref = self.sections["cat.off"].tolist(), self.sections["cat.ref"]
+        if cat_off[0] != 0 or cat_off[-1] != len(cat_ref) or cat_off != sorted(cat_off):
+            raise ValueError(f"{self.path}: corrupt category offsets")
+        if len(cat_ref) and max(cat_ref) >= n_strings:
+            raise ValueError(f"{self.path}: section cat.ref refers past the string pool")
+        try:
+            self.strings()
+        except UnicodeDecodeError as e:
+            raise ValueError(f"{self.path}: string pool: {e}") from None
+
+    def close(self) -> None:
+        close_sections(self._mm, self.sections)
+
+    @property
+    def version(self) -> str:
+        # Same value as catalog.content_version() of the source JSON
+        return self.source_sha256.hex()[:16]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def decode(self, ref: int) -> str:
+        """String ref, decoded without keeping it."""
+        return bytes(self._str_blob[self._str_off[ref] : self._str_off[ref + 1]]).decode("utf-8")
+
+    def string(self, ref: int) -> Optional[str]:
+        if ref == NO_STRING:
+            return None
+        s = self._strings.get(ref)
+        if s is None:
+            s = self._strings[ref] = self.decode(ref)
+        return s
+
+    def field(self, name: str, i: int) -> Optional[str]:
+        return self.string(self.sections[f"s.{name}"][i])
+
+    def categories(self, i: int) -> List[str]:
+        off, ref = self.sections["cat.off"], self.sections["cat.ref"]
+        return [self.string(r) or "" for r in ref[off[i] : off[i + 1]]]
+
+    def place(self, i: int) -> PlaceRecord:
+        return PlaceRecord(
+            seq=i,
+            id=self.field("id", i),
+            name_ru=self.field("name_ru", i),
+            name_en=self.field("name_en", i),
+            city_ru=self.field("city_ru", i),
+            city_en=self.field("city_en", i),
+            lat=self.lat[i],
+            lon=self.lon[i],
+            categories=self.categories(i),
+            indoor=bool(self.indoor[i]),
+            stairs_level=self.stairs_level[i],
+            avg_visit_minutes=self.avg_visit_minutes[i],
+            cost_rub=self.cost_rub[i],
+            notes_ru=self.field("notes_ru", i),
+            notes_en=self.field("notes_en", i),
+        )
+
+    def strings(self) -> List[str]:
+        """The whole string pool, decoded in one pass."""
+        blob, off = bytes(self._str_blob), self._str_off.tolist()
+        return [blob[a:b].decode("utf-8") for a, b in zip(off, off[1:])]
+
+    def check_fresh(self, source: Optional[Path]) -> None:
+        """Raise StaleCatalogError if source no longer matches the compiled data."""
+        if source is None or not Path(source).exists():
+            return
+        if source_fingerprint(Path(source)) == (self.source_size, self.source_mtime_ns):
+            return
+        # Size or mtime moved (e.g. a fresh checkout): fall back to the content hash
+        if hashlib.sha256(Path(source).read_bytes()).digest() != self.source_sha256:
+            raise StaleCatalogError(f"{self.path} is stale, recompile it from {source}")
+
+
+class CompiledRows(Sequence[PlaceRecord]):
+    """Rows of a compiled catalog, in the given order, read like a list of places.
+
+    Records are built on access and not kept: requests read a handful of
+    rows, and the rest of the catalog stays in the mapping.
+    """
+
+    def __init__(self, catalog: CompiledCatalog, rows: Sequence[int]) -> None:
+        self.catalog = catalog
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @overload
+    def __getitem__(self, i: int) -> PlaceRecord: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[PlaceRecord]: ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[PlaceRecord, List[PlaceRecord]]:
+        if isinstance(i, slice):
+            return [self.catalog.place(r) for r in self.rows[i]]
+        return self.catalog.place(self.rows[i])
+
+    def __iter__(self) -> Iterator[PlaceRecord]:
+        return map(self.catalog.place, self.rows)
+
+
+def _cli(argv: Sequence[str]) -> None:
+    import argparse
+
+    from .catalog import DATA_PATH
+    from .config import settings
+
+    parser = argparse.ArgumentParser(prog="python -m app compile-catalog", description="Compile places.json")
+    parser.add_argument("--source", type=Path, default=Path(settings.catalog_path) if settings.catalog_path else DATA_PATH)
+    parser.add_argument("--out", type=Path, default=None, help="default: next to the source with .tpc suffix")
+    args = parser.parse_args(list(argv))
+    out = compile_catalog(args.source, args.out or args.source.with_suffix(".tpc"))
+    cc = CompiledCatalog(out)
+    print(f"{out}: {cc.count} places, {out.stat().st_size} bytes, source version {cc.version}")
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import gzip
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+try:  # optional, better ratio than gzip; without it only gzip is offered
+    import brotli
+except ImportError:  # pragma: no cover - depends on the install
+    brotli = None  # type: ignore[assignment]
+
+
+# Preference order when the client accepts several
+ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "image/svg+xml", "application/javascript")
+
+# Dynamic responses trade ratio for speed; build-time assets use the maximum levels
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(header: Optional[str]) -> FrozenSet[str]:
+    """Codings allowed by an Accept-Encoding header (q=0 excluded)."""
+    if not header:
+        return frozenset()
+    out = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        out.add(name.strip().lower())
+    if "*" in out:
+        out.update(ENCODINGS)
+    return frozenset(out)
+
+
+def choose_encoding(header: Optional[str], available: Tuple[str, ...] = ENCODINGS) -> Optional[str]:
+    accepted = accepted_encodings(header)
+    for enc in available:
+        if enc in accepted:
+            return enc
+    return None
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else BROTLI_QUALITY)
+    # mtime=0 keeps the output reproducible
+    return gzip.compress(body, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete responses of at least ``minimum_size`` bytes.
+
+    Streamed bodies (NDJSON) pass through untouched so every line still
+    reaches the client as soon as it is written, and so do responses that
+    already carry a Content-Encoding (precompressed assets).
+    """
+
+    def __init__(self, app: Any, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"accept-encoding"), None)
+        encoding = choose_encoding(header)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start: Optional[Dict[str, Any]] = None
+        passthrough = False
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough or start is None:
+                await send(message)
+                return
+            headers: List[Tuple[bytes, bytes]] = list(start.get("headers", []))
+            names = {k.lower(): v for k, v in headers}
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or b"content-encoding" in names
+                or not is_compressible(names.get(b"content-type", b"").decode("latin-1"))
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            body = compress(body, encoding)
+            out = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"etag", b"vary")]
+            out.append((b"content-encoding", encoding.encode()))
+            out.append((b"content-length", str(len(body)).encode()))
+            vary = names.get(b"vary")
+            out.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+            etag = names.get(b"etag")
+            if etag is not None:
+                # Another representation of the same content
+                out.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            await send({**start, "headers": out})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,14 +1,46 @@
+import getpass
 import os
+import stat
+from pathlib import Path
 from typing import Literal
 
 
 Lang = Literal["ru", "en"]
 
+BUNDLED_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
 
 def get_env(name: str, default: str) -> str:
     return os.environ.get(name, default)
 
 
+def app_cache_dir(catalog_path: str, kind: str) -> str:
+    """Default cache directory: per user, right next to the catalog (whoever can write there owns the catalog)."""
+    base = os.path.dirname(os.path.abspath(catalog_path)) if catalog_path else BUNDLED_DATA_DIR
+    user = str(os.getuid()) if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(base, f".tourplanner-{user}-{kind}")
+
+
+def check_owner(path: Path) -> None:
+    """Raise PermissionError unless path belongs to the current user."""
+    if hasattr(os, "getuid") and path.stat().st_uid != os.getuid():
+        raise PermissionError(f"{path} belongs to another user")
+
+
+def private_dir(path: Path) -> Path:
+    """path as a directory only the current user can write to, created with mode 0700 if missing.
+
+    Files read back from the cache directories are trusted (travel matrices
+    are used as they are), so a directory another user owns or can write to
+    is refused.
+    """
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    check_owner(path)
+    if hasattr(os, "getuid") and path.stat().st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} is writable by other users")
+    return path
+
+
 class Settings:
     def __init__(self) -> None:
         self.default_language: Lang = (get_env("APP_DEFAULT_LANGUAGE", "ru").lower() or "ru")  # type: ignore
@@ -17,6 +49,67 @@ class Settings:
         self.seed: int = int(get_env("APP_SEED", "42"))
         self.port: int = int(get_env("APP_PORT", "8000"))
         self.workers: int = int(get_env("APP_WORKERS", "1"))
+        self.host: str = get_env("APP_HOST", "0.0.0.0")
+        # python -m app serve: build the catalog once in the parent, share it with forked workers
+        self.preload_catalog: bool = get_env("APP_PRELOAD", "1").lower() in ("1", "true", "yes")
+        # Empty path means the bundled app/data/places.json
+        self.catalog_path: str = get_env("APP_CATALOG_PATH", "")
+        # Compiled columnar catalog (python -m app compile-catalog); JSON stays the source of truth
+        self.catalog_binary_path: str = get_env("APP_CATALOG_BINARY", "")
+        # SQLite catalog (python -m app import-catalog); when set it replaces the JSON/compiled catalog
+        self.catalog_db_path: str = get_env("APP_CATALOG_DB", "")
+        self.catalog_check_seconds: float = float(get_env("APP_CATALOG_CHECK_SECONDS", "2"))
+        # Where trips start and end: a registered origin (spb, pulkovo, moskovsky_station, ...)
+        self.default_origin: str = get_env("APP_DEFAULT_ORIGIN", "spb")
+        # Extra origins as JSON: [{"key": "astoria", "lat": 59.93, "lon": 30.31, "name_ru": ..., "name_en": ...}]
+        self.origins: str = get_env("APP_ORIGINS", "")
+        # Origins whose city rankings and transfer legs are kept per catalog snapshot
+        self.origin_cache_size: int = int(get_env("APP_ORIGIN_CACHE", "64"))
+        # Route optimizer: nearest | two_opt | local (2-opt + Or-opt)
+        self.route_optimizer: str = get_env("APP_ROUTE_OPTIMIZER", "local")
+        self.route_budget_ms: float = float(get_env("APP_ROUTE_BUDGET_MS", "20"))
+        self.max_places_per_day: int = int(get_env("APP_MAX_PLACES_PER_DAY", "3"))
+        # Default speed profile (car, train, accessible); travel matrices are cached on disk per profile
+        self.speed_profile: str = get_env("APP_SPEED_PROFILE", "car")
+        # Empty disables persistence (matrices are then built in memory at every start)
+        self.travel_cache_dir: str = get_env(
+            "APP_TRAVEL_CACHE_DIR", app_cache_dir(self.catalog_db_path or self.catalog_path, "travel")
+        )
+        # Place-to-day allocation: greedy (one ranked city per day) or global (time/budget aware)
+        self.allocator: str = get_env("APP_ALLOCATOR", "greedy")
+        self.day_minutes: int = int(get_env("APP_DAY_MINUTES", "600"))
+        self.allocation_budget_ms: float = float(get_env("APP_ALLOCATION_BUDGET_MS", "50"))
+        # /api/plan response cache; size 0 disables caching
+        self.plan_cache_size: int = int(get_env("APP_PLAN_CACHE_SIZE", "256"))
+        self.plan_cache_ttl: float = float(get_env("APP_PLAN_CACHE_TTL", "300"))
+        self.plan_cache_max_age: int = int(get_env("APP_PLAN_MAX_AGE", "60"))
+        self.batch_max_items: int = int(get_env("APP_BATCH_MAX_ITEMS", "100"))
+        # Where plans are computed: inline (on the event loop), thread or process pool
+        self.execution_mode: str = get_env("APP_EXECUTION_MODE", "thread").lower()
+        self.executor_workers: int = int(get_env("APP_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.executor_queue: int = int(get_env("APP_EXECUTOR_QUEUE", "32"))
+        self.plan_timeout_seconds: float = float(get_env("APP_PLAN_TIMEOUT_SECONDS", "10"))
+        self.retry_after_seconds: int = int(get_env("APP_RETRY_AFTER_SECONDS", "1"))
+        # Validate requests from raw bytes with precompiled adapters; 0 restores the dict path
+        self.fast_json: bool = get_env("APP_FAST_JSON", "1").lower() in ("1", "true", "yes")
+        # Compress API responses of at least this many bytes (gzip, or brotli when installed); 0 disables
+        self.compress_min_bytes: int = int(get_env("APP_COMPRESS_MIN_BYTES", "1024"))
+        # Prometheus metrics on /metrics; off removes the middleware and the per-stage timers
+        self.metrics_enabled: bool = get_env("APP_METRICS", "1").lower() in ("1", "true", "yes")
+        # Per-stage Server-Timing header on /api/plan responses
+        self.server_timing: bool = get_env("APP_SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+        # Profiling of /api/plan computations: a sampled share of requests, plus any request carrying
+        # X-Profile and the admin token; the newest APP_PROFILE_KEEP profiles are kept on disk
+        self.profile_enabled: bool = get_env("APP_PROFILE", "0").lower() in ("1", "true", "yes")
+        self.profile_sample_rate: float = float(get_env("APP_PROFILE_SAMPLE_RATE", "0"))
+        # pstats (cProfile) or collapsed (sampled stacks for flamegraphs)
+        self.profile_format: str = get_env("APP_PROFILE_FORMAT", "pstats").lower()
+        self.profile_dir: str = get_env(
+            "APP_PROFILE_DIR", app_cache_dir(self.catalog_db_path or self.catalog_path, "profiles")
+        )
+        self.profile_keep: int = int(get_env("APP_PROFILE_KEEP", "50"))
+        # Admin endpoints are disabled while no token is configured
+        self.admin_token: str = get_env("APP_ADMIN_TOKEN", "")
 
 
 settings = Settings()
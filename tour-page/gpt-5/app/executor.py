@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Literal, NamedTuple, Optional, TypeVar, Union
+
+from .catalog import CatalogSnapshot, catalog
+
+
+ExecutionMode = Literal["inline", "thread", "process"]
+
+T = TypeVar("T")
+
+
+class ExecutorSaturated(Exception):
+    """All workers are busy and the wait queue is full."""
+
+
+class CatalogVersionMismatch(Exception):
+    """A process worker could not load the catalog version a call was made against."""
+
+
+class PinnedSnapshot(NamedTuple):
+    """Stands in for a snapshot in calls shipped to process workers; only the version travels."""
+
+    version: str
+
+
+def _worker_snapshot(version: str) -> CatalogSnapshot:
+    snap = catalog.snapshot()
+    if snap.version != version:
+        # The parent saw the new file first: catch up instead of answering from the old catalog
+        snap = catalog.reload()
+    if snap.version != version:
+        raise CatalogVersionMismatch(f"worker has catalog {snap.version}, the call needs {version}")
+    return snap
+
+
+def _call_pinned(fn: Callable[..., T], *args: Any) -> T:
+    # Runs in the worker: pinned snapshots become the worker's own catalog at that version
+    return fn(*(_worker_snapshot(a.version) if isinstance(a, PinnedSnapshot) else a for a in args))
+
+
+def _warm_worker() -> None:
+    # Runs once in every pool process so the first request does not pay for loading
+    catalog.snapshot()
+
+
+class PlanExecutor:
+    """Runs CPU-bound planning off the event loop.
+
+    ``inline`` calls the function directly (the old behaviour), ``thread`` and
+    ``process`` submit it to a pool. At most ``workers + queue_depth`` calls
+    may be outstanding; beyond that ``run`` raises ExecutorSaturated right
+    away instead of queueing without bound.
+    """
+
+    def __init__(self, mode: ExecutionMode, workers: int, queue_depth: int, timeout_seconds: float) -> None:
+        if mode not in ("inline", "thread", "process"):
+            raise ValueError(f"unknown execution mode: {mode}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self.timeout_seconds = timeout_seconds
+        self._pool: Optional[Executor] = None
+        self._outstanding = 0
+        self._lock = threading.Lock()
+
+    @property
+    def parallelism(self) -> int:
+        return 1 if self.mode == "inline" else self.workers
+
+    @property
+    def outstanding(self) -> int:
+        return self._outstanding
+
+    def pin(self, snap: CatalogSnapshot) -> Union[CatalogSnapshot, PinnedSnapshot]:
+        """The snapshot argument for run(): the object itself, or its version for process workers.
+
+        Process workers plan from their own catalog; a pinned call fails with
+        CatalogVersionMismatch rather than answer from another version than
+        the one its cache key and ETag were computed for.
+        """
+        return PinnedSnapshot(snap.version) if self.mode == "process" else snap
+
+    def start(self) -> None:
+        if self._pool is not None or self.mode == "inline":
+            return
+        if self.mode == "thread":
+            _warm_worker()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="planner")
+        else:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+            # Spawn and warm every worker up front
+            for f in [self._pool.submit(_warm_worker) for _ in range(self.workers)]:
+                f.result()
+
+    def shutdown(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _: Future) -> None:
+        with self._lock:
+            self._outstanding -= 1
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(*args); raises ExecutorSaturated or asyncio.TimeoutError."""
+        if self.mode == "inline":
+            return fn(*args)
+        if self._pool is None:
+            self.start()
+        with self._lock:
+            if self._outstanding >= self.workers + self.queue_depth:
+                raise ExecutorSaturated()
+            self._outstanding += 1
+        try:
+            if self.mode == "process":
+                cf = self._pool.submit(_call_pinned, fn, *args)  # type: ignore[union-attr]
+            else:
+                cf = self._pool.submit(fn, *args)  # type: ignore[union-attr]
+        except BaseException:
+            with self._lock:
+                self._outstanding -= 1
+            raise
+        # The slot is freed when the work really ends, not when the caller stops waiting
+        cf.add_done_callback(self._release)
+        # On timeout the wrapper cancels cf, which drops it if it is still queued
+        return await asyncio.wait_for(asyncio.wrap_future(cf), timeout=self.timeout_seconds or None)
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import math
+from array import array
+from dataclasses import dataclass, field, replace
+from typing import AbstractSet, Dict, List, Optional, Sequence, Tuple, get_args
+
+from .compiled import CompiledCatalog, CompiledRows
+from .config import settings
+
+from .models import BudgetLevel, MobilityPref
+from .origins import LRU, SPB, Origin
+from .planner import (
+    city_center,
+    filter_accessible,
+    filter_budget,
+    group_by_city,
+    is_usable,
+    max_cost,
+    max_stairs,
+    place_score,
+    rainy_score,
+)
+from .records import PlaceRecord
+from .spatial import EARTH_RADIUS_KM, SpatialIndex
+from .utils import haversine_km_many
+
+# nearest_unvisited starts with this radius and widens it fourfold until a place turns up
+NEARBY_START_KM = 2.0
+# Cities whose k-d trees an index keeps, per mobility x budget
+NEARBY_CACHE_CITIES = 256
+
+
+@dataclass(frozen=True)
+class CityEntry:
+    city: str
+    places: Sequence[PlaceRecord]  # catalog order
+    center: Tuple[float, float]
+    dist_origin_km: float  # from the view's origin to the center
+    candidates: Sequence[PlaceRecord]  # sorted by place_score, slice for top-k picks
+    rainy: Sequence[PlaceRecord]  # indoor only, sorted by rainy_score
+    indoor: Tuple[int, ...]  # candidate indexes of the rainy places, same order
+
+
+@dataclass(frozen=True)
+class PlaceView:
+    """Places left after the accessibility and budget filters for one request shape."""
+
+    mobility: MobilityPref
+    budget_level: BudgetLevel
+    places: Sequence[PlaceRecord]
+    cities: Dict[str, CityEntry]
+    ranked: List[Tuple[str, int, float]]  # (city, count, distance to the origin), best first
+    origin: Origin = field(default=SPB, compare=False)
+
+
+def build_view(usable: List[PlaceRecord], mobility: MobilityPref, budget: BudgetLevel) -> PlaceView:
+    places = filter_budget(filter_accessible(usable, mobility), budget)
+    cities = city_entries(places)
+    return PlaceView(mobility=mobility, budget_level=budget, places=places, cities=cities, ranked=rank_cities(cities))
+
+
+def patch_view(
+    view: PlaceView, usable: List[PlaceRecord], touched: List[PlaceRecord], changed: AbstractSet[str]
+) -> PlaceView:
+    """build_view(usable, ...) for a catalog that differs from view's only in the changed cities.
+
+    touched holds the usable places of those cities; other cities' entries are reused as they are.
+    """
+    places = filter_budget(filter_accessible(usable, view.mobility), view.budget_level)
+    cities = {city: e for city, e in view.cities.items() if city not in changed}
+    cities.update(city_entries(filter_budget(filter_accessible(touched, view.mobility), view.budget_level)))
+    return replace(view, places=places, cities=cities, ranked=rank_cities(cities))
+
+
+def city_entries(places: List[PlaceRecord]) -> Dict[str, CityEntry]:
+    groups = group_by_city(places)
+    centers = [city_center(plist) for plist in groups.values()]
+    dists = haversine_km_many(SPB.lat, SPB.lon, [c[0] for c in centers], [c[1] for c in centers])
+    cities: Dict[str, CityEntry] = {}
+    for (city, plist), center, dist in zip(groups.items(), centers, dists):
+        candidates = sorted(plist, key=place_score)
+        rainy = sorted((p for p in plist if p.indoor), key=rainy_score)
+        position = {id(p): i for i, p in enumerate(candidates)}
+        cities[city] = CityEntry(
+            city=city,
+            places=plist,
+            center=center,
+            dist_origin_km=float(dist),
+            candidates=candidates,
+            rainy=rainy,
+            indoor=tuple(position[id(p)] for p in rainy),
+        )
+    return cities
+
+
+def compiled_view(
+    catalog: CompiledCatalog, pool: List[str], usable: Sequence[int], mobility: MobilityPref, budget: BudgetLevel
+) -> PlaceView:
+    """build_view over a compiled catalog's columns: places stay row numbers until they are read."""
+    stairs, cost, indoor, minutes = catalog.stairs_level, catalog.cost_rub, catalog.indoor, catalog.avg_visit_minutes
+    lat, lon = catalog.lat, catalog.lon
+    city_ref, name_ref = catalog.sections["s.city_ru"], catalog.sections["s.name_ru"]
+    top_stairs, top_cost = max_stairs(mobility), max_cost(budget)
+    rows = array("I", (i for i in usable if stairs[i] <= top_stairs and cost[i] <= top_cost))
+    groups: Dict[int, List[int]] = {}
+    for i in rows:
+        groups.setdefault(city_ref[i], []).append(i)
+    # Summed in catalog order, like city_center()
+    centers = [(sum(lat[i] for i in g) / len(g), sum(lon[i] for i in g) / len(g)) for g in groups.values()]
+    dists = haversine_km_many(SPB.lat, SPB.lon, [c[0] for c in centers], [c[1] for c in centers])
+
+    # Same orders as planner.place_score and planner.rainy_score
+    def score(i: int) -> Tuple[int, int, int, str]:
+        return (0 if indoor[i] else 1, stairs[i], cost[i], pool[name_ref[i]])
+
+    def rainy(i: int) -> Tuple[int, int, str]:
+        return (cost[i], minutes[i], pool[name_ref[i]])
+
+    cities: Dict[str, CityEntry] = {}
+    for (ref, g), center, dist in zip(groups.items(), centers, dists):
+        candidates = sorted(g, key=score)
+        wet = sorted((i for i in g if indoor[i]), key=rainy)
+        position = {row: k for k, row in enumerate(candidates)}
+        cities[pool[ref]] = CityEntry(
+            city=pool[ref],
+            places=CompiledRows(catalog, array("I", g)),
+            center=center,
+            dist_origin_km=float(dist),
+            candidates=CompiledRows(catalog, array("I", candidates)),
+            rainy=CompiledRows(catalog, array("I", wet)),
+            indoor=tuple(position[i] for i in wet),
+        )
+    places = CompiledRows(catalog, rows)
+    return PlaceView(mobility=mobility, budget_level=budget, places=places, cities=cities, ranked=rank_cities(cities))
+
+
+def rank_cities(cities: Dict[str, CityEntry]) -> List[Tuple[str, int, float]]:
+    # More places first, then closer to the origin, then by name
+    return sorted(
+        ((e.city, len(e.places), e.dist_origin_km) for e in cities.values()), key=lambda x: (-x[1], x[2], x[0])
+    )
+
+
+def with_origin(view: PlaceView, origin: Origin) -> PlaceView:
+    """The view re-ranked for trips from origin; places and candidate lists are shared."""
+    entries = list(view.cities.values())
+    dists = haversine_km_many(origin.lat, origin.lon, [e.center[0] for e in entries], [e.center[1] for e in entries])
+    cities = {e.city: replace(e, dist_origin_km=float(d)) for e, d in zip(entries, dists)}
+    return replace(view, cities=cities, ranked=rank_cities(cities), origin=origin)
+
+
+class ViewIndex:
+    """Views per mobility x budget, built for SPB, plus an LRU of their re-rankings for other origins."""
+
+    views: Dict[Tuple[str, str], PlaceView]
+
+    def __init__(self) -> None:
+        self._by_origin: LRU[Tuple[Tuple[float, float], str, str], PlaceView] = LRU(
+            settings.origin_cache_size * len(self.views)
+        )
+        self._spatial: LRU[Tuple[str, str, str], SpatialIndex] = LRU(NEARBY_CACHE_CITIES * len(self.views))
+
+    def view(self, mobility: MobilityPref, budget: BudgetLevel, origin: Optional[Origin] = None) -> PlaceView:
+        base = self.views[(mobility, budget)]
+        if origin is None or origin.coord == base.origin.coord:
+            return base
+        return self._by_origin.get((origin.coord, mobility, budget), lambda: with_origin(base, origin))
+
+    def within(
+        self, view: PlaceView, city: str, lat: float, lon: float, radius_km: float
+    ) -> List[Tuple[float, PlaceRecord]]:
+        """The view's places of city at most radius_km from (lat, lon), closest first (ties in catalog order).
+
+        Answered by a k-d tree per city and request shape, built on first
+        use; views re-ranked for other origins share their base view's.
+        """
+        places = view.cities[city].places
+        key = (view.mobility, view.budget_level, city)
+        index = self._spatial.get(key, lambda: SpatialIndex([(p.lat, p.lon) for p in places]))
+        return sorted(((d, places[i]) for d, i in index.within(lat, lon, radius_km)), key=lambda h: (h[0], h[1].seq))
+
+    def nearest_unvisited(
+        self, view: PlaceView, city: str, lat: float, lon: float, visited: AbstractSet[str]
+    ) -> Optional[PlaceRecord]:
+        """The place of city closest to (lat, lon) whose id is not in visited."""
+        total = len(view.cities[city].places)
+        radius = NEARBY_START_KM
+        while True:
+            hits = self.within(view, city, lat, lon, radius)
+            found = next((p for _, p in hits if p.id not in visited), None)
+            if found is not None or len(hits) == total or radius > math.pi * EARTH_RADIUS_KM:
+                return found
+            radius *= 4.0
+
+
+class PlannerIndex(ViewIndex):
+    """Precomputed filter results for every mobility x budget combination.
+
+    With ``base``, an index of a previous catalog and the cities whose
+    places changed since, only those cities are grouped and sorted again.
+    """
+
+    def __init__(
+        self, places: List[PlaceRecord], base: Optional[Tuple["PlannerIndex", AbstractSet[str]]] = None
+    ) -> None:
+        self.usable = [p for p in places if is_usable(p)]
+        if base is None:
+            self.views = {
+                (m, b): build_view(self.usable, m, b) for m in get_args(MobilityPref) for b in get_args(BudgetLevel)
+            }
+        else:
+            index, changed = base
+            touched = [p for p in self.usable if p.city_ru in changed]
+            self.views = {key: patch_view(view, self.usable, touched, changed) for key, view in index.views.items()}
+        super().__init__()
+
+
+class CompiledPlannerIndex(ViewIndex):
+    """PlannerIndex read in place from a compiled catalog.
+
+    The filters, city groups and rankings are computed from the mapped
+    columns, and views keep row numbers; a record is built only for a row
+    the planner reads. Orders and ties are those of PlannerIndex over the
+    same places.
+    """
+
+    def __init__(self, catalog: CompiledCatalog) -> None:
+        self.catalog = catalog
+        pool = catalog.strings()  # for the sort keys; dropped once the views are built
+        note = pool.index("note") if "note" in pool else -1
+        minutes = catalog.avg_visit_minutes
+        cat_off, cat_ref = catalog.sections["cat.off"].tolist(), catalog.sections["cat.ref"].tolist()
+        # is_usable on the columns
+        rows = array(
+            "I", (i for i in range(len(catalog)) if minutes[i] > 0 and note not in cat_ref[cat_off[i] : cat_off[i + 1]])
+        )
+        self.usable = CompiledRows(catalog, rows)
+        self.views = {
+            (m, b): compiled_view(catalog, pool, rows, m, b) for m in get_args(MobilityPref) for b in get_args(BudgetLevel)
+        }
+        super().__init__()
@@ -0,0 +1,536 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Set, TextIO, Tuple
+
+from pydantic import ValidationError
+
+from .models import Place
+from .records import FIELDS, PlaceRecord
+
+
+# python -m app ingest SOURCE: catalog updates from CSV, GeoJSON, JSON or JSON lines.
+#
+# The source is read record by record and staged, with the current catalog,
+# in a temporary SQLite file, so memory use does not grow with either of them.
+# Deduplication and the diff against the catalog run there too. The diff is
+# written next to the catalog (places.json.changes.jsonl):
+#
+#   {"from": <old version>, "to": <new version>, "added": 1, "changed": 2, "removed": 0}
+#   {"op": "change", "id": "vyborg_castle", "place": {...}}
+#   {"op": "add", "id": "new_place", "place": {...}}
+#   {"op": "remove", "id": "old_place"}
+#
+# and only the changed rows are then applied: a places.json is rewritten in a
+# single streaming pass, a SQLite catalog gets row and R-tree updates. A
+# server watching a places.json finds the diff when it sees the new version
+# and patches its in-memory indexes for the changed cities instead of
+# loading the whole catalog again.
+
+SOURCE_FORMATS = {
+    ".csv": "csv",
+    ".json": "json",
+    ".geojson": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".geojsonl": "jsonl",
+}
+
+CHUNK_CHARS = 1 << 16
+MAX_RECORD_CHARS = 1 << 24  # a single record larger than this is treated as malformed input
+COORD_DIGITS = 5  # places of one city within about a metre are duplicates
+MAX_REPORTED = 20
+
+log = logging.getLogger(__name__)
+
+_WS = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+_ENCODE = json.JSONEncoder(ensure_ascii=False).encode
+
+_STAGING = """
+CREATE TABLE incoming (id TEXT PRIMARY KEY, ord INTEGER NOT NULL, ck TEXT NOT NULL UNIQUE, body TEXT NOT NULL);
+CREATE TABLE current (id TEXT PRIMARY KEY, ord INTEGER NOT NULL, body TEXT NOT NULL);
+"""
+
+_REMOVED = "SELECT c.id FROM current c LEFT JOIN incoming i ON i.id = c.id WHERE i.id IS NULL ORDER BY c.ord"
+_CHANGED = "SELECT i.id, i.body FROM current c JOIN incoming i ON i.id = c.id WHERE i.body != c.body ORDER BY c.ord"
+_ADDED = "SELECT i.id, i.body FROM incoming i LEFT JOIN current c ON c.id = i.id WHERE c.id IS NULL ORDER BY i.ord"
+
+
+class _JsonStream:
+    """Incremental reader of JSON values from a text file, one buffer chunk at a time."""
+
+    def __init__(self, f: TextIO) -> None:
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _more(self) -> bool:
+        data = "" if self.eof else self.f.read(CHUNK_CHARS)
+        if not data:
+            self.eof = True
+            return False
+        if len(self.buf) - self.pos > MAX_RECORD_CHARS:
+            raise ValueError(f"malformed JSON or a record over {MAX_RECORD_CHARS} characters")
+        self.buf = self.buf[self.pos :] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character, "" at the end of the file."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()  # type: ignore[union-attr]
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"expected {' or '.join(repr(c) for c in chars)}, found {ch or 'end of file'!r}")
+        self.pos += 1
+        return ch
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._more():
+                    continue  # the value goes on in the next chunk
+                raise
+            # A number may also go on in the next chunk
+            if end == len(self.buf) and self._more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_items(f: TextIO) -> Iterator[Any]:
+    """The items of a top-level JSON array, or the features of a GeoJSON FeatureCollection."""
+    stream = _JsonStream(f)
+    if stream.peek() == "{":
+        stream.pos += 1
+        while True:
+            if stream.peek() == "}":
+                raise ValueError('no "features" array')
+            key = stream.value()
+            stream.expect(":")
+            if key == "features":
+                break
+            stream.value()  # type, crs, bbox, ...
+            if stream.peek() == ",":
+                stream.pos += 1
+    stream.expect("[")
+    if stream.peek() == "]":
+        return
+    while True:
+        yield stream.value()
+        if stream.expect(",]") == "]":
+            return
+
+
+def _csv_place(row: Dict[str, Any]) -> Dict[str, Any]:
+    data = {k: (v if v != "" else None) for k, v in row.items() if k in FIELDS}
+    cats = data.get("categories")
+    if isinstance(cats, str):
+        # "museum;park" (or "|"), or a JSON list
+        data["categories"] = json.loads(cats) if cats.startswith("[") else [c.strip() for c in re.split(r"[;|]", cats)]
+    return data
+
+
+def _feature_place(feature: Dict[str, Any]) -> Dict[str, Any]:
+    data = dict(feature.get("properties") or {})
+    geometry = feature.get("geometry") or {}
+    if geometry.get("type") != "Point":
+        raise ValueError("geometry must be a Point")
+    data["lon"], data["lat"] = geometry["coordinates"][:2]
+    if "id" not in data and feature.get("id") is not None:
+        data["id"] = str(feature["id"])
+    return data
+
+
+def place_data(item: Any, fmt: str) -> Dict[str, Any]:
+    """The Place fields of a source item: a CSV row, a JSON line, a place object or a GeoJSON feature."""
+    if fmt == "csv":
+        return _csv_place(item)
+    if isinstance(item, str):
+        item = json.loads(item)
+    if not isinstance(item, dict):
+        raise ValueError("expected an object")
+    return _feature_place(item) if item.get("type") == "Feature" else item
+
+
+def source_format(path: Path, fmt: Optional[str] = None) -> str:
+    fmt = fmt or SOURCE_FORMATS.get(path.suffix.lower())
+    if fmt is None:
+        raise ValueError(f"unknown source format of {path.name}, use --format")
+    return fmt
+
+
+def iter_source(path: Path, fmt: str) -> Iterator[Tuple[str, Any]]:
+    """(location, item) for every record of path, for place_data; the location is for error messages.
+
+    A malformed JSON line only rejects its record, a malformed JSON document ends the stream with a ValueError.
+    """
+    with open(path, encoding="utf-8-sig", newline="" if fmt == "csv" else None) as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield f"line {reader.line_num}", row
+        elif fmt == "jsonl":
+            for n, line in enumerate(f, 1):
+                if line.strip():
+                    yield f"line {n}", line
+        else:
+            for n, item in enumerate(iter_json_items(f), 1):
+                yield f"record {n}", item
+
+
+def coord_key(p: PlaceRecord) -> str:
+    return f"{p.city_ru}|{round(p.lat, COORD_DIGITS)}|{round(p.lon, COORD_DIGITS)}"
+
+
+def place_body(p: PlaceRecord) -> str:
+    # The line export_places and this module write to places.json; equal bodies are equal places
+    return _ENCODE(p.as_dict())
+
+
+def record_of(data: Dict[str, Any], seq: int = 0) -> PlaceRecord:
+    return PlaceRecord.from_model(seq, Place.model_validate(data))
+
+
+@dataclass
+class IngestStats:
+    records: int = 0
+    duplicate_ids: int = 0
+    duplicate_coords: int = 0
+    rejected: int = 0
+    errors: List[str] = field(default_factory=list)  # the first MAX_REPORTED rejections
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+
+    def reject(self, where: str, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED:
+            self.errors.append(f"{where}: {message}")
+
+
+class Staging:
+    """Source and current catalog side by side in a temporary SQLite file."""
+
+    def __init__(self, directory: str) -> None:
+        self.conn = sqlite3.connect(os.path.join(directory, "staging.db"))
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.executescript(_STAGING)
+        self._ord = 0
+
+    def add(self, p: PlaceRecord, stats: IngestStats) -> None:
+        """Stage a source record: a repeated id replaces the earlier record, repeated coordinates are dropped."""
+        ck, body = coord_key(p), place_body(p)
+        try:
+            self.conn.execute("INSERT INTO incoming VALUES (?, ?, ?, ?)", (p.id, self._ord, ck, body))
+            self._ord += 1
+            return
+        except sqlite3.IntegrityError:
+            pass  # the id or the coordinates are taken
+        row = self.conn.execute("SELECT id FROM incoming WHERE ck = ?", (ck,)).fetchone()
+        if row is not None and row[0] != p.id:
+            stats.duplicate_coords += 1
+            return
+        self.conn.execute("UPDATE incoming SET ck = ?, body = ? WHERE id = ?", (ck, body, p.id))
+        stats.duplicate_ids += 1
+
+    def add_current(self, places: Iterator[PlaceRecord]) -> None:
+        try:
+            rows = ((p.id, p.seq, place_body(p)) for p in places)
+            self.conn.executemany("INSERT INTO current VALUES (?, ?, ?)", rows)
+        except sqlite3.IntegrityError:
+            raise ValueError("the current catalog has duplicate ids") from None
+
+    def count(self, sql: str) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0]
+
+    def diff(self, keep_missing: bool) -> Iterator[Dict[str, Any]]:
+        """Diff lines: changes in catalog order, then additions in source order, then removals."""
+        for place_id, body in self.conn.execute(_CHANGED):
+            yield {"op": "change", "id": place_id, "place": json.loads(body)}
+        for place_id, body in self.conn.execute(_ADDED):
+            yield {"op": "add", "id": place_id, "place": json.loads(body)}
+        if not keep_missing:
+            for (place_id,) in self.conn.execute(_REMOVED):
+                yield {"op": "remove", "id": place_id}
+
+    def catalog_lines(self, keep_missing: bool) -> Iterator[str]:
+        """The bodies of the updated catalog: current order, additions appended."""
+        kept = "" if keep_missing else " WHERE i.id IS NOT NULL"
+        sql = f"SELECT COALESCE(i.body, c.body) FROM current c LEFT JOIN incoming i ON i.id = c.id{kept} ORDER BY c.ord"
+        for (body,) in self.conn.execute(sql):
+            yield body
+        for _, body in self.conn.execute(_ADDED):
+            yield body
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def changes_path(catalog_path: Path) -> Path:
+    return catalog_path.with_name(catalog_path.name + ".changes.jsonl")
+
+
+def write_json_catalog(bodies: Iterator[str], out: Optional[IO[bytes]]) -> str:
+    """Write places.json in export_places' layout to out, or only hash it; returns catalog.content_version."""
+    digest = hashlib.sha256()
+    parts = itertools.chain(["[\n"], (("" if i == 0 else ",\n") + b for i, b in enumerate(bodies)), ["\n]\n"])
+    for part in parts:
+        data = part.encode("utf-8")
+        digest.update(data)
+        if out is not None:
+            out.write(data)
+    return digest.hexdigest()[:16]
+
+
+def file_version(path: Path) -> str:
+    """catalog.content_version of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def iter_json_catalog(path: Path) -> Iterator[PlaceRecord]:
+    with open(path, encoding="utf-8") as f:
+        for seq, item in enumerate(iter_json_items(f)):
+            yield record_of(item, seq)
+
+
+def _write_diff(out: IO[bytes], header: Dict[str, Any], body: Path) -> None:
+    out.write((json.dumps(header) + "\n").encode("utf-8"))
+    with open(body, "rb") as f:
+        shutil.copyfileobj(f, out)
+
+
+def _message(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'place'}: {err['msg']}" for err in e.errors()[:3])
+    return str(e) or type(e).__name__
+
+
+def ingest(
+    source: Path,
+    catalog_path: Path,
+    fmt: Optional[str] = None,
+    keep_missing: bool = False,
+    skip_invalid: bool = False,
+    dry_run: bool = False,
+    diff_out: Optional[IO[bytes]] = None,
+) -> IngestStats:
+    """Bring the catalog at catalog_path (places.json or SQLite) in line with source.
+
+    Without keep_missing the source is the whole catalog, and places it
+    lacks are removed; with it the source only adds and updates places.
+    Invalid records stop the update unless skip_invalid is set. With
+    dry_run the diff goes to diff_out and nothing is written.
+    """
+    from .store import DB_SUFFIXES, PlaceStore, import_places, patch_places  # store depends on the planner
+
+    fmt = source_format(source, fmt)
+    is_db = catalog_path.suffix in DB_SUFFIXES
+    stats = IngestStats()
+    with tempfile.TemporaryDirectory(prefix="tourplanner-ingest-") as tmp:
+        staging = Staging(tmp)
+        try:
+            for where, item in iter_source(source, fmt):
+                stats.records += 1
+                try:
+                    place = record_of(place_data(item, fmt))
+                except (ValueError, KeyError, TypeError, IndexError) as e:  # ValidationError is a ValueError
+                    stats.reject(where, _message(e))
+                    continue
+                staging.add(place, stats)
+            if stats.rejected and not skip_invalid:
+                return stats
+
+            old_version = ""
+            if catalog_path.exists():
+                if is_db:
+                    store = PlaceStore(catalog_path)
+                    old_version = store.version
+                    staging.add_current(store.iter_places(("1", ()), "seq"))
+                else:
+                    old_version = file_version(catalog_path)
+                    staging.add_current(iter_json_catalog(catalog_path))
+            stats.changed = staging.count(_CHANGED)
+            stats.added = staging.count(_ADDED)
+            stats.removed = 0 if keep_missing else staging.count(_REMOVED)
+            if not (stats.changed or stats.added or stats.removed):
+                return stats
+
+            # The diff body first: it names a SQLite catalog's new version
+            body = Path(tmp) / "diff.jsonl"
+            digest = hashlib.sha256(old_version.encode())
+            with open(body, "wb") as f:
+                for line in staging.diff(keep_missing):
+                    data = (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+                    digest.update(data)
+                    f.write(data)
+            new_catalog = catalog_path.with_name(catalog_path.name + ".tmp")
+            if is_db:
+                version = digest.hexdigest()[:16]
+            elif dry_run:
+                version = write_json_catalog(staging.catalog_lines(keep_missing), None)
+            else:
+                with open(new_catalog, "wb") as out:
+                    version = write_json_catalog(staging.catalog_lines(keep_missing), out)
+            header = {"from": old_version or None, "to": version}
+            header.update(added=stats.added, changed=stats.changed, removed=stats.removed)
+
+            if dry_run:
+                if diff_out is not None:
+                    _write_diff(diff_out, header, body)
+                return stats
+            # The diff is in place before the catalog changes, so a watching server finds it
+            sidecar = changes_path(catalog_path)
+            with open(sidecar.with_name(sidecar.name + ".tmp"), "wb") as f:
+                _write_diff(f, header, body)
+            os.replace(f.name, sidecar)
+            if not is_db:
+                os.replace(new_catalog, catalog_path)
+            elif not old_version:
+                bodies = staging.catalog_lines(keep_missing)
+                import_places((record_of(json.loads(b), seq) for seq, b in enumerate(bodies)), catalog_path, version)
+            else:
+                removed = () if keep_missing else (place_id for (place_id,) in staging.conn.execute(_REMOVED))
+                # Changes and additions, without the removals
+                upserts = (record_of(line["place"]) for line in staging.diff(keep_missing=True))
+                patch_places(catalog_path, removed, upserts, version)
+            return stats
+        finally:
+            staging.close()
+
+
+@dataclass
+class Changes:
+    removed: Set[str]
+    changed: Dict[str, PlaceRecord]
+    added: List[PlaceRecord]
+
+
+def read_changes(path: Path, from_version: str, to_version: str) -> Optional[Changes]:
+    """The diff from_version -> to_version that ingest wrote to path, or None when path holds another one."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline() or "null")
+            if not isinstance(header, dict) or (header.get("from"), header.get("to")) != (from_version, to_version):
+                return None
+            changes = Changes(set(), {}, [])
+            for line in f:
+                item = json.loads(line)
+                if item["op"] == "remove":
+                    changes.removed.add(item["id"])
+                elif item["op"] == "change":
+                    changes.changed[item["id"]] = record_of(item["place"])
+                else:
+                    changes.added.append(record_of(item["place"]))
+            return changes
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        log.warning("ignoring %s: %s", path, e)
+        return None
+
+
+def apply_changes(places: Sequence[PlaceRecord], changes: Changes) -> Tuple[List[PlaceRecord], Set[str]]:
+    """The places after changes, and the cities whose places differ.
+
+    Same order as the rewritten places.json. Kept and changed places keep
+    their seq, added ones continue after the largest, so seq stays a stable
+    key but is no longer the position.
+    """
+    out: List[PlaceRecord] = []
+    cities: Set[str] = set()
+    next_seq = max((p.seq for p in places), default=-1) + 1
+    for p in places:
+        if p.id in changes.removed:
+            cities.add(p.city_ru)
+            continue
+        new = changes.changed.get(p.id)
+        if new is not None:
+            new.seq = p.seq
+            cities.update((p.city_ru, new.city_ru))
+            p = new
+        out.append(p)
+    for p in changes.added:
+        p.seq = next_seq
+        next_seq += 1
+        cities.add(p.city_ru)
+        out.append(p)
+    return out, cities
+
+
+def _cli(argv: Sequence[str]) -> None:
+    import argparse
+
+    from .catalog import DATA_PATH
+    from .config import settings
+
+    default = settings.catalog_db_path or settings.catalog_path
+    parser = argparse.ArgumentParser(
+        prog="python -m app ingest", description="Update the catalog from a CSV, GeoJSON, JSON or JSON lines source"
+    )
+    parser.add_argument("source", type=Path)
+    parser.add_argument("--format", choices=sorted(set(SOURCE_FORMATS.values())), default=None)
+    parser.add_argument("--catalog", type=Path, default=Path(default) if default else DATA_PATH)
+    parser.add_argument("--keep-missing", action="store_true", help="the source is a partial feed: remove nothing")
+    parser.add_argument("--skip-invalid", action="store_true", help="apply the valid records despite rejected ones")
+    parser.add_argument("--dry-run", action="store_true", help="print the diff, change nothing")
+    args = parser.parse_args(list(argv))
+
+    stats = ingest(
+        args.source,
+        args.catalog,
+        args.format,
+        keep_missing=args.keep_missing,
+        skip_invalid=args.skip_invalid,
+        dry_run=args.dry_run,
+        diff_out=sys.stdout.buffer,
+    )
+    report = sys.stderr if args.dry_run else sys.stdout
+    for error in stats.errors:
+        print(f"{args.source}: {error}", file=sys.stderr)
+    if stats.rejected > len(stats.errors):
+        print(f"{args.source}: ... {stats.rejected - len(stats.errors)} more rejected", file=sys.stderr)
+    print(
+        f"{args.source}: {stats.records} records, {stats.rejected} rejected, "
+        f"{stats.duplicate_ids} repeated ids, {stats.duplicate_coords} repeated coordinates",
+        file=report,
+    )
+    if stats.rejected and not args.skip_invalid:
+        print(f"{args.catalog}: not updated (use --skip-invalid to apply the valid records)", file=sys.stderr)
+        sys.exit(1)
+    if not (stats.added or stats.changed or stats.removed):
+        print(f"{args.catalog}: unchanged", file=report)
+        return
+    action = "would change" if args.dry_run else "updated"
+    print(
+        f"{args.catalog}: {action}, {stats.added} added, {stats.changed} changed, {stats.removed} removed",
+        file=report,
+    )
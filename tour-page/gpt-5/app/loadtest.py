@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+# Load generator for /api/plan:
+#
+#   python -m app.loadtest --spawn --workers 2 --model closed --concurrency 32 --duration 20 --out load.json
+#   python -m app.loadtest --url http://127.0.0.1:8000 --model open --rate 300 --duration 20
+#
+# closed: `concurrency` users, each sends its next request when the previous answer arrives.
+# open:   Poisson arrivals at `rate` per second regardless of answers (capped by --max-inflight);
+#         latency counts from the scheduled send time, so a stalled server is not hidden.
+#
+# The report uses the benchmark result layout, so two runs can be compared with
+# `python -m benchmarks compare load-new.json load.json`; each entry gates on GATED_METRICS.
+
+# A load test regresses on its tail latency and error rate as well as its median
+GATED_METRICS = ("median_ms", "p99_ms", "error_rate")
+
+# field -> value: weight; every request draws each field independently
+DEFAULT_MIX: Dict[str, Dict[str, float]] = {
+    "days": {"1": 3, "2": 4, "3": 2, "5": 1},
+    "budget_level": {"economy": 1, "standard": 2, "comfort": 1},
+    "mobility": {"strict": 2, "normal": 1},
+    "lang": {"ru": 3, "en": 1},
+}
+DEFAULT_SEEDS = 1000  # distinct seeds; fewer seeds mean more plan cache hits
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class Mix:
+    fields: Dict[str, Dict[str, float]]
+    seeds: int = DEFAULT_SEEDS
+    extra: Dict[str, Any] = field(default_factory=dict)  # sent with every request, e.g. {"compact": true}
+
+    @classmethod
+    def load(cls, path: Optional[Path]) -> "Mix":
+        """JSON: {"days": {"2": 3, "3": 1} or [2, 3], ..., "seeds": 100, "extra": {...}}."""
+        if path is None:
+            return cls(DEFAULT_MIX)
+        raw = json.loads(Path(path).read_text(encoding="utf-8"))
+        seeds = int(raw.pop("seeds", DEFAULT_SEEDS))
+        extra = raw.pop("extra", {})
+        fields = {k: v if isinstance(v, dict) else {str(x): 1.0 for x in v} for k, v in raw.items()}
+        return cls(fields, seeds, extra)
+
+    def bodies(self, rng: random.Random, count: int) -> List[bytes]:
+        """``count`` request bodies drawn up front, so generating load costs nothing per request."""
+        choices = {k: (list(v), list(v.values())) for k, v in self.fields.items()}
+        out = []
+        for _ in range(count):
+            body: Dict[str, Any] = dict(self.extra)
+            for name, (values, weights) in choices.items():
+                value = rng.choices(values, weights)[0]
+                body[name] = int(value) if name == "days" else value
+            body["seed"] = rng.randrange(self.seeds)
+            out.append(json.dumps(body, separators=(",", ":")).encode())
+        return out
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client; enough for JSON POSTs, no dependencies."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, path: str, body: bytes) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: application/json\r\n"
+            f"Accept-Encoding: gzip\r\nContent-Length: {len(body)}\r\n\r\n"
+        )
+        self.writer.write(head.encode() + body)
+        reader = self.reader
+        assert reader is not None
+        status_line = await reader.readuntil(b"\r\n")
+        status = int(status_line.split(b" ", 2)[1])
+        length, chunked, close = 0, False, False
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding" and b"chunked" in value.lower():
+                chunked = True
+            elif name == b"connection" and b"close" in value.lower():
+                close = True
+        if chunked:
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif length:
+            await reader.readexactly(length)
+        if close:
+            self.close()
+        return status
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Recorder:
+    def __init__(self, warmup_until: float) -> None:
+        self.warmup_until = warmup_until
+        self.latencies: List[float] = []
+        self.status: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, started: float, status: Optional[int]) -> None:
+        if started < self.warmup_until:
+            return
+        key = str(status) if status is not None else "error"
+        self.status[key] = self.status.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors += 1
+        else:
+            self.latencies.append((time.perf_counter() - started) * 1000.0)
+
+
+async def _send(conn: Connection, path: str, body: bytes, started: float, rec: Recorder, timeout: float) -> None:
+    try:
+        status: Optional[int] = await asyncio.wait_for(conn.request(path, body), timeout)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+        conn.close()
+        status = None
+    rec.record(started, status)
+
+
+async def closed_loop(
+    host: str, port: int, path: str, bodies: List[bytes], concurrency: int, until: float, rec: Recorder, timeout: float
+) -> None:
+    async def user(k: int) -> None:
+        conn = Connection(host, port)
+        i = k
+        while time.perf_counter() < until:
+            await _send(conn, path, bodies[i % len(bodies)], time.perf_counter(), rec, timeout)
+            i += concurrency
+        conn.close()
+
+    await asyncio.gather(*(user(k) for k in range(concurrency)))
+
+
+async def open_loop(
+    host: str,
+    port: int,
+    path: str,
+    bodies: List[bytes],
+    rate: float,
+    max_inflight: int,
+    until: float,
+    rec: Recorder,
+    timeout: float,
+    rng: random.Random,
+) -> None:
+    idle: List[Connection] = []
+    inflight: set = set()
+    dropped = 0
+
+    async def one(body: bytes, scheduled: float) -> None:
+        conn = idle.pop() if idle else Connection(host, port)
+        await _send(conn, path, body, scheduled, rec, timeout)
+        idle.append(conn)
+
+    i = 0
+    next_at = time.perf_counter()
+    while next_at < until:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(inflight) >= max_inflight:
+            # The client is the bottleneck now; count it instead of queueing without bound
+            dropped += 1
+            rec.record(next_at, None)
+        else:
+            task = asyncio.create_task(one(bodies[i % len(bodies)], next_at))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        i += 1
+        next_at += rng.expovariate(rate)
+    if inflight:
+        await asyncio.gather(*inflight)
+    for conn in idle:
+        conn.close()
+    if dropped:
+        rec.status["client_dropped"] = dropped
+
+
+def _percentile(sorted_ms: Sequence[float], q: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * q))]
+
+
+def summarize(rec: Recorder, seconds: float) -> Dict[str, Any]:
+    lat = sorted(rec.latencies)
+    total = len(lat) + rec.errors
+    return {
+        "requests": total,
+        "errors": rec.errors,
+        "error_rate": round(rec.errors / total, 4) if total else 0.0,
+        "throughput_rps": round(len(lat) / seconds, 2) if seconds > 0 else 0.0,
+        "min_ms": round(lat[0], 3) if lat else 0.0,
+        "median_ms": round(_percentile(lat, 0.5), 3),
+        "p95_ms": round(_percentile(lat, 0.95), 3),
+        "p99_ms": round(_percentile(lat, 0.99), 3),
+        "max_ms": round(lat[-1], 3) if lat else 0.0,
+        "mean_ms": round(sum(lat) / len(lat), 3) if lat else 0.0,
+        "status": dict(sorted(rec.status.items())),
+        "gate": list(GATED_METRICS),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port: int, workers: int, execution_mode: Optional[str], timeout: float = 120.0) -> subprocess.Popen:
+    """Start `python -m app serve` on 127.0.0.1:port and wait for /healthz."""
+    env = dict(os.environ)
+    if execution_mode:
+        env["APP_EXECUTION_MODE"] = execution_mode
+    cmd = [sys.executable, "-m", "app", "serve", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}: {' '.join(cmd)}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+                s.sendall(b"GET /healthz HTTP/1.1\r\nHost: loadtest\r\nConnection: close\r\n\r\n")
+                if s.recv(64).startswith(b"HTTP/1.1 200"):
+                    return proc
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not become healthy")
+
+
+def run(args: Any) -> Dict[str, Any]:
+    proc = None
+    if args.spawn:
+        port = _free_port()
+        proc = spawn_server(port, args.workers, args.execution_mode)
+        host = "127.0.0.1"
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname or "127.0.0.1", url.port or 80
+    rng = random.Random(args.seed)
+    bodies = Mix.load(args.mix).bodies(rng, 4096)
+    try:
+        started = time.perf_counter()
+        warmup_until = started + args.warmup
+        until = warmup_until + args.duration
+        rec = Recorder(warmup_until)
+        if args.model == "closed":
+            coro = closed_loop(host, port, args.path, bodies, args.concurrency, until, rec, args.timeout)
+            label = f"c={args.concurrency}"
+        else:
+            coro = open_loop(
+                host, port, args.path, bodies, args.rate, args.max_inflight, until, rec, args.timeout, rng
+            )
+            label = f"rate={args.rate:g}"
+        asyncio.run(coro)
+        seconds = time.perf_counter() - warmup_until
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=40)
+    mode = args.execution_mode or os.environ.get("APP_EXECUTION_MODE", "thread")
+    workers = f",workers={args.workers},exec={mode}" if args.spawn else ""
+    name = f"loadtest.plan[model={args.model},{label}{workers}]"
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "target": f"{host}:{port}{args.path}",
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "mix": str(args.mix) if args.mix else "default",
+        },
+        "results": {name: summarize(rec, seconds)},
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app.loadtest", description="Load generator for /api/plan")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://127.0.0.1:8000", help="running server")
+    target.add_argument("--spawn", action="store_true", help="start `python -m app serve` on a free port")
+    parser.add_argument("--workers", type=int, default=1, help="server workers with --spawn")
+    parser.add_argument("--execution-mode", choices=["inline", "thread", "process"], default=None)
+    parser.add_argument("--path", default="/api/plan")
+    parser.add_argument("--model", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=16, help="closed model: concurrent users")
+    parser.add_argument("--rate", type=float, default=100.0, help="open model: requests per second")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="open model: client-side cap")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds sent but not recorded")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--mix", type=Path, default=None, help="JSON request mix (default: built-in)")
+    parser.add_argument("--seed", type=int, default=42, help="seeds the request mix and arrivals")
+    parser.add_argument("--out", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
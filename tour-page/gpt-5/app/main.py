@@ -1,54 +1,191 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
 import json
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import astuple, replace
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import ValidationError
 
-from .config import settings
-from .models import PlanRequest, ErrorResponse
-from .planner import PlannerConfig, plan_itinerary
+from . import prefork, serialization
+from .assets import IMMUTABLE, Asset, AssetStore, pick_variant
+from .cache import CachedResponse, ResponseCache
+from .catalog import CatalogSnapshot, catalog
+from .compression import CompressionMiddleware
+from .config import Lang, settings
+from .executor import CatalogVersionMismatch, ExecutorSaturated, PlanExecutor
+from .metrics import CONTENT_TYPE, Callback, MetricsMiddleware, plan_stages, registry, server_timing
+from .models import OriginPoint, PlanBatchRequest, PlanEditRequest, PlanRequest, PlanStreamStart, ErrorResponse
+from .origins import ORIGINS, Origin, resolve_origin
+from .profiling import FORMATS, ProfileStore, profile_call
+from .planner import (
+    PlannerConfig,
+    ReplanError,
+    plan_itinerary,
+    plan_schedule,
+    render_day_json,
+    render_plan_json,
+    render_plan_timed,
+    render_replan_json,
+    shortened_message,
+)
+from .travel import PROFILES
 from .utils import translate
 
 
-app = FastAPI(title="Tour Planner 55+ for Leningrad Oblast", docs_url=None, redoc_url=None)
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    # Load the catalog once at startup instead of on the first request
+    catalog.snapshot()
+    executor.start()
+    try:
+        yield
+    finally:
+        executor.shutdown()
+
+
+app = FastAPI(title="Tour Planner 55+ for Leningrad Oblast", docs_url=None, redoc_url=None, lifespan=lifespan)
 
 static_dir = Path(__file__).resolve().parent / "static"
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+# Hashed, precompressed SPA from `python -m app build-static`; empty when not built
+assets = AssetStore()
+if settings.compress_min_bytes > 0:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compress_min_bytes)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+
+def asset_response(asset: Asset, req: Request, cache_control: str) -> Response:
+    encoding, body = pick_variant(asset, req.headers.get("accept-encoding"))
+    etag = asset.etag_for(encoding)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(req.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=asset.media_type, headers=headers)
 
 
 @app.get("/", response_class=HTMLResponse)
-def index() -> Any:
+def index(req: Request) -> Any:
+    if assets.index is not None:
+        # Revalidated on every load, so a new build's asset names are picked up right away
+        return asset_response(assets.index, req, "no-cache")
     index_path = static_dir / "index.html"
     return FileResponse(str(index_path))
 
 
+@app.get("/assets/{name}")
+def asset(name: str, req: Request) -> Response:
+    found = assets.get(name)
+    if found is None:
+        raise HTTPException(status_code=404)
+    return asset_response(found, req, IMMUTABLE)
+
+
 @app.get("/healthz")
 def healthz() -> dict:
     return {"status": "ok"}
 
 
-@app.post("/api/plan")
-async def api_plan(req: Request) -> Any:
-    lang = settings.default_language
+@app.get("/metrics")
+def metrics() -> Response:
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404)
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(settings.admin_token and token and hmac.compare_digest(token, settings.admin_token))
+
+
+def require_admin(token: Optional[str]) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=404)
+    if not is_admin(token):
+        raise HTTPException(status_code=403)
+
+
+@app.post("/admin/catalog/reload")
+def admin_catalog_reload(x_admin_token: Optional[str] = Header(default=None)) -> Any:
+    require_admin(x_admin_token)
+    if prefork.request_reload():
+        # The supervisor loads the new generation and replaces the workers (this one included)
+        snap = catalog.snapshot()
+        return JSONResponse(
+            status_code=202, content={"ok": True, "version": snap.version, "places": len(snap.places), "scheduled": True}
+        )
     try:
-        payload = await req.json()
+        snap = catalog.reload()
     except Exception:
-        # Fallback to default language
-        msg = translate("error_general", lang)
-        return JSONResponse(status_code=400, content=ErrorResponse(ok=False, error=msg).model_dump())
+        return JSONResponse(status_code=500, content=ErrorResponse(ok=False, error="catalog reload failed").model_dump())
+    return {"ok": True, "version": snap.version, "places": len(snap.places)}
+
+
+@app.get("/admin/profiles")
+def admin_profiles(x_admin_token: Optional[str] = Header(default=None)) -> Any:
+    require_admin(x_admin_token)
+    return {"ok": True, "enabled": settings.profile_enabled, "profiles": profiles.list()}
+
+
+@app.get("/admin/profiles/{name}")
+def admin_profile(name: str, x_admin_token: Optional[str] = Header(default=None)) -> Any:
+    require_admin(x_admin_token)
+    path = profiles.path(name)
+    if path is None:
+        raise HTTPException(status_code=404)
+    media_type = "text/plain; charset=utf-8" if name.endswith(".folded") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+class RequestError(Exception):
+    def __init__(
+        self,
+        status_code: int,
+        error: str,
+        details: Optional[Dict[str, Any]] = None,
+        retry_after: Optional[int] = None,
+    ) -> None:
+        super().__init__(error)
+        self.status_code = status_code
+        self.error = error
+        self.details = details
+        self.retry_after = retry_after
 
+    def response(self) -> JSONResponse:
+        headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+        return JSONResponse(
+            status_code=self.status_code,
+            content=ErrorResponse(ok=False, error=self.error, details=self.details).model_dump(),
+            headers=headers,
+        )
+
+
+def request_lang(payload: Any) -> Lang:
     # validate language early for error translations
-    body_lang = str(payload.get("lang", settings.default_language)).lower()
-    if body_lang in ("ru", "en"):
-        lang = body_lang
+    body_lang = str(payload.get("lang", settings.default_language)).lower() if isinstance(payload, dict) else ""
+    return body_lang if body_lang in ("ru", "en") else settings.default_language  # type: ignore[return-value]
 
+
+def parse_plan_request(payload: Any) -> PlanRequest:
+    lang = request_lang(payload)
+    if not isinstance(payload, dict):
+        raise RequestError(400, translate("error_general", lang))
     try:
-        data = PlanRequest(**payload)
+        return PlanRequest(**payload)
     except ValidationError as e:
         # Map pydantic field errors to friendly messages
         # Identify which field failed for helpful RU/EN message
@@ -63,19 +200,444 @@ async def api_plan(req: Request) -> Any:
             msg = translate("error_invalid_lang", lang)
         else:
             msg = translate("error_general", lang)
-        return JSONResponse(
-            status_code=400, content=ErrorResponse(ok=False, error=msg, details=field_errors).model_dump()
-        )
+        raise RequestError(400, msg, field_errors)
 
+
+def decode_plan_request(raw: bytes) -> PlanRequest:
+    if settings.fast_json:
+        try:
+            return serialization.decode_plan_request(raw)
+        except ValidationError:
+            pass  # re-parsed below only to build the translated error
     try:
-        cfg = PlannerConfig(
-            budget_level=data.budget_level, mobility=data.mobility, seed=data.seed or settings.seed, lang=data.lang
-        )
-        itinerary = plan_itinerary(days=data.days, cfg=cfg)
-        return JSONResponse(content=itinerary.model_dump())
+        payload = serialization.loads(raw)
+    except Exception:
+        # Fallback to default language
+        raise RequestError(400, translate("error_general", settings.default_language))
+    return parse_plan_request(payload)
+
+
+# Resolved once, so a misconfigured APP_DEFAULT_ORIGIN fails at startup
+DEFAULT_ORIGIN = resolve_origin(settings.default_origin)
+
+
+def planner_config(data: PlanRequest) -> PlannerConfig:
+    has_limits = data.day_minutes is not None or data.trip_budget_rub is not None
+    return PlannerConfig(
+        budget_level=data.budget_level,
+        mobility=data.mobility,
+        seed=data.seed or settings.seed,
+        lang=data.lang,
+        max_places_per_day=settings.max_places_per_day,
+        optimizer=settings.route_optimizer,
+        optimizer_budget_ms=settings.route_budget_ms,
+        allocator=data.allocator or ("global" if has_limits else settings.allocator),
+        day_minutes=data.day_minutes or settings.day_minutes,
+        trip_budget_rub=data.trip_budget_rub,
+        allocation_budget_ms=settings.allocation_budget_ms,
+        speed_profile=data.speed_profile or settings.speed_profile,
+        weather=day_weather(data),
+        origin=request_origin(data),
+    )
+
+
+def request_origin(data: PlanRequest) -> Origin:
+    if isinstance(data.origin, OriginPoint):
+        return resolve_origin(lat=data.origin.lat, lon=data.origin.lon)
+    return resolve_origin(data.origin) if data.origin else DEFAULT_ORIGIN
+
+
+def day_weather(data: PlanRequest) -> Tuple[str, ...]:
+    # Trailing dry days dropped, so an all-dry trip shares its cache key with one that does not say
+    weather = [data.weather] * data.days if isinstance(data.weather, str) else data.weather[: data.days]
+    while weather and weather[-1] == "dry":
+        weather = weather[:-1]
+    return tuple(weather)
+
+
+executor = PlanExecutor(
+    mode=settings.execution_mode,
+    workers=settings.executor_workers,
+    queue_depth=settings.executor_queue,
+    timeout_seconds=settings.plan_timeout_seconds,
+)
+
+plan_cache = ResponseCache(max_entries=settings.plan_cache_size, ttl_seconds=settings.plan_cache_ttl)
+
+profiles = ProfileStore(settings.profile_dir, settings.profile_keep, settings.profile_format)
+
+registry.register(
+    Callback(
+        "tourplanner_plan_cache_requests_total",
+        "Plan cache lookups by result",
+        lambda: [(("hit",), plan_cache.hits), (("miss",), plan_cache.misses), (("coalesced",), plan_cache.coalesced)],
+        ("result",),
+        kind="counter",
+    )
+)
+registry.register(
+    Callback("tourplanner_plan_cache_entries", "Plans held in the response cache", lambda: [((), len(plan_cache))])
+)
+registry.register(
+    Callback(
+        "tourplanner_executor_outstanding",
+        "Plans running or queued in the executor",
+        lambda: [((), executor.outstanding)],
+    )
+)
+registry.register(
+    Callback(
+        "tourplanner_catalog_places",
+        "Places in the active catalog snapshot",
+        lambda: [((snap.version, snap.source), len(snap.places)) for snap in [catalog.snapshot()]],
+        ("version", "source"),
+    )
+)
+
+
+def plan_cache_key(days: int, cfg: PlannerConfig, catalog_version: str, compact: bool = False) -> Tuple[Any, ...]:
+    # Everything the itinerary depends on; solver timings aside, equal keys give equal plans
+    return (catalog_version, days, compact, *astuple(cfg))
+
+
+def etag_for(key: Tuple[Any, ...]) -> str:
+    # Weak: the route solver_ms inside the body may differ between equivalent responses
+    return 'W/"' + hashlib.sha1(repr(key).encode()).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (t.removeprefix("W/") for t in tags)
+
+
+async def run_planner(lang: Lang, fn: Any, *args: Any) -> Any:
+    """executor.run with a full queue and timeouts turned into RequestErrors."""
+    try:
+        return await executor.run(fn, *args)
+    except ExecutorSaturated:
+        raise RequestError(503, translate("error_busy", lang), retry_after=settings.retry_after_seconds)
+    except CatalogVersionMismatch:
+        # A worker already has a newer catalog than this process; the retry is planned against it
+        raise RequestError(503, translate("error_busy", lang), retry_after=settings.retry_after_seconds)
+    except asyncio.TimeoutError:
+        raise RequestError(504, translate("error_timeout", lang))
+
+
+async def build_plan(
+    data: PlanRequest, snap: Optional[CatalogSnapshot] = None, timing: Optional[Dict[str, float]] = None
+) -> CachedResponse:
+    """Cached plan bytes; timing, if given, receives stage seconds when the plan was computed."""
+    cfg = planner_config(data)
+    snap = snap or catalog.snapshot()
+    key = plan_cache_key(data.days, cfg, snap.version, data.compact)
+
+    async def compute() -> CachedResponse:
+        # Process workers plan from their own catalog, pinned to the version in the cache key
+        args = (data.days, cfg, executor.pin(snap), data.compact)
+        if not settings.metrics_enabled and timing is None:
+            body = await run_planner(data.lang, render_plan_json, *args)
+        else:
+            started = time.perf_counter()
+            body, worker_stages = await run_planner(data.lang, render_plan_timed, *args)
+            # Whatever the worker did not measure was spent waiting for or talking to it
+            queued = max(0.0, time.perf_counter() - started - sum(worker_stages.values()))
+            stages = {"queue": queued, **worker_stages}
+            if settings.metrics_enabled:
+                for name, secs in stages.items():
+                    plan_stages.observe(secs, name)
+            if timing is not None:
+                timing.update(stages)
+        return CachedResponse(body=body, etag=etag_for(key))
+
+    return await plan_cache.get_or_compute(key, compute)
+
+
+def wanted_profile(req: Request) -> Optional[str]:
+    """Profile format for this request, if it is to be profiled.
+
+    X-Profile (``1``, ``pstats`` or ``collapsed``) counts only with the
+    admin token, so clients cannot make the server profile at will; other
+    requests are sampled at APP_PROFILE_SAMPLE_RATE.
+    """
+    if not settings.profile_enabled:
+        return None
+    asked = req.headers.get("x-profile")
+    if asked is not None and is_admin(req.headers.get("x-admin-token")):
+        return asked if asked in FORMATS else profiles.format
+    if settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate:
+        return profiles.format
+    return None
+
+
+async def profile_plan(data: PlanRequest, snap: CatalogSnapshot, fmt: str) -> Tuple[CachedResponse, str]:
+    """build_plan without the cache, computed under the profiler; also returns the profile's name."""
+    cfg = planner_config(data)
+    args = (data.days, cfg, executor.pin(snap), data.compact)
+    started = time.perf_counter()
+    body, fmt, profile = await run_planner(data.lang, profile_call, fmt, render_plan_json, *args)
+    meta = {
+        "route": "/api/plan",
+        "request": data.model_dump(mode="json", exclude_none=True),
+        "catalog_version": snap.version,
+        "execution_mode": executor.mode,
+        "wall_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+    name = await asyncio.to_thread(profiles.save, fmt, profile, meta)
+    return CachedResponse(body=body, etag=etag_for(plan_cache_key(data.days, cfg, snap.version, data.compact))), name
+
+
+def plan_token(data: PlanRequest, catalog_version: str) -> str:
+    """Opaque handle on a plan: its request and catalog version, so any worker can rebuild it."""
+    payload = {"v": catalog_version, "r": data.model_dump(mode="json", exclude={"compact"}, exclude_none=True)}
+    return base64.urlsafe_b64encode(serialization.dumps(payload)).decode("ascii").rstrip("=")
+
+
+def read_plan_token(token: str, snap: CatalogSnapshot, lang: Lang) -> PlanRequest:
+    try:
+        payload = serialization.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        version, request = payload["v"], PlanRequest(**payload["r"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise RequestError(400, translate("error_general", lang), {"token": "invalid"})
+    if version != snap.version:
+        # The same request would now give another plan than the one being edited
+        raise RequestError(409, translate("error_plan_expired", request.lang))
+    return request
+
+
+def plan_response(req: Request, cached: CachedResponse) -> Response:
+    if req.method in ("GET", "HEAD"):
+        # The URL is the whole request, so shared caches may keep the plan
+        headers = {"ETag": cached.etag, "Cache-Control": f"public, max-age={settings.plan_cache_max_age}"}
+        if etag_matches(req.headers.get("if-none-match"), cached.etag):
+            return Response(status_code=304, headers=headers)
+    else:
+        # A POST response is not reusable for a later request to the same URL; POST always gets the body
+        headers = {"ETag": cached.etag, "Cache-Control": "no-store"}
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+async def handle_plan(req: Request, data: PlanRequest, started: float) -> Response:
+    fmt = wanted_profile(req)
+    timing: Optional[Dict[str, float]] = {} if settings.server_timing and fmt is None else None
+    parsed = time.perf_counter()
+    snap = catalog.snapshot()
+    profile_id = None
+    try:
+        if fmt is None:
+            cached = await build_plan(data, snap, timing)
+        else:
+            cached, profile_id = await profile_plan(data, snap, fmt)
+    except RequestError as e:
+        return e.response()
     except Exception:
-        msg = translate("error_general", lang)
-        return JSONResponse(status_code=500, content=ErrorResponse(ok=False, error=msg).model_dump())
+        return RequestError(500, translate("error_general", data.lang)).response()
+    response = plan_response(req, cached)
+    response.headers["X-Plan-Token"] = plan_token(data, snap.version)
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    if timing is not None:
+        # Empty timing: served from the cache or by another request's computation
+        header = server_timing({"parse": parsed - started, **timing}, total=time.perf_counter() - started)
+        response.headers["Server-Timing"] = f"cache;desc={'miss' if timing else 'hit'}, {header}"
+    return response
+
+
+@app.post("/api/plan")
+async def api_plan(req: Request) -> Any:
+    started = time.perf_counter()
+    try:
+        data = decode_plan_request(await req.body())
+    except RequestError as e:
+        return e.response()
+    return await handle_plan(req, data, started)
+
+
+@app.get("/api/plan")
+async def api_plan_get(req: Request) -> Any:
+    # Same parameters as the POST body, as a query string, so responses are cacheable
+    started = time.perf_counter()
+    try:
+        data = parse_plan_request(dict(req.query_params))
+    except RequestError as e:
+        return e.response()
+    return await handle_plan(req, data, started)
+
+
+@app.post("/api/plan/edit")
+async def api_plan_edit(req: Request) -> Any:
+    """Apply one edit to one day of a plan and re-plan only that day.
+
+    The plan is named by the X-Plan-Token of an /api/plan response, or by
+    its request. An ``itinerary`` in the body takes the place of the
+    original plan, so edits can be chained without a server-side session.
+    """
+    try:
+        payload = serialization.loads(await req.body())
+    except Exception:
+        return RequestError(400, translate("error_general", settings.default_language)).response()
+    lang = request_lang(payload.get("request") or payload.get("itinerary") if isinstance(payload, dict) else None)
+    try:
+        body = PlanEditRequest(**payload) if isinstance(payload, dict) else None
+    except ValidationError as e:
+        details = {".".join(str(x) for x in err["loc"]): err["msg"] for err in e.errors()}
+        return RequestError(400, translate("error_general", lang), details).response()
+    if body is None or (body.token is None and body.request is None):
+        return RequestError(400, translate("error_general", lang), {"token": "token or request required"}).response()
+
+    snap = catalog.snapshot()
+    try:
+        data = read_plan_token(body.token, snap, lang) if body.token else body.request.model_copy(update={"compact": False})
+        itinerary = body.itinerary
+        if itinerary is None:
+            cached = await build_plan(data, snap)
+            itinerary = serialization.ITINERARY_ADAPTER.validate_json(cached.body)
+        cfg = planner_config(data)
+        worker_snap = executor.pin(snap)
+        args = (itinerary, body.edit, cfg, worker_snap, body.compact)
+        content = await run_planner(data.lang, render_replan_json, *args)
+    except RequestError as e:
+        return e.response()
+    except ReplanError as e:
+        return RequestError(400, translate(e.key, data.lang), {"edit": str(e)}).response()
+    except Exception:
+        return RequestError(500, translate("error_general", lang)).response()
+    return Response(content=content, media_type="application/json", headers={"X-Plan-Token": plan_token(data, snap.version)})
+
+
+async def iter_day_lines(data: PlanRequest) -> AsyncIterator[bytes]:
+    """NDJSON events of a streamed plan: start, one line per day, end (or error)."""
+    cfg = planner_config(data)
+    snap = catalog.snapshot()
+    start = PlanStreamStart(
+        lang=cfg.lang,
+        seed=cfg.seed,
+        start_city_ru=cfg.origin.name_ru,
+        start_city_en=cfg.origin.name_en,
+        days_requested=data.days,
+    )
+    yield serialization.encode_model(start, cfg.lang, compact=data.compact)
+    # Process workers plan from their own catalog, pinned to this snapshot's version
+    worker_snap = executor.pin(snap)
+    # Days are computed ahead, at most one per executor worker, and sent in order
+    window: Deque["asyncio.Task[Tuple[bytes, int]]"] = deque()
+    produced = total = 0
+    failed: Optional[RequestError] = None
+    try:
+        # The schedule is small (city and place indexes per day); the days themselves are not kept
+        slots, allocation = await run_planner(data.lang, plan_schedule, data.days, cfg, worker_snap)
+        days = iter(enumerate(slots, start=1))
+        while True:
+            while len(window) < executor.parallelism:
+                nxt = next(days, None)
+                if nxt is None:
+                    break
+                window.append(
+                    asyncio.create_task(run_planner(data.lang, render_day_json, *nxt, cfg, worker_snap, data.compact))
+                )
+            if not window:
+                break
+            body, cost = await window.popleft()
+            produced += 1
+            total += cost
+            yield b'{"event":"day","plan":%s}' % body
+    except RequestError as e:
+        failed = e
+    except Exception:
+        failed = RequestError(500, translate("error_general", data.lang))
+    finally:
+        for task in window:
+            if not task.cancel() and not task.cancelled():
+                task.exception()  # already failed too; only the first failure is reported
+    if failed is not None:
+        # The days sent so far stand; the line names the first day that could not be planned
+        err = ErrorResponse(ok=False, error=failed.error, details=failed.details).model_dump()
+        yield serialization.dumps({"event": "error", "day": produced + 1, **err})
+        return
+    end = {"event": "end", "ok": True, "days": produced, "total_budget_rub": total}
+    message = shortened_message(produced, data.days, cfg)
+    if message is not None:
+        end["message"] = message
+    if allocation is not None:
+        end["allocation"] = allocation.model_dump()
+    yield serialization.dumps(end)
+
+
+@app.post("/api/plan/stream")
+async def api_plan_stream(req: Request) -> Any:
+    try:
+        data = decode_plan_request(await req.body())
+    except RequestError as e:
+        return e.response()
+
+    async def ndjson() -> AsyncIterator[bytes]:
+        async for line in iter_day_lines(data):
+            yield line + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+async def batch_item(i: int, payload: Any, snap: CatalogSnapshot) -> bytes:
+    try:
+        data = parse_plan_request(payload)
+        cached = await build_plan(data, snap)
+    except RequestError as e:
+        err = ErrorResponse(ok=False, error=e.error, details=e.details).model_dump()
+        return serialization.dumps({"index": i, **err})
+    except Exception:
+        err = ErrorResponse(ok=False, error=translate("error_general", request_lang(payload))).model_dump()
+        return serialization.dumps({"index": i, **err})
+    # Cached bytes are spliced in as is, no re-encoding
+    return b'{"index":%d,"ok":true,"plan":%s}' % (i, cached.body)
+
+
+async def iter_batch(payloads: List[Any]) -> AsyncIterator[bytes]:
+    # One catalog snapshot for the whole batch; filtering is shared through its index
+    snap = catalog.snapshot()
+    # Keep as many items in flight as the executor has workers, emit them in order
+    window: Deque["asyncio.Task[bytes]"] = deque()
+    items = iter(enumerate(payloads))
+    try:
+        while True:
+            while len(window) < executor.parallelism:
+                nxt = next(items, None)
+                if nxt is None:
+                    break
+                window.append(asyncio.create_task(batch_item(nxt[0], nxt[1], snap)))
+            if not window:
+                return
+            yield await window.popleft()
+    finally:
+        for task in window:
+            task.cancel()
+
+
+@app.post("/api/plan/batch")
+async def api_plan_batch(req: Request) -> Any:
+    try:
+        payload = serialization.loads(await req.body())
+    except Exception:
+        return RequestError(400, translate("error_general", settings.default_language)).response()
+    lang = request_lang(payload)
+    try:
+        batch = PlanBatchRequest(**payload) if isinstance(payload, dict) else PlanBatchRequest(requests=payload)
+    except ValidationError as e:
+        details = {".".join(str(x) for x in err["loc"]): err["msg"] for err in e.errors()}
+        return RequestError(400, translate("error_general", lang), details).response()
+    if len(batch.requests) > settings.batch_max_items:
+        return RequestError(400, translate("error_batch_too_large", lang)).response()
+
+    if batch.stream or "application/x-ndjson" in req.headers.get("accept", ""):
+
+        async def ndjson() -> AsyncIterator[bytes]:
+            async for line in iter_batch(batch.requests):
+                yield line + b"\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    parts = [line async for line in iter_batch(batch.requests)]
+    return Response(content=b'{"ok":true,"results":[' + b",".join(parts) + b"]}", media_type="application/json")
 
 
 # Simple CLI: python -m app --days 2 --budget standard --mobility strict --lang ru --seed 123
@@ -88,9 +650,21 @@ def _cli() -> None:
     parser.add_argument("--mobility", choices=["strict", "normal"], default="strict")
     parser.add_argument("--lang", choices=["ru", "en"], default=settings.default_language)
     parser.add_argument("--seed", type=int, default=settings.seed)
+    parser.add_argument("--speed-profile", choices=sorted(PROFILES), default=settings.speed_profile)
+    parser.add_argument("--origin", choices=sorted(ORIGINS), default=settings.default_origin)
     args = parser.parse_args()
 
-    cfg = PlannerConfig(budget_level=args.budget, mobility=args.mobility, seed=args.seed, lang=args.lang)
+    # argparse already validated the choices; keep the CLI free of the API's day limit
+    data = PlanRequest.model_construct(
+        days=args.days,
+        budget_level=args.budget,
+        mobility=args.mobility,
+        lang=args.lang,
+        seed=args.seed,
+        speed_profile=args.speed_profile,
+        origin=args.origin,
+    )
+    cfg = replace(planner_config(data), seed=args.seed)
     res = plan_itinerary(days=args.days, cfg=cfg)
     print(json.dumps(res.model_dump(), ensure_ascii=False, indent=2))
 
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Minimal Prometheus text exposition (format 0.0.4), no client library needed.
+# Metrics are per process: with several uvicorn workers, each one is scraped
+# or aggregated separately.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; planning is ~1 ms warm, so the low end is dense
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        return ()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_num(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _labels(self.label_names, k), v) for k, v in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][i] += 1
+            state[1][0] += value
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        out = []
+        names = self.label_names + ("le",)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                out.append((f"{self.name}_bucket", _labels(names, key + (_num(bound),)), cumulative))
+            out.append((f"{self.name}_sum", _labels(self.label_names, key), total))
+            out.append((f"{self.name}_count", _labels(self.label_names, key), cumulative))
+        return out
+
+
+class Callback(Metric):
+    """Counter or gauge read from elsewhere at scrape time."""
+
+    def __init__(
+        self, name: str, help: str, fn: Callable[[], Iterable[Tuple[LabelValues, float]]], labels: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        return [(self.name, _labels(self.label_names, k), v) for k, v in self.fn()]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter("tourplanner_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+)
+http_latency = registry.register(
+    Histogram("tourplanner_http_request_duration_seconds", "HTTP request latency until the last body byte", ("route",))
+)
+plan_stages = registry.register(
+    Histogram(
+        "tourplanner_plan_stage_duration_seconds",
+        "Time per planning stage of computed (not cached) plans",
+        ("stage",),
+    )
+)
+
+
+def route_label(scope: Dict[str, Any]) -> str:
+    # Route templates, never raw paths, so the label set stays bounded
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    if scope.get("path", "").startswith("/static/"):
+        return "/static"
+    return "other"
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_label(scope)
+            http_requests.inc(route, scope["method"], str(status))
+            http_latency.observe(time.perf_counter() - start, route)
+
+
+def server_timing(stages: Dict[str, float], **extra: float) -> str:
+    """Server-Timing header value; durations in seconds, rendered as ms."""
+    parts = [f"{name};dur={secs * 1000:.2f}" for name, secs in {**stages, **extra}.items()]
+    return ", ".join(parts)
@@ -1,20 +1,90 @@
 from __future__ import annotations
 
-from typing import List, Literal, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Literal, Optional, Dict, Any, Union
+from pydantic import BaseModel, Field, field_validator
 
 
 BudgetLevel = Literal["economy", "standard", "comfort"]
 MobilityPref = Literal["strict", "normal"]
 Lang = Literal["ru", "en"]
+Weather = Literal["dry", "mixed", "rain"]
+
+MAX_DAYS = 31
+
+
+class OriginPoint(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
 
 
 class PlanRequest(BaseModel):
-    days: int = Field(..., ge=1, le=3)
+    days: int = Field(..., ge=1, le=MAX_DAYS)
     budget_level: BudgetLevel
     mobility: MobilityPref = "strict"
     lang: Lang = "ru"
     seed: Optional[int] = None
+    # Only the requested language's labels, without the _ru/_en suffixes
+    compact: bool = False
+    # Setting a limit switches to the global allocator unless one is named
+    allocator: Optional[Literal["greedy", "global"]] = None
+    day_minutes: Optional[int] = Field(None, ge=60, le=1440)
+    trip_budget_rub: Optional[int] = Field(None, ge=0)
+    # Travel speeds: car, train, accessible (or any registered profile); default APP_SPEED_PROFILE
+    speed_profile: Optional[str] = None
+    # For the whole trip or per day (days past the list are dry): rain swaps every outdoor
+    # visit for an indoor place of the same city, mixed keeps the best-ranked outdoor one
+    weather: Union[Weather, List[Weather]] = "dry"
+    # Where every day starts and ends: a registered origin (spb, pulkovo, moskovsky_station, ...)
+    # or coordinates, {"lat": .., "lon": ..} or "lat,lon"; default APP_DEFAULT_ORIGIN
+    origin: Optional[Union[OriginPoint, str]] = None
+
+    @field_validator("origin", mode="before")
+    @classmethod
+    def _origin_point(cls, v: Any) -> Any:
+        if isinstance(v, str) and "," in v:
+            lat, _, lon = v.partition(",")
+            try:
+                return {"lat": float(lat), "lon": float(lon)}
+            except ValueError:
+                raise ValueError("coordinates must be \"lat,lon\"") from None
+        return v
+
+    @field_validator("origin")
+    @classmethod
+    def _known_origin(cls, v: Union[OriginPoint, str, None]) -> Union[OriginPoint, str, None]:
+        from .origins import ORIGINS
+
+        if isinstance(v, str) and v not in ORIGINS:
+            raise ValueError(f"must be one of {', '.join(ORIGINS)} or coordinates")
+        return v
+
+    @field_validator("weather", mode="before")
+    @classmethod
+    def _weather_list(cls, v: Any) -> Any:
+        # Query strings carry per-day weather as "rain,dry,mixed"
+        return v.split(",") if isinstance(v, str) and "," in v else v
+
+    @field_validator("weather")
+    @classmethod
+    def _weather_days(cls, v: Union[str, List[str]]) -> Union[str, List[str]]:
+        if isinstance(v, list) and len(v) > MAX_DAYS:
+            raise ValueError(f"at most {MAX_DAYS} days")
+        return v
+
+    @field_validator("speed_profile")
+    @classmethod
+    def _known_profile(cls, v: Optional[str]) -> Optional[str]:
+        from .travel import PROFILES  # travel depends on this module through compiled
+
+        if v is not None and v not in PROFILES:
+            raise ValueError(f"must be one of {', '.join(PROFILES)}")
+        return v
+
+
+class PlanBatchRequest(BaseModel):
+    # Items stay raw so each one is validated (and fails) on its own
+    requests: List[Any] = Field(..., min_length=1)
+    stream: bool = False
 
 
 class Place(BaseModel):
@@ -83,6 +153,26 @@ class RainyAlternative(BaseModel):
     cost_rub: int
 
 
+class RouteStats(BaseModel):
+    optimizer: str
+    nearest_km: float
+    optimized_km: float
+    gain_km: float
+    solver_ms: float
+    truncated: bool = False
+
+
+class AllocationStats(BaseModel):
+    allocator: str
+    day_minutes: int
+    trip_budget_rub: Optional[int] = None
+    planned_cost_rub: int
+    objective: float
+    optimal: bool  # False when the search stopped at its node or time limit
+    nodes: int
+    solver_ms: float
+
+
 class DayPlan(BaseModel):
     day: int
     base_city_ru: str
@@ -91,6 +181,7 @@ class DayPlan(BaseModel):
     rainy_alternatives: List[RainyAlternative]
     day_budget: DayBudget
     total_travel_minutes: int
+    route: Optional[RouteStats] = None
 
 
 class ItineraryResponse(BaseModel):
@@ -102,9 +193,43 @@ class ItineraryResponse(BaseModel):
     start_city_en: str = "Saint Petersburg"
     days: List[DayPlan]
     total_budget_rub: int
+    allocation: Optional[AllocationStats] = None  # set by the global allocator
     message: Optional[str] = None
 
 
+class PlanEdit(BaseModel):
+    day: int = Field(..., ge=1)
+    # replace: swap place_id for with_place_id (default: the best unused place in the day's city)
+    # nearby: swap place_id for the closest place of the day's city not in the trip yet
+    # drop: remove place_id from the day
+    # rainy: swap the day's outdoor visits for its rainy_alternatives
+    action: Literal["replace", "nearby", "drop", "rainy"]
+    place_id: Optional[str] = None
+    with_place_id: Optional[str] = None
+
+
+class PlanEditRequest(BaseModel):
+    # Either the X-Plan-Token of an /api/plan response, or the request the itinerary was planned with
+    token: Optional[str] = None
+    request: Optional[PlanRequest] = None
+    # The itinerary to patch (full form, not compact); default: the plan of token/request
+    itinerary: Optional[ItineraryResponse] = None
+    edit: PlanEdit
+    compact: bool = False
+
+
+class PlanStreamStart(BaseModel):
+    # First line of /api/plan/stream; days follow as {"event": "day", "plan": DayPlan}
+    event: Literal["start"] = "start"
+    ok: bool = True
+    lang: Lang
+    seed: int
+    currency: str = "RUB"
+    start_city_ru: str = "Санкт-Петербург"
+    start_city_en: str = "Saint Petersburg"
+    days_requested: int
+
+
 class ErrorResponse(BaseModel):
     ok: bool = False
     error: str
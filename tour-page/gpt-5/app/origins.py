@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from .config import settings
+
+
+# Raw coordinates are snapped to this grid (about 550 m north-south, 280 m east-west
+# around Saint Petersburg), so requests from the same hotel share their cached rankings
+GRID_DEG = 0.005
+
+
+@dataclass(frozen=True)
+class Origin:
+    """Where every day starts and ends: a registered place or snapped coordinates."""
+
+    key: str  # registry name, or "@lat,lon" for coordinates
+    lat: float
+    lon: float
+    name_ru: str
+    name_en: str
+    # Label phrases: "Переезд {from_ru} в ...", "Возвращение {to_ru}", "Transfer {from_en} to ..."
+    from_ru: str
+    to_ru: str
+    from_en: str
+    to_en: str
+
+    @property
+    def coord(self) -> Tuple[float, float]:
+        return (self.lat, self.lon)
+
+
+ORIGINS: Dict[str, Origin] = {}
+
+
+def register_origin(origin: Origin) -> Origin:
+    ORIGINS[origin.key] = origin
+    return origin
+
+
+def named_origin(
+    key: str,
+    lat: float,
+    lon: float,
+    name_ru: str,
+    name_en: str,
+    from_ru: Optional[str] = None,
+    to_ru: Optional[str] = None,
+) -> Origin:
+    # Without declined forms, the name is quoted after a neutral noun
+    return Origin(
+        key=key,
+        lat=lat,
+        lon=lon,
+        name_ru=name_ru,
+        name_en=name_en,
+        from_ru=from_ru or f"из пункта «{name_ru}»",
+        to_ru=to_ru or f"в пункт «{name_ru}»",
+        from_en=f"from {name_en}",
+        to_en=f"to {name_en}",
+    )
+
+
+def coordinates_origin(lat: float, lon: float) -> Origin:
+    lat, lon = round(round(lat / GRID_DEG) * GRID_DEG, 6), round(round(lon / GRID_DEG) * GRID_DEG, 6)
+    return Origin(
+        key=f"@{lat},{lon}",
+        lat=lat,
+        lon=lon,
+        name_ru="Точка отправления",
+        name_en="Starting point",
+        from_ru="из точки отправления",
+        to_ru="в точку отправления",
+        from_en="from the starting point",
+        to_en="to the starting point",
+    )
+
+
+# spb is the origin the indexes and persisted travel matrices are built for
+SPB = register_origin(
+    named_origin(
+        "spb", 59.9391, 30.3158, "Санкт-Петербург", "Saint Petersburg", "из Санкт-Петербурга", "в Санкт-Петербург"
+    )
+)
+register_origin(
+    named_origin(
+        "pulkovo", 59.8003, 30.2625, "Аэропорт Пулково", "Pulkovo Airport", "из аэропорта Пулково", "в аэропорт Пулково"
+    )
+)
+register_origin(
+    named_origin(
+        "moskovsky_station",
+        59.9297,
+        30.3621,
+        "Московский вокзал",
+        "Moskovsky railway station",
+        "с Московского вокзала",
+        "на Московский вокзал",
+    )
+)
+register_origin(
+    named_origin(
+        "ladozhsky_station",
+        59.9323,
+        30.4405,
+        "Ладожский вокзал",
+        "Ladozhsky railway station",
+        "с Ладожского вокзала",
+        "на Ладожский вокзал",
+    )
+)
+register_origin(
+    named_origin(
+        "finlyandsky_station",
+        59.9559,
+        30.3563,
+        "Финляндский вокзал",
+        "Finlyandsky railway station",
+        "с Финляндского вокзала",
+        "на Финляндский вокзал",
+    )
+)
+
+
+def register_from_json(text: str) -> None:
+    """Origins from APP_ORIGINS: [{"key", "lat", "lon", "name_ru", "name_en"[, "from_ru", "to_ru"]}, ...]."""
+    for item in json.loads(text):
+        register_origin(named_origin(**item))
+
+
+if settings.origins:
+    register_from_json(settings.origins)
+
+
+def resolve_origin(name: Optional[str] = None, lat: Optional[float] = None, lon: Optional[float] = None) -> Origin:
+    if lat is not None and lon is not None:
+        return coordinates_origin(lat, lon)
+    origin = ORIGINS.get(name or SPB.key)
+    if origin is None:
+        raise ValueError(f"unknown origin: {name}")
+    return origin
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRU(Generic[K, V]):
+    """Small LRU for per-origin data; values are built outside the lock, a lost race builds one twice."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max(1, max_entries)
+        self._data: "OrderedDict[K, V]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K, build: Callable[[], V]) -> V:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                return value
+        value = build()
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._data)
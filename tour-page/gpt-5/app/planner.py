@@ -1,13 +1,10 @@
 from __future__ import annotations
 
-import json
-import random
-from dataclasses import dataclass
-from pathlib import Path
-from typing import Dict, List, Tuple, Iterable
+from itertools import count, islice
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from .models import (
-    Place,
     BudgetLevel,
     MobilityPref,
     TravelItem,
@@ -16,15 +13,23 @@ from .models import (
     DayBudget,
     DayPlan,
     RainyAlternative,
+    RouteStats,
+    AllocationStats,
     ItineraryResponse,
+    PlanEdit,
 )
-from .utils import haversine_km, minutes_from_km
+from .catalog import CatalogSnapshot, catalog
+from .origins import SPB, Origin
+from .records import PlaceRecord
+from .allocation import allocate
+from .routing import optimize_route
+from .serialization import encode_day_plan, encode_itinerary
+from .timing import NULL_TIMER, StageTimer
+from .utils import translate
 
-
-DATA_PATH = Path(__file__).resolve().parent / "data" / "places.json"
-
-
-SPB_COORD = (59.9391, 30.3158)  # Saint Petersburg center
+if TYPE_CHECKING:
+    from .indexes import PlaceView  # indexes imports this module
+    from .travel import TravelTable
 
 
 @dataclass
@@ -33,83 +38,72 @@ class PlannerConfig:
     mobility: MobilityPref
     seed: int
     lang: str
-
-
-def load_places() -> List[Place]:
-    with open(DATA_PATH, "r", encoding="utf-8") as f:
-        raw = json.load(f)
-    return [Place(**p) for p in raw]
-
-
-def group_by_city(places: Iterable[Place]) -> Dict[str, List[Place]]:
-    grouped: Dict[str, List[Place]] = {}
+    max_places_per_day: int = 3
+    optimizer: str = "local"  # see routing.OPTIMIZERS
+    optimizer_budget_ms: float = 20.0
+    allocator: str = "greedy"  # or "global" (see allocation.allocate)
+    day_minutes: int = 600  # per-day limit for travel + visits + lunch (global allocator)
+    trip_budget_rub: Optional[int] = None  # total cost limit (global allocator)
+    allocation_budget_ms: float = 50.0
+    speed_profile: str = "car"  # see travel.PROFILES
+    weather: Tuple[str, ...] = ()  # per day: dry, mixed or rain; days past the end are dry
+    origin: Origin = SPB  # where every day starts and ends (see origins.ORIGINS)
+
+
+def group_by_city(places: Iterable[PlaceRecord]) -> Dict[str, List[PlaceRecord]]:
+    grouped: Dict[str, List[PlaceRecord]] = {}
     for p in places:
         grouped.setdefault(p.city_ru, []).append(p)
     return grouped
 
 
-def filter_accessible(places: Iterable[Place], mobility: MobilityPref) -> List[Place]:
-    max_stairs = 1 if mobility == "strict" else 2
-    return [p for p in places if p.stairs_level <= max_stairs]
+def max_stairs(mobility: MobilityPref) -> int:
+    return 1 if mobility == "strict" else 2
 
 
-def filter_budget(places: Iterable[Place], budget: BudgetLevel) -> List[Place]:
+def max_cost(budget: BudgetLevel) -> int:
     # Simple thresholds per attraction cost
     if budget == "economy":
-        max_cost = 600
-    elif budget == "standard":
-        max_cost = 1200
-    else:
-        max_cost = 10_000
-    return [p for p in places if p.cost_rub <= max_cost]
+        return 600
+    if budget == "standard":
+        return 1200
+    return 10_000
+
+
+def filter_accessible(places: Iterable[PlaceRecord], mobility: MobilityPref) -> List[PlaceRecord]:
+    limit = max_stairs(mobility)
+    return [p for p in places if p.stairs_level <= limit]
+
+
+def filter_budget(places: Iterable[PlaceRecord], budget: BudgetLevel) -> List[PlaceRecord]:
+    limit = max_cost(budget)
+    return [p for p in places if p.cost_rub <= limit]
 
 
-def city_center(city_places: List[Place]) -> Tuple[float, float]:
+def city_center(city_places: List[PlaceRecord]) -> Tuple[float, float]:
     # Average lat/lon for city centroid
     lat = sum(p.lat for p in city_places) / len(city_places)
     lon = sum(p.lon for p in city_places) / len(city_places)
     return (lat, lon)
 
 
-def sort_cities_by_accessibility(places: List[Place]) -> List[Tuple[str, int, float]]:
-    # Rank cities: more accessible places first, then proximity to SPB
-    grouped = group_by_city(places)
-    ranking: List[Tuple[str, int, float]] = []
-    for city, plist in grouped.items():
-        count = len(plist)
-        c_lat, c_lon = city_center(plist)
-        dist = haversine_km(SPB_COORD[0], SPB_COORD[1], c_lat, c_lon)
-        ranking.append((city, count, dist))
-    # more places first, then closer distance
-    ranking.sort(key=lambda x: (-x[1], x[2], x[0]))
-    return ranking
+def is_usable(p: PlaceRecord) -> bool:
+    # Exclude non-visitable placeholders
+    return p.avg_visit_minutes > 0 and ("note" not in p.categories)
 
 
-def choose_places_in_city(plist: List[Place], r: random.Random, max_count: int = 3) -> List[Place]:
+def place_score(p: PlaceRecord) -> Tuple[int, int, int, str]:
     # Prefer indoor+low stairs, then by lower cost, then by shorter visit (to fit day)
-    def score(p: Place) -> Tuple[int, int, int, str]:
-        return (
-            0 if p.indoor else 1,
-            p.stairs_level,
-            p.cost_rub,
-            p.name_ru,
-        )
-
-    filtered = [p for p in plist if p.avg_visit_minutes > 0 and ("note" not in p.categories)]
-    sorted_places = sorted(filtered, key=score)
-    return sorted_places[:max_count]
+    return (
+        0 if p.indoor else 1,
+        p.stairs_level,
+        p.cost_rub,
+        p.name_ru,
+    )
 
 
-def nearest_neighbor_order(places: List[Place], start_coord: Tuple[float, float]) -> List[Place]:
-    remaining = places.copy()
-    ordered: List[Place] = []
-    current = start_coord
-    while remaining:
-        nxt = min(remaining, key=lambda p: haversine_km(current[0], current[1], p.lat, p.lon))
-        ordered.append(nxt)
-        current = (nxt.lat, nxt.lon)
-        remaining.remove(nxt)
-    return ordered
+def rainy_score(p: PlaceRecord) -> Tuple[int, int, str]:
+    return (p.cost_rub, p.avg_visit_minutes, p.name_ru)
 
 
 def meals_cost(budget: BudgetLevel) -> int:
@@ -121,159 +115,443 @@ def transport_cost_km(distance_km: float) -> int:
     return int(round(distance_km * 8))
 
 
-def plan_itinerary(days: int, cfg: PlannerConfig) -> ItineraryResponse:
-    all_places = load_places()
-    # Exclude non-visitable placeholders
-    usable = [p for p in all_places if p.avg_visit_minutes > 0 and ("note" not in p.categories)]
-    accessible = filter_accessible(usable, cfg.mobility)
-    by_budget = filter_budget(accessible, cfg.budget_level)
-
-    # Group and rank cities
-    ranked_cities = sort_cities_by_accessibility(by_budget)
-    chosen_cities = [c for c, _, _ in ranked_cities[: max(1, days)]]
-
-    # Deterministic randomness for tie-breakers (if any)
-    r = random.Random(cfg.seed)
-
-    day_plans: List[DayPlan] = []
-    total_budget = 0
-
-    # Build day-by-day
-    for d, city in enumerate(chosen_cities[:days], start=1):
-        city_places = [p for p in by_budget if p.city_ru == city]
-        if not city_places:
-            # if somehow empty, fallback to next available city with any accessible places
-            fallback_city = next((c for c, _, _ in ranked_cities if c != city), city)
-            city = fallback_city
-            city_places = [p for p in by_budget if p.city_ru == city]
-
-        # Pick up to 3 places prioritizing indoor, low stairs, low cost
-        picks = choose_places_in_city(city_places, r, max_count=3)
-
-        # Order picks to minimize walking/transfer inside city
-        c_lat, c_lon = city_center(city_places)
-        ordered = nearest_neighbor_order(picks, (c_lat, c_lon))
-
-        # Build items timeline: SPB -> first, then visits with transfers, lunch in the middle
-        items: List = []
-        # Travel SPB -> city center
-        dist_to_city = haversine_km(SPB_COORD[0], SPB_COORD[1], c_lat, c_lon)
-        minutes_to_city = minutes_from_km(dist_to_city)
-        items.append(
-            TravelItem(
-                label_ru=f"Переезд из Санкт-Петербурга в {city}",
-                label_en=f"Transfer from Saint Petersburg to {ordered[0].city_en if ordered else city}",
-                minutes=minutes_to_city,
-                distance_km=round(dist_to_city, 1),
-            )
+@dataclass(frozen=True)
+class DaySlot:
+    """Where one day goes: a city and the places visited there.
+
+    Indexes point into the city's candidates, so slots are small and can be
+    shipped to process workers holding the same catalog version.
+    """
+
+    city: str
+    picks: Tuple[int, ...]
+    excluded: Tuple[int, ...]  # candidates not offered as rainy alternatives (visited this or another day)
+
+
+def day_schedule(view: PlaceView, days: int, per_day: int) -> Iterator[DaySlot]:
+    """Greedy allocation: one slot per day of the tour.
+
+    Cities are visited in ranking order with their best places; once all of
+    them have been used the ranking is walked again with each city's
+    next-best places (round 1, 2, ...), so a long tour never repeats a visit.
+    Ends early when the view runs out of places.
+    """
+    per_day = max(1, per_day)
+    d = 0
+    for rnd in count():
+        progressed = False
+        for city, _, _ in view.ranked:
+            n = len(view.cities[city].candidates)
+            if n <= rnd * per_day:
+                continue
+            progressed = True
+            d += 1
+            if d > days:
+                return
+            seen = min(n, (rnd + 1) * per_day)
+            yield DaySlot(city, tuple(range(rnd * per_day, seen)), tuple(range(seen)))
+        if not progressed:
+            return
+
+
+def apply_weather(view: PlaceView, slots: List[DaySlot], weather: Tuple[str, ...]) -> List[DaySlot]:
+    """Swap outdoor visits on wet days for indoor places not visited on any day.
+
+    Replacements come from the city's indoor index (rainy_score order).
+    ``rain`` swaps every outdoor visit and ``mixed`` keeps the best-ranked
+    one. When a city runs out of indoor places the outdoor visit is dropped,
+    unless the day would be left empty. The places taken are no longer
+    offered as rainy alternatives on the city's other days. plan_day then
+    orders the new picks like any others.
+    """
+    if all(w == "dry" for w in weather):
+        return slots
+    taken: Dict[str, Set[int]] = {}
+    for slot in slots:
+        taken.setdefault(slot.city, set()).update(slot.picks)
+    added: Dict[str, Set[int]] = {}
+    out = list(slots)
+    for d, (slot, w) in enumerate(zip(slots, weather)):
+        entry = view.cities[slot.city]
+        outdoor = sorted(i for i in slot.picks if not entry.candidates[i].indoor)
+        if w == "mixed":
+            outdoor = outdoor[1:]
+        if w == "dry" or not outdoor:
+            continue
+        used = taken[slot.city]
+        spare = (i for i in entry.indoor if i not in used)
+        picks = [i for i in slot.picks if i not in outdoor]
+        for _ in outdoor:
+            i = next(spare, None)
+            if i is None:
+                break
+            picks.append(i)
+            used.add(i)
+            added.setdefault(slot.city, set()).add(i)
+        out[d] = replace(slot, picks=tuple(sorted(picks or outdoor[:1])))
+    return [replace(s, excluded=tuple(sorted(added[s.city].union(s.excluded)))) if s.city in added else s for s in out]
+
+
+def plan_schedule(
+    days: int, cfg: PlannerConfig, snapshot: Optional[CatalogSnapshot] = None
+) -> Tuple[List[DaySlot], Optional[AllocationStats]]:
+    """Which city and places each day gets, per cfg.allocator.
+
+    ``greedy`` follows the city ranking and ignores the time and money
+    limits; ``global`` solves the whole trip at once under them. Either way
+    cfg.weather is applied last, so allocation stats describe the dry trip.
+    """
+    snap = snapshot or catalog.snapshot()
+    # Filtered places, city groups and rankings are precomputed per mobility x budget (and cached per origin)
+    view = snap.index.view(cfg.mobility, cfg.budget_level, cfg.origin)
+    if cfg.allocator == "greedy":
+        return apply_weather(view, list(day_schedule(view, days, cfg.max_places_per_day)), cfg.weather), None
+    if cfg.allocator != "global":
+        raise ValueError(f"unknown allocator: {cfg.allocator}")
+    result = allocate(
+        view,
+        days,
+        travel=snap.travel.table(cfg.speed_profile),
+        per_day=max(1, cfg.max_places_per_day),
+        day_minutes=cfg.day_minutes,
+        trip_budget_rub=cfg.trip_budget_rub,
+        meals_rub=meals_cost(cfg.budget_level),
+        transport_rub=transport_cost_km,
+        seed=cfg.seed,
+        budget_ms=cfg.allocation_budget_ms,
+    )
+    visited: Dict[str, List[int]] = {}
+    for o in result.days:
+        visited.setdefault(o.city, []).extend(o.picks)
+    slots = [DaySlot(o.city, o.picks, tuple(sorted(visited[o.city]))) for o in result.days]
+    slots = apply_weather(view, slots, cfg.weather)
+    stats = AllocationStats(
+        allocator=cfg.allocator,
+        day_minutes=cfg.day_minutes,
+        trip_budget_rub=cfg.trip_budget_rub,
+        planned_cost_rub=result.cost_rub,
+        objective=round(result.objective, 3),
+        optimal=result.optimal,
+        nodes=result.nodes,
+        solver_ms=round(result.solve_ms, 3),
+    )
+    return slots, stats
+
+
+def plan_day(
+    d: int, view: PlaceView, slot: DaySlot, cfg: PlannerConfig, travel: TravelTable, timer: StageTimer = NULL_TIMER
+) -> DayPlan:
+    entry = view.cities[slot.city]
+    city = entry.city
+    # Places prioritizing indoor, low stairs, low cost (candidates are pre-sorted)
+    picks = [entry.candidates[i] for i in slot.picks]
+    # Distances and minutes over center (0), picks (1..k) and the origin (k+1), precomputed per profile
+    km, minutes = travel.day_matrix(view, entry, slot.picks)
+    home = len(picks) + 1
+    timer.lap("select")
+
+    # Order picks to minimize transfers: center -> visits -> back to the origin
+    route = optimize_route(
+        [(p.lat, p.lon) for p in picks],
+        start=entry.center,
+        end=cfg.origin.coord,
+        optimizer=cfg.optimizer,
+        budget_ms=cfg.optimizer_budget_ms,
+        seed=f"{cfg.seed}:{d}",  # per-day seed, independent of the other days
+        dist=km,
+    )
+    ordered = [picks[i] for i in route.order]
+    path = [0, *(i + 1 for i in route.order), home]
+    timer.lap("route")
+
+    # Build items timeline: origin -> first, then visits with transfers, lunch in the middle
+    origin = cfg.origin
+    items: List = []
+    # Travel origin -> city center
+    dist_to_city = entry.dist_origin_km
+    minutes_to_city = minutes[home][0]
+    items.append(
+        TravelItem(
+            label_ru=f"Переезд {origin.from_ru} в {city}",
+            label_en=f"Transfer {origin.from_en} to {ordered[0].city_en if ordered else city}",
+            minutes=minutes_to_city,
+            distance_km=round(dist_to_city, 1),
         )
+    )
 
-        # Visits and transfers between them
-        prev_lat, prev_lon = c_lat, c_lon
-        visit_cost_sum = 0
-        travel_minutes_inside = 0
-        for idx, p in enumerate(ordered):
-            # travel from prev
-            dist = haversine_km(prev_lat, prev_lon, p.lat, p.lon)
-            mins = minutes_from_km(dist, road_speed_kmh=30.0)  # inside city slower
-            items.append(
-                TravelItem(
-                    label_ru=f"{p.city_ru}: переезд к {p.name_ru}",
-                    label_en=f"{p.city_en}: transfer to {p.name_en}",
-                    minutes=mins,
-                    distance_km=round(dist, 1),
-                )
-            )
-            travel_minutes_inside += mins
-            prev_lat, prev_lon = p.lat, p.lon
-
-            # visit
-            items.append(
-                VisitItem(
-                    place_id=p.id,
-                    name_ru=p.name_ru,
-                    name_en=p.name_en,
-                    city_ru=p.city_ru,
-                    city_en=p.city_en,
-                    minutes=p.avg_visit_minutes,
-                    cost_rub=p.cost_rub,
-                    indoor=p.indoor,
-                    stairs_level=p.stairs_level,
-                )
-            )
-            visit_cost_sum += p.cost_rub
-
-            # lunch roughly after first or second visit
-            if idx == 0 and len(ordered) >= 2:
-                items.append(
-                    LunchItem(
-                        label_ru="Обед (кафе)",
-                        label_en="Lunch (cafe)",
-                        minutes=60,
-                        cost_rub=meals_cost(cfg.budget_level),
-                    )
-                )
-
-        # Return to SPB (approx from last visited location)
-        last_lat, last_lon = (prev_lat, prev_lon) if ordered else (c_lat, c_lon)
-        dist_back = haversine_km(last_lat, last_lon, SPB_COORD[0], SPB_COORD[1])
-        mins_back = minutes_from_km(dist_back)
+    # Visits and transfers between them
+    visit_cost_sum = 0
+    travel_minutes_inside = 0
+    for idx, p in enumerate(ordered):
+        # travel from prev
+        dist = km[path[idx]][path[idx + 1]]
+        mins = minutes[path[idx]][path[idx + 1]]
         items.append(
             TravelItem(
-                label_ru=f"Возвращение в Санкт-Петербург",
-                label_en=f"Return to Saint Petersburg",
-                minutes=mins_back,
-                distance_km=round(dist_back, 1),
+                label_ru=f"{p.city_ru}: переезд к {p.name_ru}",
+                label_en=f"{p.city_en}: transfer to {p.name_en}",
+                minutes=mins,
+                distance_km=round(dist, 1),
             )
         )
+        travel_minutes_inside += mins
 
-        # Rainy-day alternatives: indoor places in city not chosen
-        chosen_ids = {p.id for p in ordered}
-        rainy_pool = [p for p in city_places if p.indoor and p.id not in chosen_ids]
-        rainy_pool.sort(key=lambda p: (p.cost_rub, p.avg_visit_minutes, p.name_ru))
-        rainy_alts = [
-            RainyAlternative(
+        # visit
+        items.append(
+            VisitItem(
                 place_id=p.id,
                 name_ru=p.name_ru,
                 name_en=p.name_en,
                 city_ru=p.city_ru,
                 city_en=p.city_en,
-                indoor=p.indoor,
+                minutes=p.avg_visit_minutes,
                 cost_rub=p.cost_rub,
+                indoor=p.indoor,
+                stairs_level=p.stairs_level,
             )
-            for p in rainy_pool[:3]
-        ]
-
-        # Budget breakdown
-        transport_rub = transport_cost_km(dist_to_city) * 2  # round trip
-        meals_rub = meals_cost(cfg.budget_level)
-        day_total = visit_cost_sum + meals_rub + transport_rub
-        total_budget += day_total
-
-        # Sum total travel minutes
-        total_travel_minutes = minutes_to_city + travel_minutes_inside + mins_back
-
-        # Base city names from first picked or city pool
-        base_city_ru = ordered[0].city_ru if ordered else city
-        base_city_en = ordered[0].city_en if ordered else city
-
-        day_plans.append(
-            DayPlan(
-                day=d,
-                base_city_ru=base_city_ru,
-                base_city_en=base_city_en if isinstance(base_city_en, str) else base_city_ru,
-                items=items,
-                rainy_alternatives=rainy_alts,
-                day_budget=DayBudget(
-                    attractions_rub=visit_cost_sum,
-                    meals_rub=meals_rub,
-                    transport_rub=transport_rub,
-                    total_rub=day_total,
-                ),
-                total_travel_minutes=total_travel_minutes,
+        )
+        visit_cost_sum += p.cost_rub
+
+        # lunch roughly after first or second visit
+        if idx == 0 and len(ordered) >= 2:
+            items.append(
+                LunchItem(
+                    label_ru="Обед (кафе)",
+                    label_en="Lunch (cafe)",
+                    minutes=60,
+                    cost_rub=meals_cost(cfg.budget_level),
+                )
             )
+
+    # Return to the origin (approx from last visited location)
+    dist_back = km[path[-2]][home]
+    mins_back = minutes[path[-2]][home]
+    items.append(
+        TravelItem(
+            label_ru=f"Возвращение {origin.to_ru}",
+            label_en=f"Return {origin.to_en}",
+            minutes=mins_back,
+            distance_km=round(dist_back, 1),
         )
+    )
 
-    return ItineraryResponse(
-        lang=cfg.lang, seed=cfg.seed, days=day_plans, total_budget_rub=total_budget
+    # Rainy-day alternatives: indoor places in city not chosen (on this or an earlier visit)
+    chosen_ids = {entry.candidates[i].id for i in slot.excluded}
+    rainy_pool = list(islice((p for p in entry.rainy if p.id not in chosen_ids), 3))
+    rainy_alts = [
+        RainyAlternative(
+            place_id=p.id,
+            name_ru=p.name_ru,
+            name_en=p.name_en,
+            city_ru=p.city_ru,
+            city_en=p.city_en,
+            indoor=p.indoor,
+            cost_rub=p.cost_rub,
+        )
+        for p in rainy_pool
+    ]
+
+    # Budget breakdown
+    transport_rub = transport_cost_km(dist_to_city) * 2  # round trip
+    meals_rub = meals_cost(cfg.budget_level)
+    day_total = visit_cost_sum + meals_rub + transport_rub
+
+    # Sum total travel minutes
+    total_travel_minutes = minutes_to_city + travel_minutes_inside + mins_back
+
+    # Base city names from first picked or city pool
+    base_city_ru = ordered[0].city_ru if ordered else city
+    base_city_en = ordered[0].city_en if ordered else city
+
+    plan = DayPlan(
+        day=d,
+        base_city_ru=base_city_ru,
+        base_city_en=base_city_en if isinstance(base_city_en, str) else base_city_ru,
+        items=items,
+        rainy_alternatives=rainy_alts,
+        day_budget=DayBudget(
+            attractions_rub=visit_cost_sum,
+            meals_rub=meals_rub,
+            transport_rub=transport_rub,
+            total_rub=day_total,
+        ),
+        total_travel_minutes=total_travel_minutes,
+        route=RouteStats(
+            optimizer=route.optimizer,
+            nearest_km=round(route.nearest_km, 1),
+            optimized_km=round(route.length_km, 1),
+            gain_km=round(route.gain_km, 1),
+            solver_ms=round(route.solver_ms, 3),
+            truncated=route.truncated,
+        ),
+    )
+    timer.lap("build")
+    return plan
+
+
+def iter_day_plans(
+    slots: Iterable[DaySlot], cfg: PlannerConfig, snapshot: Optional[CatalogSnapshot] = None, timer: StageTimer = NULL_TIMER
+) -> Iterator[DayPlan]:
+    """Day plans one at a time; each day only depends on its slot and position."""
+    snap = snapshot or catalog.snapshot()
+    view = snap.index.view(cfg.mobility, cfg.budget_level, cfg.origin)
+    travel = snap.travel.table(cfg.speed_profile)
+    for d, slot in enumerate(slots, start=1):
+        yield plan_day(d, view, slot, cfg, travel, timer)
+
+
+def shortened_message(planned: int, requested: int, cfg: PlannerConfig) -> Optional[str]:
+    """Why a plan has fewer days than requested, or None when it has them all."""
+    if planned >= requested:
+        return None
+    key = "plan_shortened_limits" if cfg.allocator == "global" else "plan_shortened"
+    return translate(key, cfg.lang).format(planned=planned, requested=requested)  # type: ignore[arg-type]
+
+
+def plan_itinerary(
+    days: int, cfg: PlannerConfig, snapshot: Optional[CatalogSnapshot] = None, timer: StageTimer = NULL_TIMER
+) -> ItineraryResponse:
+    snap = snapshot or catalog.snapshot()
+    timer.lap("catalog")
+    slots, allocation = plan_schedule(days, cfg, snap)
+    timer.lap("allocate")
+    day_plans = list(iter_day_plans(slots, cfg, snap, timer))
+    itinerary = ItineraryResponse(
+        lang=cfg.lang,
+        seed=cfg.seed,
+        start_city_ru=cfg.origin.name_ru,
+        start_city_en=cfg.origin.name_en,
+        days=day_plans,
+        total_budget_rub=sum(p.day_budget.total_rub for p in day_plans),
+        allocation=allocation,
+        message=shortened_message(len(day_plans), days, cfg),
+    )
+    timer.lap("build")
+    return itinerary
+
+
+class ReplanError(ValueError):
+    """An edit that does not fit the itinerary; ``key`` names its translated message."""
+
+    def __init__(self, key: str, detail: str) -> None:
+        super().__init__(detail)
+        self.key = key
+
+    def __reduce__(self) -> Tuple[type, Tuple[str, str]]:
+        # Raised in process workers too; the default pickling would lose ``key``
+        return type(self), (self.key, str(self))
+
+
+def _visit_ids(day: DayPlan) -> List[str]:
+    return [item.place_id for item in day.items if isinstance(item, VisitItem)]
+
+
+def replan_day(
+    itinerary: ItineraryResponse, edit: PlanEdit, cfg: PlannerConfig, snapshot: Optional[CatalogSnapshot] = None
+) -> ItineraryResponse:
+    """Apply one edit and re-plan only the edited day.
+
+    The day's visits are resolved against its city's candidates, and the
+    new set goes through plan_day again with the same per-day seed. That
+    recomputes the visiting order, travel items, rainy alternatives and
+    DayBudget. Other days are kept as they are, and total_budget_rub
+    moves by the day's difference.
+    """
+    if edit.day > len(itinerary.days):
+        raise ReplanError("error_edit_day", f"the itinerary has {len(itinerary.days)} days")
+    snap = snapshot or catalog.snapshot()
+    view = snap.index.view(cfg.mobility, cfg.budget_level, cfg.origin)
+    old = itinerary.days[edit.day - 1]
+    entry = view.cities.get(old.base_city_ru)
+    if entry is None:
+        raise ReplanError("error_edit_place", f"{old.base_city_ru} has no places for these options")
+    position = {p.id: i for i, p in enumerate(entry.candidates)}
+    visits = _visit_ids(old)
+    used = {pid for day in itinerary.days for pid in _visit_ids(day)}
+
+    if edit.action in ("replace", "nearby", "drop") and edit.place_id not in visits:
+        raise ReplanError("error_edit_place", f"day {edit.day} does not visit {edit.place_id}")
+    if edit.action == "drop":
+        if len(visits) == 1:
+            raise ReplanError("error_edit_last", f"{edit.place_id} is the only visit of day {edit.day}")
+        new = [pid for pid in visits if pid != edit.place_id]
+    elif edit.action == "replace":
+        target = edit.with_place_id or next((p.id for p in entry.candidates if p.id not in used), None)
+        if target is None:
+            raise ReplanError("error_edit_place", f"no unused place left in {entry.city}")
+        if target not in position or target in used:
+            raise ReplanError("error_edit_place", f"{target} is not an unused place in {entry.city}")
+        new = [target if pid == edit.place_id else pid for pid in visits]
+    elif edit.action == "nearby":
+        if edit.place_id not in position:
+            raise ReplanError("error_edit_place", f"{edit.place_id} is not in {entry.city} for these options")
+        here = entry.candidates[position[edit.place_id]]
+        found = snap.index.nearest_unvisited(view, entry.city, here.lat, here.lon, used)
+        if found is None:
+            raise ReplanError("error_edit_place", f"no unused place left in {entry.city}")
+        new = [found.id if pid == edit.place_id else pid for pid in visits]
+    else:
+        # Indoor visits stay, outdoor ones give way to the day's rainy alternatives in order
+        alts = [a.place_id for a in old.rainy_alternatives if a.place_id not in used]
+        new = []
+        for pid in visits:
+            if pid in position and entry.candidates[position[pid]].indoor:
+                new.append(pid)
+            elif alts:
+                new.append(alts.pop(0))
+    unknown = [pid for pid in new if pid not in position]
+    if unknown or not new:
+        raise ReplanError("error_edit_place", f"not in {entry.city} for these options: {', '.join(unknown)}")
+
+    visited = (used - set(visits)) | set(new)
+    slot = DaySlot(
+        entry.city,
+        tuple(sorted(position[pid] for pid in new)),  # ranking order, like the schedulers
+        tuple(sorted(position[pid] for pid in visited if pid in position)),
     )
+    day = plan_day(edit.day, view, slot, cfg, snap.travel.table(cfg.speed_profile))
+    days = list(itinerary.days)
+    days[edit.day - 1] = day
+    total = itinerary.total_budget_rub - old.day_budget.total_rub + day.day_budget.total_rub
+    return itinerary.model_copy(update={"days": days, "total_budget_rub": total})
+
+
+def render_plan_json(
+    days: int, cfg: PlannerConfig, snapshot: Optional[CatalogSnapshot] = None, compact: bool = False
+) -> bytes:
+    # Module-level so it can be shipped to a process pool; there the worker's own catalog is used
+    return encode_itinerary(plan_itinerary(days=days, cfg=cfg, snapshot=snapshot), compact=compact)
+
+
+def render_day_json(
+    day: int, slot: DaySlot, cfg: PlannerConfig, snapshot: Optional[CatalogSnapshot] = None, compact: bool = False
+) -> Tuple[bytes, int]:
+    """One day of the plan on its own, with its total cost.
+
+    Given the schedule, days are independent (per-day seeds), so a stream can
+    compute them in parallel and in any worker.
+    """
+    snap = snapshot or catalog.snapshot()
+    view = snap.index.view(cfg.mobility, cfg.budget_level, cfg.origin)
+    plan = plan_day(day, view, slot, cfg, snap.travel.table(cfg.speed_profile))
+    return encode_day_plan(plan, cfg.lang, compact=compact), plan.day_budget.total_rub
+
+
+def render_replan_json(
+    itinerary: ItineraryResponse,
+    edit: PlanEdit,
+    cfg: PlannerConfig,
+    snapshot: Optional[CatalogSnapshot] = None,
+    compact: bool = False,
+) -> bytes:
+    return encode_itinerary(replan_day(itinerary, edit, cfg, snapshot), compact=compact)
+
+
+def render_plan_timed(
+    days: int, cfg: PlannerConfig, snapshot: Optional[CatalogSnapshot] = None, compact: bool = False
+) -> Tuple[bytes, Dict[str, float]]:
+    """render_plan_json plus per-stage seconds, measured where the plan is computed."""
+    timer = StageTimer()
+    body = encode_itinerary(plan_itinerary(days=days, cfg=cfg, snapshot=snapshot, timer=timer), compact=compact)
+    timer.lap("render")
+    return body, timer.stages
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .catalog import CatalogSnapshot, catalog
+from .config import settings
+from .travel import PROFILES
+
+
+log = logging.getLogger(__name__)
+
+# Set in forked workers: the supervisor that owns the shared catalog
+_supervisor_pid: Optional[int] = None
+
+# Seconds old workers get to finish in-flight requests after a generation swap or shutdown
+GRACEFUL_SECONDS = 30.0
+POLL_SECONDS = 0.2
+
+
+def supervised() -> bool:
+    return _supervisor_pid is not None
+
+
+def request_reload() -> bool:
+    """Ask the supervisor to load a new catalog generation; False when not supervised."""
+    if _supervisor_pid is None:
+        return False
+    os.kill(_supervisor_pid, signal.SIGHUP)
+    return True
+
+
+def preload() -> CatalogSnapshot:
+    """Build everything workers read, then keep the collector off those pages.
+
+    Objects created so far move to the permanent generation, so collections
+    in the workers do not write to (and copy) the shared pages.
+    """
+    gc.unfreeze()
+    snap = catalog.snapshot()
+    for name in PROFILES:
+        snap.travel.table(name)  # type: ignore[union-attr]
+    gc.collect()
+    gc.freeze()
+    return snap
+
+
+class Supervisor:
+    """Pre-forking server: the catalog is built once, workers share it copy-on-write.
+
+    The parent binds the socket, loads the catalog and its indexes, then
+    forks ``workers`` uvicorn servers that inherit both. Only the parent
+    watches the catalog files. When the content changes (or a worker asks
+    via SIGHUP), it loads the new generation, forks a fresh set of workers
+    from it and sends SIGTERM to the old ones, which finish their requests
+    and exit. Dead workers are replaced from the current generation.
+    """
+
+    def __init__(self, host: str, port: int, workers: int) -> None:
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.generation = 0
+        self.version = ""
+        self._children: Dict[int, int] = {}  # pid -> generation
+        self._signals: List[int] = []
+        self._sock: Optional[socket.socket] = None
+        self._stopping = False
+        self._app: Any = None
+
+    def _bind(self) -> socket.socket:
+        # An explicit IPPROTO_TCP makes asyncio set TCP_NODELAY on accepted connections;
+        # without it keep-alive responses stall on delayed ACKs (~40 ms)
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = self.generation
+            return
+        code = 0
+        try:
+            self._run_worker()
+        except BaseException:
+            log.exception("worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _run_worker(self) -> None:
+        global _supervisor_pid
+
+        import uvicorn
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        _supervisor_pid = os.getppid()
+        catalog.check_interval = -1  # the supervisor owns reloads
+        server = uvicorn.Server(uvicorn.Config(self._app, lifespan="on", timeout_graceful_shutdown=int(GRACEFUL_SECONDS)))
+        server.run(sockets=[self._sock])  # type: ignore[list-item]
+
+    def _on_signal(self, signum: int, _frame: object) -> None:
+        self._signals.append(signum)
+
+    def _start_generation(self, snap: CatalogSnapshot) -> None:
+        old = [pid for pid, gen in self._children.items() if gen == self.generation]
+        self.generation += 1
+        self.version = snap.version
+        for _ in range(self.workers):
+            self._spawn()
+        for pid in old:
+            self._kill(pid, signal.SIGTERM)
+        log.info("generation %d: catalog %s, %d workers", self.generation, snap.version, self.workers)
+
+    def _kill(self, pid: int, sig: int) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self) -> None:
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._children.clear()
+                return
+            if pid == 0:
+                return
+            gen = self._children.pop(pid, None)
+            if gen == self.generation and not self._stopping:
+                log.warning("worker %d exited (status %d), restarting", pid, status)
+                self._spawn()
+
+    def _reload(self, force: bool) -> None:
+        gc.unfreeze()
+        try:
+            snap = catalog.reload() if force else catalog.snapshot()
+        except Exception:
+            log.exception("catalog reload failed, keeping generation %d", self.generation)
+            gc.freeze()
+            return
+        if snap.version == self.version:
+            gc.freeze()
+            return
+        self._start_generation(preload())
+
+    def _shutdown(self) -> None:
+        self._stopping = True
+        for pid in list(self._children):
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + GRACEFUL_SECONDS + 5
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(POLL_SECONDS)
+        for pid in list(self._children):
+            self._kill(pid, signal.SIGKILL)
+
+    def run(self) -> None:
+        self._sock = self._bind()
+        log.info("listening on %s:%d, preloading the catalog", self.host, self.port)
+        from .main import app  # imported before forking, so the app's modules are shared too
+
+        self._app = app
+        self._start_generation(preload())
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, self._on_signal)
+        next_check = time.monotonic() + max(catalog.check_interval, 0)
+        try:
+            while True:
+                self._reap()
+                while self._signals:
+                    sig = self._signals.pop(0)
+                    if sig == signal.SIGHUP:
+                        self._reload(force=True)
+                    else:
+                        return
+                if catalog.check_interval >= 0 and time.monotonic() >= next_check:
+                    self._reload(force=False)
+                    next_check = time.monotonic() + catalog.check_interval
+                time.sleep(POLL_SECONDS)
+        finally:
+            self._shutdown()
+            self._sock.close()
+
+
+def serve(host: str, port: int, workers: int, preload_catalog: bool) -> None:
+    if preload_catalog and hasattr(os, "fork"):
+        Supervisor(host, port, workers).run()
+        return
+    import uvicorn
+
+    # One independent catalog per worker
+    uvicorn.run("app.main:app", host=host, port=port, workers=workers)
+
+
+def _cli(argv: Sequence[str]) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app serve", description="Run the API server")
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument("--workers", type=int, default=settings.workers)
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default=settings.preload_catalog,
+        help="build the catalog once and share it with forked workers",
+    )
+    args = parser.parse_args(list(argv))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+    serve(args.host, args.port, args.workers, args.preload)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import cProfile
+import itertools
+import json
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import check_owner, private_dir
+
+
+# Profiles are written as
+#
+#   <utc time>-<pid>-<n>.prof     pstats (cProfile) data: python -m pstats, snakeviz, gprof2dot
+#   <utc time>-<pid>-<n>.folded   collapsed stacks, one "a;b;c <samples>" line: flamegraph.pl, speedscope
+#   <name>.json                   what was profiled (request, catalog version, wall time)
+#
+# into one directory; every worker process writes there and keeps only the newest ones.
+
+FORMATS = {"pstats": ".prof", "collapsed": ".folded"}
+NAME_RE = re.compile(r"^[0-9TZ]+-\d+-\d+\.(prof|folded)$")
+
+SAMPLE_INTERVAL = 0.001
+
+# The sampler only runs when the profiled thread gives up the GIL, every sys.getswitchinterval()
+# (5 ms by default) on a busy thread; while any sampler runs the interval is lowered to match
+_switch_lock = threading.Lock()
+_samplers = 0
+_saved_switch = 0.0
+
+# Held while a cProfile runs in this process
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a helper thread, counting identical stacks."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def __enter__(self) -> "StackSampler":
+        global _samplers, _saved_switch
+        with _switch_lock:
+            if _samplers == 0:
+                _saved_switch = sys.getswitchinterval()
+                sys.setswitchinterval(min(self.interval, _saved_switch))
+            _samplers += 1
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        global _samplers
+        self._stop.set()
+        self._thread.join()
+        with _switch_lock:
+            _samplers -= 1
+            if _samplers == 0:
+                sys.setswitchinterval(_saved_switch)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> bytes:
+        return "".join(f"{stack} {n}\n" for stack, n in self.counts.most_common()).encode("utf-8")
+
+
+def _sampled(fn: Callable[..., Any], *args: Any) -> Tuple[Any, str, bytes]:
+    with StackSampler(threading.get_ident()) as sampler:
+        result = fn(*args)
+    return result, "collapsed", sampler.collapsed()
+
+
+def profile_call(fmt: str, fn: Callable[..., Any], *args: Any) -> Tuple[Any, str, bytes]:
+    """fn(*args) under the profiler: its result, the profile's format and the profile as bytes.
+
+    Runs on the executor like fn itself would, and process workers send
+    back bytes. Only one cProfile can run per process (from Python 3.12 it
+    is built on the process-wide sys.monitoring, and sees every thread), so
+    while one is running other profiled calls get the stack sampler, which
+    follows only its own thread.
+    """
+    if fmt == "collapsed" or not _cprofile_lock.acquire(blocking=False):
+        return _sampled(fn, *args)
+    try:
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            return _sampled(fn, *args)  # another profiler (a debugger, coverage) holds the hook
+        try:
+            result = fn(*args)
+        finally:
+            prof.disable()
+        prof.create_stats()
+    finally:
+        _cprofile_lock.release()
+    # The same bytes Profile.dump_stats() writes
+    return result, "pstats", marshal.dumps(prof.stats)  # type: ignore[attr-defined]
+
+
+class ProfileStore:
+    """Ring of the ``keep`` most recent profiles in ``directory``, shared by all workers."""
+
+    def __init__(self, directory: str, keep: int, fmt: str = "pstats") -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown profile format: {fmt}")
+        self.directory = Path(directory)
+        self.keep = max(1, keep)
+        self.format = fmt  # for sampled requests
+        self._seq = itertools.count(1)
+
+    def _profiles(self) -> List[Path]:
+        try:
+            check_owner(self.directory)
+        except OSError:
+            return []  # missing, or not ours: nothing in it was written by this server
+        # Names start with the time, so sorting by name is sorting by age
+        return sorted(p for p in self.directory.iterdir() if NAME_RE.match(p.name))
+
+    def save(self, fmt: str, data: bytes, meta: Dict[str, Any]) -> str:
+        private_dir(self.directory)
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f"{int(now * 1000) % 1000:03d}Z"
+        # Zero-padded so saves within one millisecond still sort in order
+        name = f"{stamp}-{os.getpid()}-{next(self._seq):06d}{FORMATS[fmt]}"
+        info = {"name": name, "format": fmt, "bytes": len(data), "created": round(now, 3), "pid": os.getpid(), **meta}
+        # Metadata first: profiles are listed by their data file, which then always has its metadata
+        path = self.directory / name
+        for path, body in ((path.with_name(name + ".json"), json.dumps(info).encode("utf-8")), (path, data)):
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        for old in self._profiles()[: -self.keep]:
+            for path in (old, old.with_name(old.name + ".json")):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass  # pruned by another worker
+        return name
+
+    def list(self) -> List[Dict[str, Any]]:
+        out = []
+        for path in reversed(self._profiles()):
+            try:
+                out.append(json.loads(path.with_name(path.name + ".json").read_text(encoding="utf-8")))
+            except (FileNotFoundError, ValueError):
+                out.append({"name": path.name})
+        return out
+
+    def path(self, name: str) -> Optional[Path]:
+        if not NAME_RE.match(name):
+            return None
+        path = self.directory / name
+        return path if path in self._profiles() else None
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from operator import attrgetter
+from typing import Any, Dict, List, Optional
+
+from pydantic import TypeAdapter
+
+from .models import Place
+
+FIELDS = tuple(Place.model_fields)
+_values = attrgetter(*FIELDS)
+
+PLACES_ADAPTER: TypeAdapter[List[Place]] = TypeAdapter(List[Place])
+
+
+class PlaceRecord:
+    """A catalog place as the planner sees it.
+
+    Same attributes as models.Place plus ``seq``, the place's position in
+    the catalog when it was loaded, which is a stable integer key (a
+    patched catalog keeps it, see ingest.apply_changes). Values live in
+    ``__slots__`` and are not validated again, so a record takes about a
+    fifth of a model's memory, and construction and attribute reads are
+    plain Python. Catalog input is validated once by PLACES_ADAPTER. Later
+    pydantic models only appear in responses.
+    """
+
+    __slots__ = ("seq", *FIELDS)
+
+    seq: int
+    id: str
+    name_ru: str
+    name_en: str
+    city_ru: str
+    city_en: str
+    lat: float
+    lon: float
+    categories: List[str]
+    indoor: bool
+    stairs_level: int
+    avg_visit_minutes: int
+    cost_rub: int
+    notes_ru: Optional[str]
+    notes_en: Optional[str]
+
+    def __init__(
+        self,
+        seq: int,
+        id: str,
+        name_ru: str,
+        name_en: str,
+        city_ru: str,
+        city_en: str,
+        lat: float,
+        lon: float,
+        categories: List[str],
+        indoor: bool,
+        stairs_level: int,
+        avg_visit_minutes: int,
+        cost_rub: int,
+        notes_ru: Optional[str] = None,
+        notes_en: Optional[str] = None,
+    ) -> None:
+        self.seq = seq
+        self.id = id
+        self.name_ru = name_ru
+        self.name_en = name_en
+        self.city_ru = city_ru
+        self.city_en = city_en
+        self.lat = lat
+        self.lon = lon
+        self.categories = categories
+        self.indoor = indoor
+        self.stairs_level = stairs_level
+        self.avg_visit_minutes = avg_visit_minutes
+        self.cost_rub = cost_rub
+        self.notes_ru = notes_ru
+        self.notes_en = notes_en
+
+    @classmethod
+    def from_model(cls, seq: int, place: Place) -> "PlaceRecord":
+        return cls(seq, **place.__dict__)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The fields of models.Place (without ``seq``), e.g. for writing places.json."""
+        return dict(zip(FIELDS, _values(self)))
+
+    def to_model(self) -> Place:
+        return Place.model_construct(**self.as_dict())
+
+    def __repr__(self) -> str:
+        return f"PlaceRecord(seq={self.seq}, id={self.id!r}, city_ru={self.city_ru!r})"
+
+
+def parse_records(raw: bytes) -> List[PlaceRecord]:
+    """Validate a places.json document and keep its places as records."""
+    return [PlaceRecord.from_model(seq, p) for seq, p in enumerate(PLACES_ADAPTER.validate_json(raw))]
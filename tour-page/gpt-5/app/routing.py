@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .spatial import SpatialIndex
+from .utils import haversine_matrix_km
+
+
+Coord = Tuple[float, float]
+Matrix = Sequence[Sequence[float]]
+Neighbours = Sequence[Sequence[int]]  # per matrix node, the closest point nodes
+
+# Longer routes are seeded from a k-d tree, and the local search only tries
+# moves that join a node to one of its NEIGHBOURS closest points
+SPATIAL_MIN_POINTS = 32
+NEIGHBOURS = 8
+
+
+@dataclass
+class RouteResult:
+    order: List[int]  # indexes into the input points
+    optimizer: str
+    nearest_km: float  # greedy nearest-neighbour tour, the baseline
+    length_km: float
+    solver_ms: float
+    truncated: bool  # time budget ran out before the local search converged
+
+    @property
+    def gain_km(self) -> float:
+        return self.nearest_km - self.length_km
+
+
+class _Deadline:
+    def __init__(self, budget_ms: float) -> None:
+        self.until = time.perf_counter() + max(0.0, budget_ms) / 1000.0
+        self.hit = False
+
+    def expired(self) -> bool:
+        if not self.hit and time.perf_counter() >= self.until:
+            self.hit = True
+        return self.hit
+
+
+# An optimizer improves a path over matrix nodes in place. Node 0 is the start,
+# node n+1 the fixed end; only the inner nodes move. Neighbours, when given,
+# restrict the moves worth trying.
+Optimizer = Callable[[List[int], Matrix, random.Random, _Deadline, Optional[Neighbours]], None]
+
+OPTIMIZERS: Dict[str, Optimizer] = {}
+
+
+def register_optimizer(name: str) -> Callable[[Optimizer], Optimizer]:
+    def deco(fn: Optimizer) -> Optimizer:
+        OPTIMIZERS[name] = fn
+        return fn
+
+    return deco
+
+
+def path_km(path: Sequence[int], dist: Matrix) -> float:
+    return sum(dist[a][b] for a, b in zip(path, path[1:]))
+
+
+def greedy_path(dist: Matrix, n: int) -> List[int]:
+    # Ties go to the first of equally close points, as in SpatialIndex.nearest_order
+    remaining = list(range(1, n + 1))
+    path = [0]
+    while remaining:
+        cur = path[-1]
+        nxt = min(remaining, key=lambda j: dist[cur][j])
+        path.append(nxt)
+        remaining.remove(nxt)
+    path.append(n + 1)
+    return path
+
+
+def spatial_neighbours(points: Sequence[Coord], start: Coord, index: SpatialIndex) -> List[List[int]]:
+    """NEIGHBOURS closest points (as matrix nodes 1..n) of the start and of every point."""
+    near = [[i + 1 for _, i in index.knn(start[0], start[1], NEIGHBOURS)]]
+    for k, (lat, lon) in enumerate(points):
+        near.append([i + 1 for _, i in index.knn(lat, lon, NEIGHBOURS + 1) if i != k][:NEIGHBOURS])
+    return near
+
+
+def _two_opt_pass(
+    path: List[int], dist: Matrix, r: random.Random, deadline: _Deadline, near: Optional[Neighbours] = None
+) -> bool:
+    n = len(path) - 2
+    starts = list(range(1, n))
+    r.shuffle(starts)
+    pos = {node: k for k, node in enumerate(path)} if near is not None else {}
+    for i in starts:
+        if near is None:
+            ends: Sequence[int] = range(i + 1, n + 1)
+        else:
+            # Only reversals whose new edge joins path[i - 1] to one of its neighbours
+            ends = sorted(j for j in (pos[c] for c in near[path[i - 1]]) if i < j <= n)
+        for j in ends:
+            a, b, c, d = path[i - 1], path[i], path[j], path[j + 1]
+            if dist[a][c] + dist[b][d] < dist[a][b] + dist[c][d] - 1e-9:
+                path[i : j + 1] = reversed(path[i : j + 1])
+                return True
+        if deadline.expired():
+            return False
+    return False
+
+
+def _or_opt_pass(
+    path: List[int], dist: Matrix, r: random.Random, deadline: _Deadline, near: Optional[Neighbours] = None
+) -> bool:
+    # Move a chain of 1-3 inner nodes (optionally reversed) to another gap
+    n = len(path) - 2
+    moves = [(i, k) for k in (1, 2, 3) for i in range(1, n - k + 2)]
+    r.shuffle(moves)
+    for i, k in moves:
+        seg = path[i : i + k]
+        prev, nxt = path[i - 1], path[i + k]
+        removed = dist[prev][seg[0]] + dist[seg[-1]][nxt] - dist[prev][nxt]
+        rest = path[:i] + path[i + k :]
+        if near is None:
+            gaps: Sequence[int] = range(len(rest) - 1)
+        else:
+            # Only gaps next to a neighbour of either end of the chain
+            pos = {node: g for g, node in enumerate(rest)}
+            close = {pos[c] for c in (*near[seg[0]], *near[seg[-1]]) if c in pos}
+            gaps = sorted({g for c in close for g in (c - 1, c) if 0 <= g < len(rest) - 1})
+        for g in gaps:
+            if g == i - 1:
+                continue
+            u, v = rest[g], rest[g + 1]
+            for chain in (seg, seg[::-1]):
+                added = dist[u][chain[0]] + dist[chain[-1]][v] - dist[u][v]
+                if added < removed - 1e-9:
+                    path[:] = rest[: g + 1] + chain + rest[g + 1 :]
+                    return True
+        if deadline.expired():
+            return False
+    return False
+
+
+@register_optimizer("nearest")
+def _nearest(
+    path: List[int], dist: Matrix, r: random.Random, deadline: _Deadline, near: Optional[Neighbours] = None
+) -> None:
+    return None
+
+
+@register_optimizer("two_opt")
+def _two_opt(
+    path: List[int], dist: Matrix, r: random.Random, deadline: _Deadline, near: Optional[Neighbours] = None
+) -> None:
+    while not deadline.expired() and _two_opt_pass(path, dist, r, deadline, near):
+        pass
+
+
+@register_optimizer("local")
+def _local(
+    path: List[int], dist: Matrix, r: random.Random, deadline: _Deadline, near: Optional[Neighbours] = None
+) -> None:
+    # 2-opt to a local optimum, then Or-opt; repeat while either improves
+    while not deadline.expired():
+        improved = False
+        while not deadline.expired() and _two_opt_pass(path, dist, r, deadline, near):
+            improved = True
+        if not deadline.expired() and _or_opt_pass(path, dist, r, deadline, near):
+            improved = True
+        if not improved:
+            break
+
+
+def optimize_route(
+    points: Sequence[Coord],
+    start: Coord,
+    end: Optional[Coord] = None,
+    optimizer: str = "local",
+    budget_ms: float = 20.0,
+    seed: int | str = 0,
+    dist: Optional[Matrix] = None,
+) -> RouteResult:
+    """Order points into a short path start -> points -> end (end is optional).
+
+    Starts from the greedy nearest-neighbour tour and improves it with the
+    chosen local search until it converges or budget_ms runs out. For a given
+    seed the scan order is fixed, so results are reproducible whenever the
+    search converges within the budget.
+
+    dist, if given, is the precomputed km matrix over start, points and end
+    (in that order) and replaces the haversine computation. Above
+    SPATIAL_MIN_POINTS points the greedy tour and the candidate moves come
+    from a k-d tree over the points, which assumes dist holds great-circle
+    km like the travel tables do.
+    """
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"unknown route optimizer: {optimizer}")
+    t0 = time.perf_counter()
+    n = len(points)
+    if dist is None:
+        lats = [start[0]] + [p[0] for p in points] + [end[0] if end else start[0]]
+        lons = [start[1]] + [p[1] for p in points] + [end[1] if end else start[1]]
+        dist = haversine_matrix_km(lats, lons, lats, lons)
+        if hasattr(dist, "tolist"):
+            dist = dist.tolist()  # plain lists are faster for scalar lookups
+    elif end is None:
+        dist = [list(row) for row in dist]  # zeroed below, keep the caller's matrix intact
+    if end is None:
+        # Open path: leaving the last point is free
+        for row in dist:
+            row[n + 1] = 0.0
+    near: Optional[List[List[int]]] = None
+    if n > SPATIAL_MIN_POINTS:
+        # Same greedy tour as greedy_path, without its O(n^2) scan
+        index = SpatialIndex(points)
+        path = [0, *(i + 1 for i in index.nearest_order(start[0], start[1])), n + 1]
+        near = spatial_neighbours(points, start, index)
+    else:
+        path = greedy_path(dist, n)
+    nearest_km = path_km(path, dist)
+    deadline = _Deadline(budget_ms)
+    if n >= 2:
+        OPTIMIZERS[optimizer](path, dist, random.Random(seed), deadline, near)
+    return RouteResult(
+        order=[i - 1 for i in path[1:-1]],
+        optimizer=optimizer,
+        nearest_km=nearest_km,
+        length_km=path_km(path, dist),
+        solver_ms=(time.perf_counter() - t0) * 1000.0,
+        truncated=deadline.hit,
+    )
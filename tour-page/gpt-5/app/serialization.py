@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from pydantic import BaseModel, TypeAdapter
+
+from .models import DayPlan, ItineraryResponse, PlanRequest
+
+try:  # optional, faster encoder for plain dicts
+    import orjson
+except ImportError:  # pragma: no cover - depends on the install
+    orjson = None  # type: ignore[assignment]
+
+
+# Built once at import; validation and serialization schemas are reused per request
+PLAN_REQUEST_ADAPTER: TypeAdapter[PlanRequest] = TypeAdapter(PlanRequest)
+ITINERARY_ADAPTER: TypeAdapter[ItineraryResponse] = TypeAdapter(ItineraryResponse)
+DAY_PLAN_ADAPTER: TypeAdapter[DayPlan] = TypeAdapter(DayPlan)
+
+
+def loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def dumps(obj: Any) -> bytes:
+    # Compact UTF-8 output, same shape as JSONResponse renders
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_plan_request(raw: bytes) -> PlanRequest:
+    """Validate a PlanRequest straight from request bytes (raises ValidationError)."""
+    return PLAN_REQUEST_ADAPTER.validate_json(raw)
+
+
+def localize(obj: Any, lang: str) -> Any:
+    """Keep only lang's variant of every *_ru/*_en pair, under the bare name."""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            if k.endswith(("_ru", "_en")):
+                if k[-2:] == lang:
+                    out[k[:-3]] = v
+                continue
+            out[k] = localize(v, lang)
+        return out
+    if isinstance(obj, list):
+        return [localize(v, lang) for v in obj]
+    return obj
+
+
+def encode_model(model: BaseModel, lang: str, compact: bool = False) -> bytes:
+    if compact:
+        return dumps(localize(model.model_dump(), lang))
+    return model.model_dump_json().encode()
+
+
+def encode_itinerary(itinerary: ItineraryResponse, compact: bool = False) -> bytes:
+    if compact:
+        return dumps(localize(ITINERARY_ADAPTER.dump_python(itinerary), itinerary.lang))
+    return ITINERARY_ADAPTER.dump_json(itinerary)
+
+
+def encode_day_plan(day: DayPlan, lang: str, compact: bool = False) -> bytes:
+    if compact:
+        return dumps(localize(DAY_PLAN_ADAPTER.dump_python(day), lang))
+    return DAY_PLAN_ADAPTER.dump_json(day)
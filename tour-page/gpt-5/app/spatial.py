@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import heapq
+import math
+from typing import List, Optional, Sequence, Tuple
+
+from .utils import haversine_km
+
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE = 8
+# Slack for float error between the chord bound and haversine_km
+_EPS_KM = 1e-9
+
+
+def unit_xyz(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lon)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+def km_from_chord(chord: float) -> float:
+    """Great-circle distance for a straight-line distance between unit vectors."""
+    return 2.0 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2.0))
+
+
+class SpatialIndex:
+    """Static k-d tree over (lat, lon) points mapped onto the unit sphere.
+
+    Boxes are pruned with the chord distance, which is monotonic in the
+    great-circle distance; candidates are then scored with ``haversine_km``
+    so results (including ties, broken by point index) match a brute-force
+    scan exactly.
+    """
+
+    def __init__(self, coords: Sequence[Tuple[float, float]]) -> None:
+        self.coords = [(float(lat), float(lon)) for lat, lon in coords]
+        self.xyz = [unit_xyz(lat, lon) for lat, lon in self.coords]
+        self.perm = list(range(len(self.coords)))
+        # Per node: bounding box, children (-1 for leaves), perm slice, parent
+        self.lo: List[Tuple[float, float, float]] = []
+        self.hi: List[Tuple[float, float, float]] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        self.start: List[int] = []
+        self.end: List[int] = []
+        self.parent: List[int] = []
+        self.leaf_of = [0] * len(self.coords)
+        if self.coords:
+            self._build(0, len(self.perm), -1)
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def _build(self, start: int, end: int, parent: int) -> int:
+        pts = [self.xyz[i] for i in self.perm[start:end]]
+        lo = (min(p[0] for p in pts), min(p[1] for p in pts), min(p[2] for p in pts))
+        hi = (max(p[0] for p in pts), max(p[1] for p in pts), max(p[2] for p in pts))
+        node = len(self.lo)
+        self.lo.append(lo)
+        self.hi.append(hi)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.start.append(start)
+        self.end.append(end)
+        self.parent.append(parent)
+        if end - start <= LEAF_SIZE:
+            for i in self.perm[start:end]:
+                self.leaf_of[i] = node
+            return node
+        axis = max(range(3), key=lambda a: hi[a] - lo[a])
+        self.perm[start:end] = sorted(self.perm[start:end], key=lambda i: (self.xyz[i][axis], i))
+        mid = (start + end) // 2
+        self.left[node] = self._build(start, mid, node)
+        self.right[node] = self._build(mid, end, node)
+        return node
+
+    def _bound_km(self, node: int, q: Tuple[float, float, float]) -> float:
+        lo, hi = self.lo[node], self.hi[node]
+        d2 = 0.0
+        for a in range(3):
+            if q[a] < lo[a]:
+                d2 += (lo[a] - q[a]) ** 2
+            elif q[a] > hi[a]:
+                d2 += (q[a] - hi[a]) ** 2
+        return km_from_chord(math.sqrt(d2))
+
+    def _dist(self, lat: float, lon: float, i: int) -> float:
+        p_lat, p_lon = self.coords[i]
+        return haversine_km(lat, lon, p_lat, p_lon)
+
+    def knn(self, lat: float, lon: float, k: int) -> List[Tuple[float, int]]:
+        """The k nearest points as (distance_km, index), closest first."""
+        if k <= 0 or not self.coords:
+            return []
+        q = unit_xyz(lat, lon)
+        best: List[Tuple[float, int]] = []  # max-heap of (-km, -index)
+        frontier = [(0.0, 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == k and bound > -best[0][0] + _EPS_KM:
+                break
+            if self.left[node] < 0:
+                for i in self.perm[self.start[node] : self.end[node]]:
+                    item = (-self._dist(lat, lon, i), -i)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                continue
+            for child in (self.left[node], self.right[node]):
+                heapq.heappush(frontier, (self._bound_km(child, q), child))
+        return sorted((-km, -neg_i) for km, neg_i in best)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, int]]:
+        """Points at most radius_km from (lat, lon) as (distance_km, index), closest first."""
+        if radius_km < 0 or not self.coords:
+            return []
+        q = unit_xyz(lat, lon)
+        hits: List[Tuple[float, int]] = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._bound_km(node, q) > radius_km + _EPS_KM:
+                continue
+            if self.left[node] < 0:
+                for i in self.perm[self.start[node] : self.end[node]]:
+                    d = self._dist(lat, lon, i)
+                    if d <= radius_km:
+                        hits.append((d, i))
+                continue
+            stack.extend((self.left[node], self.right[node]))
+        hits.sort()
+        return hits
+
+    def visitor(self) -> "NearestUnvisited":
+        return NearestUnvisited(self)
+
+    def nearest_order(self, lat: float, lon: float) -> List[int]:
+        """Greedy nearest-neighbour tour from (lat, lon) over all points, ties broken by index."""
+        visitor = self.visitor()
+        order: List[int] = []
+        while True:
+            found = visitor.pop_nearest(lat, lon)
+            if found is None:
+                return order
+            order.append(found[1])
+            lat, lon = self.coords[found[1]]
+
+
+class NearestUnvisited:
+    """Repeated "closest point not taken yet" queries over a SpatialIndex.
+
+    Each node keeps a count of remaining points so exhausted subtrees are
+    skipped; a full greedy tour costs roughly O(n log n) instead of O(n^2).
+    """
+
+    def __init__(self, index: SpatialIndex) -> None:
+        self.index = index
+        self.taken = [False] * len(index)
+        self.alive = [e - s for s, e in zip(index.start, index.end)]
+        self.remaining = len(index)
+
+    def take(self, i: int) -> None:
+        if self.taken[i]:
+            return
+        self.taken[i] = True
+        self.remaining -= 1
+        node = self.index.leaf_of[i]
+        while node >= 0:
+            self.alive[node] -= 1
+            node = self.index.parent[node]
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[float, int]]:
+        if self.remaining == 0:
+            return None
+        idx = self.index
+        q = unit_xyz(lat, lon)
+        best: Optional[Tuple[float, int]] = None
+        frontier = [(0.0, 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if best is not None and bound > best[0] + _EPS_KM:
+                break
+            if idx.left[node] < 0:
+                for i in idx.perm[idx.start[node] : idx.end[node]]:
+                    if self.taken[i]:
+                        continue
+                    item = (idx._dist(lat, lon, i), i)
+                    if best is None or item < best:
+                        best = item
+                continue
+            for child in (idx.left[node], idx.right[node]):
+                if self.alive[child] > 0:
+                    heapq.heappush(frontier, (idx._bound_km(child, q), child))
+        return best
+
+    def pop_nearest(self, lat: float, lon: float) -> Optional[Tuple[float, int]]:
+        found = self.nearest(lat, lon)
+        if found is not None:
+            self.take(found[1])
+        return found
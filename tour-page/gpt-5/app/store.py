@@ -0,0 +1,412 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, get_args, overload
+
+from .indexes import CityEntry, PlaceView, ViewIndex, rank_cities
+from .models import BudgetLevel, MobilityPref
+from .records import PlaceRecord
+from .origins import SPB
+from .planner import is_usable, max_cost, max_stairs
+from .spatial import EARTH_RADIUS_KM
+from .utils import haversine_km, haversine_km_many
+
+
+# SQLite catalog (places.db), an alternative to places.json for catalogs too big to
+# keep in memory. Rows keep the JSON order (seq), which breaks ties exactly like the
+# stable sorts of the in-memory index. The accessibility/budget filters, the
+# per-city rankings and proximity lookups (R-tree over lat/lon) run as SQL; only
+# the rows the planner actually reads are turned into place records.
+
+SCHEMA_VERSION = 2  # 2: places_geo R-tree
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE places (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name_ru TEXT NOT NULL,
+    name_en TEXT NOT NULL,
+    city_ru TEXT NOT NULL,
+    city_en TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    categories TEXT NOT NULL,
+    indoor INTEGER NOT NULL,
+    stairs_level INTEGER NOT NULL,
+    avg_visit_minutes INTEGER NOT NULL,
+    cost_rub INTEGER NOT NULL,
+    notes_ru TEXT,
+    notes_en TEXT,
+    usable INTEGER NOT NULL
+);
+CREATE INDEX places_rank ON places (city_ru, usable, indoor DESC, stairs_level, cost_rub, name_ru);
+CREATE INDEX places_rainy ON places (city_ru, usable, indoor, cost_rub, avg_visit_minutes, name_ru);
+CREATE INDEX places_stairs ON places (stairs_level);
+CREATE INDEX places_cost ON places (cost_rub);
+CREATE VIRTUAL TABLE places_geo USING rtree (seq, min_lat, max_lat, min_lon, max_lon);
+"""
+
+_COLUMNS = (
+    "seq, id, name_ru, name_en, city_ru, city_en, lat, lon, categories, indoor, stairs_level, "
+    "avg_visit_minutes, cost_rub, notes_ru, notes_en"
+)
+
+# Same orders as planner.place_score and planner.rainy_score, then catalog order
+CANDIDATE_ORDER = "indoor DESC, stairs_level, cost_rub, name_ru, seq"
+RAINY_ORDER = "cost_rub, avg_visit_minutes, name_ru, seq"
+
+DB_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+Where = Tuple[str, Tuple[Any, ...]]
+
+
+def _place(row: Sequence[Any]) -> PlaceRecord:
+    return PlaceRecord(
+        seq=row[0],
+        id=row[1],
+        name_ru=row[2],
+        name_en=row[3],
+        city_ru=row[4],
+        city_en=row[5],
+        lat=row[6],
+        lon=row[7],
+        categories=json.loads(row[8]),
+        indoor=bool(row[9]),
+        stairs_level=row[10],
+        avg_visit_minutes=row[11],
+        cost_rub=row[12],
+        notes_ru=row[13],
+        notes_en=row[14],
+    )
+
+
+def _row(seq: int, p: PlaceRecord) -> Tuple[Any, ...]:
+    return (
+        seq, p.id, p.name_ru, p.name_en, p.city_ru, p.city_en, p.lat, p.lon,
+        json.dumps(p.categories, ensure_ascii=False), int(p.indoor), p.stairs_level,
+        p.avg_visit_minutes, p.cost_rub, p.notes_ru, p.notes_en, int(is_usable(p)),
+    )
+
+
+_INTO = f"INTO places ({_COLUMNS}, usable) VALUES ({', '.join('?' * 16)})"
+
+
+def geo_boxes(lat: float, lon: float, radius_km: float) -> List[Tuple[float, float, float, float]]:
+    """(min_lat, max_lat, min_lon, max_lon) boxes that cover the circle around (lat, lon).
+
+    A circle over a pole covers every longitude; one across the
+    antimeridian is split in two. The boxes are a little wider than the
+    circle, and callers drop their corners by exact distance.
+    """
+    d = radius_km / EARTH_RADIUS_KM
+    margin = 1e-7  # degrees, about a centimetre
+    dlat = math.degrees(d) + margin
+    lo, hi = lat - dlat, lat + dlat
+    if lo <= -90.0 or hi >= 90.0:
+        return [(max(lo, -90.0), min(hi, 90.0), -180.0, 180.0)]
+    dlon = math.degrees(math.asin(min(1.0, math.sin(d) / math.cos(math.radians(lat))))) + margin
+    if dlon >= 180.0:
+        return [(lo, hi, -180.0, 180.0)]
+    west, east = lon - dlon, lon + dlon
+    if west < -180.0:
+        return [(lo, hi, west + 360.0, 180.0), (lo, hi, -180.0, east)]
+    if east > 180.0:
+        return [(lo, hi, west, 180.0), (lo, hi, -180.0, east - 360.0)]
+    return [(lo, hi, west, east)]
+
+
+def view_filter(mobility: MobilityPref, budget: BudgetLevel) -> Where:
+    """is_usable + filter_accessible + filter_budget as a WHERE clause."""
+    return "usable = 1 AND stairs_level <= ? AND cost_rub <= ?", (max_stairs(mobility), max_cost(budget))
+
+
+class PlaceStore:
+    """Read-only access to a SQLite catalog; one connection per thread and process.
+
+    Places are built once per row and shared by every view that reads them.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(self.path)
+        self._local = threading.local()
+        self._places: Dict[int, PlaceRecord] = {}  # seq -> place, only rows read so far
+        meta = dict(self.execute("SELECT key, value FROM meta").fetchall())
+        if int(meta.get("schema", 0)) != SCHEMA_VERSION:
+            raise ValueError(f"{self.path} has catalog schema {meta.get('schema')}, expected {SCHEMA_VERSION}")
+        self.version: str = meta["version"]
+
+    def _conn(self) -> sqlite3.Connection:
+        # SQLite connections must not cross fork() (prefork workers) or be shared between threads
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(self.path.resolve().as_uri() + "?mode=ro", uri=True)
+            local.pid = os.getpid()
+        return local.conn
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return self._conn().execute(sql, params)
+
+    def count(self, where: Where = ("1", ())) -> int:
+        return self.execute(f"SELECT COUNT(*) FROM places WHERE {where[0]}", where[1]).fetchone()[0]
+
+    def place(self, row: Sequence[Any]) -> PlaceRecord:
+        p = self._places.get(row[0])
+        if p is None:
+            p = self._places[row[0]] = _place(row)
+        return p
+
+    def fetch(self, where: Where, order: str, offset: int = 0, limit: int = -1) -> List[PlaceRecord]:
+        sql = f"SELECT {_COLUMNS} FROM places WHERE {where[0]} ORDER BY {order} LIMIT ? OFFSET ?"
+        return [self.place(row) for row in self.execute(sql, (*where[1], limit, offset))]
+
+    def iter_places(self, where: Where, order: str, offset: int = 0) -> Iterator[PlaceRecord]:
+        # Full scans (exports, benchmarks) do not go through the shared cache
+        sql = f"SELECT {_COLUMNS} FROM places WHERE {where[0]} ORDER BY {order} LIMIT -1 OFFSET ?"
+        for row in self.execute(sql, (*where[1], offset)):
+            yield self._places.get(row[0]) or _place(row)
+
+    def within(
+        self, lat: float, lon: float, radius_km: float, where: Where = ("1", ())
+    ) -> List[Tuple[float, PlaceRecord]]:
+        """Places at most radius_km from (lat, lon) as (distance, place), closest first (ties in catalog order).
+
+        The R-tree narrows the search to lat/lon boxes around the circle;
+        the boxes' corners are then dropped by exact haversine distance.
+        """
+        boxes = geo_boxes(lat, lon, radius_km)
+        in_box = " UNION ".join(
+            ["SELECT seq FROM places_geo WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?"]
+            * len(boxes)
+        )
+        sql = f"SELECT {_COLUMNS} FROM places WHERE seq IN ({in_box}) AND {where[0]}"
+        params = [v for lo, hi, west, east in boxes for v in (lo, hi, west, east)]
+        hits = []
+        for row in self.execute(sql, (*params, *where[1])):
+            d = haversine_km(lat, lon, row[6], row[7])
+            if d <= radius_km:
+                hits.append((d, row))
+        hits.sort(key=lambda h: (h[0], h[1][0]))
+        return [(d, self.place(row)) for d, row in hits]
+
+
+class PlaceRows(Sequence[PlaceRecord]):
+    """An ordered query over the store that reads like a list.
+
+    Rows are fetched in pages on first access and the touched prefix is
+    kept, so the planner's usual reads (the top few candidates per city)
+    stay cheap while the rest of the catalog is never materialized.
+    Iterating past the cached prefix streams without caching.
+    """
+
+    PAGE = 8
+
+    def __init__(self, store: PlaceStore, where: Where, order: str, size: Optional[int] = None) -> None:
+        self.store = store
+        self.where = where
+        self.order = order
+        self._size = size
+        self._rows: List[PlaceRecord] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        if self._size is None:
+            self._size = self.store.count(self.where)
+        return self._size
+
+    def _fill(self, upto: int) -> None:
+        with self._lock:
+            while len(self._rows) < upto:
+                page = self.store.fetch(self.where, self.order, len(self._rows), max(self.PAGE, upto - len(self._rows)))
+                if not page:
+                    break
+                self._rows.extend(page)
+
+    @overload
+    def __getitem__(self, i: int) -> PlaceRecord: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[PlaceRecord]: ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[PlaceRecord, List[PlaceRecord]]:
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if start >= stop:
+                return []
+            self._fill(stop)
+            return self._rows[start:stop:step]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if i >= len(self._rows):
+            self._fill(i + 1)
+        return self._rows[i]
+
+    def __iter__(self) -> Iterator[PlaceRecord]:
+        cached = list(self._rows)
+        yield from cached
+        yield from self.store.iter_places(self.where, self.order, len(cached))
+
+
+def build_sql_view(store: PlaceStore, mobility: MobilityPref, budget: BudgetLevel) -> PlaceView:
+    """indexes.build_view with the filtering and grouping done by SQLite."""
+    where = view_filter(mobility, budget)
+    # Coordinates only, in catalog order, so centers add up exactly like city_center()
+    lats: Dict[str, List[float]] = {}
+    lons: Dict[str, List[float]] = {}
+    for city, lat, lon in store.execute(f"SELECT city_ru, lat, lon FROM places WHERE {where[0]} ORDER BY seq", where[1]):
+        if city not in lats:
+            lats[city], lons[city] = [], []
+        lats[city].append(lat)
+        lons[city].append(lon)
+    centers = [(sum(lats[c]) / len(lats[c]), sum(lons[c]) / len(lons[c])) for c in lats]
+    dists = haversine_km_many(SPB.lat, SPB.lon, [c[0] for c in centers], [c[1] for c in centers])
+    # Candidate positions of the indoor places, in rainy order: only integers are kept
+    indoor: Dict[str, List[int]] = {city: [] for city in lats}
+    ranked_rows = (
+        f"SELECT city_ru, indoor, cost_rub, avg_visit_minutes, name_ru, seq, "
+        f"ROW_NUMBER() OVER (PARTITION BY city_ru ORDER BY {CANDIDATE_ORDER}) - 1 AS pos "
+        f"FROM places WHERE {where[0]}"
+    )
+    query = f"SELECT city_ru, pos FROM ({ranked_rows}) WHERE indoor = 1 ORDER BY city_ru, {RAINY_ORDER}"
+    for city, pos in store.execute(query, where[1]):
+        indoor[city].append(pos)
+    cities: Dict[str, CityEntry] = {}
+    for city, center, dist in zip(lats, centers, dists):
+        in_city = (f"city_ru = ? AND {where[0]}", (city, *where[1]))
+        cities[city] = CityEntry(
+            city=city,
+            places=PlaceRows(store, in_city, "seq", len(lats[city])),
+            center=center,
+            dist_origin_km=float(dist),
+            candidates=PlaceRows(store, in_city, CANDIDATE_ORDER, len(lats[city])),
+            rainy=PlaceRows(store, (f"indoor = 1 AND {in_city[0]}", in_city[1]), RAINY_ORDER),
+            indoor=tuple(indoor[city]),
+        )
+    places = PlaceRows(store, where, "seq", sum(len(v) for v in lats.values()))
+    return PlaceView(mobility=mobility, budget_level=budget, places=places, cities=cities, ranked=rank_cities(cities))
+
+
+class SqlPlannerIndex(ViewIndex):
+    """PlannerIndex over a PlaceStore: same views, rows fetched on demand, proximity through the R-tree."""
+
+    def __init__(self, store: PlaceStore) -> None:
+        self.store = store
+        self.usable = PlaceRows(store, ("usable = 1", ()), "seq")
+        self.views = {
+            (m, b): build_sql_view(store, m, b) for m in get_args(MobilityPref) for b in get_args(BudgetLevel)
+        }
+        super().__init__()
+
+    def within(
+        self, view: PlaceView, city: str, lat: float, lon: float, radius_km: float
+    ) -> List[Tuple[float, PlaceRecord]]:
+        where = view_filter(view.mobility, view.budget_level)
+        return self.store.within(lat, lon, radius_km, (f"city_ru = ? AND {where[0]}", (city, *where[1])))
+
+
+def import_places(places: Iterable[PlaceRecord], out: Path, version: str) -> Path:
+    """Write places into a new SQLite catalog, replacing out atomically."""
+    out = Path(out)
+    tmp = out.with_name(out.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(_SCHEMA)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [("schema", str(SCHEMA_VERSION)), ("version", version)])
+        conn.executemany("INSERT " + _INTO, (_row(seq, p) for seq, p in enumerate(places)))
+        conn.execute("INSERT INTO places_geo SELECT seq, lat, lat, lon, lon FROM places")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    # Open connections keep reading the old file; new ones see the complete catalog
+    os.replace(tmp, out)
+    return out
+
+
+def patch_places(db: Path, removed: Iterable[str], upserts: Iterable[PlaceRecord], version: str) -> Path:
+    """Apply a diff to a SQLite catalog, replacing it atomically.
+
+    Only the given rows and their R-tree entries are touched, on a copy of
+    the catalog. Changed places keep their seq (and so their place in
+    ties); new ones are appended.
+    """
+    db = Path(db)
+    tmp = db.with_name(db.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    src, conn = sqlite3.connect(db.resolve().as_uri() + "?mode=ro", uri=True), sqlite3.connect(tmp)
+    try:
+        src.backup(conn)
+        with conn:
+            for place_id in removed:
+                row = conn.execute("SELECT seq FROM places WHERE id = ?", (place_id,)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM places WHERE seq = ?", row)
+                    conn.execute("DELETE FROM places_geo WHERE seq = ?", row)
+            next_seq = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM places").fetchone()[0]
+            for p in upserts:
+                row = conn.execute("SELECT seq FROM places WHERE id = ?", (p.id,)).fetchone()
+                if row is None:
+                    row, next_seq = (next_seq,), next_seq + 1
+                    conn.execute("INSERT " + _INTO, _row(row[0], p))
+                    conn.execute("INSERT INTO places_geo VALUES (?, ?, ?, ?, ?)", (row[0], p.lat, p.lat, p.lon, p.lon))
+                else:
+                    conn.execute("REPLACE " + _INTO, _row(row[0], p))
+                    conn.execute(
+                        "UPDATE places_geo SET min_lat = ?, max_lat = ?, min_lon = ?, max_lon = ? WHERE seq = ?",
+                        (p.lat, p.lat, p.lon, p.lon, row[0]),
+                    )
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (version,))
+    finally:
+        src.close()
+        conn.close()
+    os.replace(tmp, db)
+    return db
+
+
+def export_places(db: Path, out: Path) -> Path:
+    store = PlaceStore(db)
+    out = Path(out)
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i, p in enumerate(store.iter_places(("1", ()), "seq")):
+            f.write(("" if i == 0 else ",\n") + json.dumps(p.as_dict(), ensure_ascii=False))
+        f.write("\n]\n")
+    os.replace(tmp, out)
+    return out
+
+
+def _cli(argv: Sequence[str]) -> None:
+    import argparse
+
+    from .catalog import DATA_PATH, content_version, parse_places
+    from .config import settings
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app import-catalog", description="Convert the catalog between places.json and SQLite"
+    )
+    parser.add_argument("--source", type=Path, default=Path(settings.catalog_path) if settings.catalog_path else DATA_PATH)
+    parser.add_argument("--out", type=Path, default=None, help="default: the source with .db (or .json) suffix")
+    args = parser.parse_args(list(argv))
+    if args.source.suffix in DB_SUFFIXES:
+        out = export_places(args.source, args.out or args.source.with_suffix(".json"))
+        print(f"{out}: {PlaceStore(args.source).count()} places exported")
+        return
+    raw = args.source.read_bytes()
+    out = import_places(parse_places(raw), args.out or args.source.with_suffix(".db"), content_version(raw))
+    store = PlaceStore(out)
+    print(f"{out}: {store.count()} places, {out.stat().st_size} bytes, source version {store.version}")
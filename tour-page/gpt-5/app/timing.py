@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Dict
+
+
+class StageTimer:
+    """Wall time per planner stage, in seconds.
+
+    ``lap(name)`` charges the time since the previous lap (or creation) to
+    ``name``; repeated stages, e.g. one per day, add up.
+    """
+
+    __slots__ = ("stages", "_last")
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self._last = perf_counter()
+
+    def lap(self, name: str) -> None:
+        now = perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + (now - self._last)
+        self._last = now
+
+
+class _NullTimer:
+    """Stand-in when instrumentation is off: laps cost one method call."""
+
+    __slots__ = ()
+    stages: Dict[str, float] = {}
+
+    def lap(self, name: str) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
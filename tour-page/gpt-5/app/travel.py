@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from .compiled import read_sections, write_sections
+from .config import check_owner, private_dir, settings
+from .origins import LRU, SPB, Origin
+from .utils import haversine_matrix_km, minutes_from_km_many
+
+if TYPE_CHECKING:
+    from .indexes import CityEntry, PlaceView, PlannerIndex
+
+
+log = logging.getLogger(__name__)
+
+# Travel matrices (travel-<catalog version>-<profile>.tpm), one per city and
+# mobility x budget view, over node 0 = city center, 1..n = the city's best
+# MATRIX_TOP candidates, n+1 = Saint Petersburg. Deeper candidates (long
+# tours) fall back to computing their legs on the fly. For other origins the
+# last node's legs are swapped for cached legs to that origin.
+MAGIC = b"TPTRV\x00\x00\x00"
+FORMAT_VERSION = 1
+MATRIX_TOP = 24
+
+Matrix = List[List[float]]
+MinutesMatrix = List[List[int]]
+ViewKey = Tuple[str, str, str]  # (mobility, budget_level, city)
+Legs = Tuple[List[float], List[int]]  # km and minutes from nodes 0..n to the origin, then 0 for itself
+
+
+@dataclass(frozen=True)
+class SpeedProfile:
+    name: str
+    road_kmh: float  # legs to and from the origin
+    city_kmh: float  # legs inside a city
+
+
+PROFILES: Dict[str, SpeedProfile] = {}
+
+
+def register_profile(profile: SpeedProfile) -> SpeedProfile:
+    PROFILES[profile.name] = profile
+    return profile
+
+
+# car matches the planner's original speeds
+register_profile(SpeedProfile("car", road_kmh=55.0, city_kmh=30.0))
+register_profile(SpeedProfile("train", road_kmh=45.0, city_kmh=20.0))  # suburban train, then bus or on foot
+register_profile(SpeedProfile("accessible", road_kmh=40.0, city_kmh=15.0))  # slower pace, extra stops
+
+
+def profile_digest(version: str, profile: SpeedProfile) -> bytes:
+    key = f"{version}:{profile.name}:{profile.road_kmh}:{profile.city_kmh}:{MATRIX_TOP}:{FORMAT_VERSION}"
+    return hashlib.sha256(key.encode()).digest()
+
+
+class CityMatrix:
+    __slots__ = ("n", "km", "minutes")
+
+    def __init__(self, n: int, km: Matrix, minutes: MinutesMatrix) -> None:
+        self.n = n  # candidates covered; node n + 1 is Saint Petersburg
+        self.km = km
+        self.minutes = minutes
+
+    def sub(self, picks: Sequence[int]) -> Tuple[Matrix, MinutesMatrix]:
+        """Matrices over center, the picked candidates (in order) and SPB."""
+        nodes = [0, *(i + 1 for i in picks), self.n + 1]
+        km, minutes = self.km, self.minutes
+        return [[km[a][b] for b in nodes] for a in nodes], [[minutes[a][b] for b in nodes] for a in nodes]
+
+    def sub_with_legs(self, picks: Sequence[int], legs: Legs) -> Tuple[Matrix, MinutesMatrix]:
+        """Like sub(), with the last node's legs taken from legs instead of SPB."""
+        nodes = [0, *(i + 1 for i in picks)]
+        last = self.n + 1
+        out = []
+        for full, leg in ((self.km, legs[0]), (self.minutes, legs[1])):
+            rows = [[full[a][b] for b in nodes] + [leg[a]] for a in nodes]
+            rows.append([leg[a] for a in nodes] + [leg[last]])
+            out.append(rows)
+        return out[0], out[1]
+
+
+def _minutes(km: Matrix, profile: SpeedProfile) -> MinutesMatrix:
+    # Legs touching the origin (last node) are road legs, the rest are inside the city
+    size = len(km)
+    flat_city = minutes_from_km_many([d for row in km for d in row], road_speed_kmh=profile.city_kmh)
+    flat_road = minutes_from_km_many(
+        [km[a][size - 1] for a in range(size)] + km[size - 1], road_speed_kmh=profile.road_kmh
+    )
+    minutes = [flat_city[a * size : (a + 1) * size] for a in range(size)]
+    for a in range(size):
+        minutes[a][size - 1] = flat_road[a]
+    minutes[size - 1] = flat_road[size:]
+    return minutes
+
+
+def build_city_matrix(
+    entry: "CityEntry", picks: Sequence[int], profile: SpeedProfile, end: Tuple[float, float] = SPB.coord
+) -> CityMatrix:
+    """Matrix over center, entry.candidates[i] for i in picks, and end."""
+    cands = [entry.candidates[i] for i in picks]
+    lats = [entry.center[0]] + [p.lat for p in cands] + [end[0]]
+    lons = [entry.center[1]] + [p.lon for p in cands] + [end[1]]
+    km = haversine_matrix_km(lats, lons, lats, lons)
+    if hasattr(km, "tolist"):
+        km = km.tolist()  # plain lists are faster for scalar lookups
+    return CityMatrix(len(cands), km, _minutes(km, profile))
+
+
+class TravelTable:
+    """Travel distances and minutes of one catalog version under one speed profile."""
+
+    def __init__(self, profile: SpeedProfile, cities: Dict[ViewKey, CityMatrix]) -> None:
+        self.profile = profile
+        self.cities = cities
+        # Per origin other than SPB: legs from each matrix's nodes to it, filled in on use
+        self._legs: LRU[Tuple[float, float], Dict[ViewKey, Legs]] = LRU(settings.origin_cache_size)
+
+    def day_matrix(self, view: "PlaceView", entry: "CityEntry", picks: Sequence[int]) -> Tuple[Matrix, MinutesMatrix]:
+        """km and minutes over center (0), picks (1..k) and the view's origin (k+1)."""
+        origin = view.origin
+        key = (view.mobility, view.budget_level, entry.city)
+        m = self.cities.get(key)
+        if m is not None and all(i < m.n for i in picks):
+            if origin.coord == SPB.coord:
+                return m.sub(picks)
+            legs = self._legs.get(origin.coord, dict)
+            leg = legs.get(key)
+            if leg is None:
+                leg = legs[key] = self._origin_legs(entry, m.n, origin)
+            return m.sub_with_legs(picks, leg)
+        m = build_city_matrix(entry, picks, self.profile, end=origin.coord)
+        return m.km, m.minutes
+
+    def _origin_legs(self, entry: "CityEntry", n: int, origin: Origin) -> Legs:
+        lats = [entry.center[0]] + [p.lat for p in entry.candidates[:n]]
+        lons = [entry.center[1]] + [p.lon for p in entry.candidates[:n]]
+        km = [float(row[0]) for row in haversine_matrix_km(lats, lons, [origin.lat], [origin.lon])] + [0.0]
+        return km, minutes_from_km_many(km, road_speed_kmh=self.profile.road_kmh)
+
+    @classmethod
+    def build(
+        cls, index: "PlannerIndex", profile: SpeedProfile, base: Optional[Tuple["PlannerIndex", "TravelTable"]] = None
+    ) -> "TravelTable":
+        """Matrices for every view and city; with base, cities whose entry is shared with base's index are copied."""
+        cities: Dict[ViewKey, CityMatrix] = {}
+        old_cities = base[1].cities if base is not None else {}
+        for (mobility, budget), view in index.views.items():
+            old = base[0].views.get((mobility, budget)) if base is not None else None
+            for city, entry in view.cities.items():
+                key = (mobility, budget, city)
+                m = old_cities.get(key) if old is not None and old.cities.get(city) is entry else None
+                if m is None:
+                    m = build_city_matrix(entry, range(min(MATRIX_TOP, len(entry.candidates))), profile)
+                cities[key] = m
+        return cls(profile, cities)
+
+    def save(self, path: Path, digest: bytes) -> None:
+        keys, km, minutes = [], array("d"), array("I")
+        for key, m in self.cities.items():
+            keys.append([*key, m.n])
+            for row in m.km:
+                km.extend(row)
+            for mins in m.minutes:
+                minutes.extend(mins)
+        sections = {"keys": array("B", json.dumps(keys, ensure_ascii=False).encode()), "km": km, "min": minutes}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_sections(path, sections, len(keys), 0, 0, digest, magic=MAGIC, version=FORMAT_VERSION)
+
+    @classmethod
+    def load(cls, path: Path, profile: SpeedProfile, digest: bytes) -> "TravelTable":
+        mm, header, sections = read_sections(path, magic=MAGIC, version=FORMAT_VERSION)
+        try:
+            if header[3] != digest:
+                raise ValueError(f"{path} was built for another catalog version or profile")
+            keys = json.loads(bytes(sections["keys"]))
+            km, minutes = sections["km"].tolist(), sections["min"].tolist()
+        finally:
+            for view in sections.values():
+                view.release()
+            mm.close()
+        cities: Dict[ViewKey, CityMatrix] = {}
+        off = 0
+        for mobility, budget, city, n in keys:
+            size = n + 2
+            cities[(mobility, budget, city)] = CityMatrix(
+                n,
+                [km[off + a * size : off + (a + 1) * size] for a in range(size)],
+                [minutes[off + a * size : off + (a + 1) * size] for a in range(size)],
+            )
+            off += size * size
+        return cls(profile, cities)
+
+
+class TravelTables:
+    """Per speed profile travel tables of one catalog snapshot.
+
+    Each table is built on first use and persisted under ``cache_dir``, so
+    other workers and restarts on the same catalog version just load it.
+    Tables built while ``previous`` (the tables of the catalog this one was
+    patched from) is set only compute the matrices of changed cities.
+    """
+
+    def __init__(
+        self, version: str, index: "PlannerIndex", cache_dir: Optional[Path], previous: Optional["TravelTables"] = None
+    ) -> None:
+        self.version = version
+        self.index = index
+        self.cache_dir = cache_dir
+        self.previous = previous
+        self._tables: Dict[str, TravelTable] = {}
+        self._lock = threading.Lock()
+
+    def profiles(self) -> List[str]:
+        """Names of the profiles whose table is loaded."""
+        return list(self._tables)
+
+    def path(self, profile: SpeedProfile) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"travel-{self.version}-{profile.name}.tpm"
+
+    def table(self, name: str) -> TravelTable:
+        table = self._tables.get(name)
+        if table is not None:
+            return table
+        profile = PROFILES.get(name)
+        if profile is None:
+            raise ValueError(f"unknown speed profile: {name}")
+        with self._lock:
+            table = self._tables.get(name)
+            if table is None:
+                table = self._tables[name] = self._load_or_build(profile)
+            return table
+
+    def _load_or_build(self, profile: SpeedProfile) -> TravelTable:
+        path = self.path(profile)
+        digest = profile_digest(self.version, profile)
+        if path is not None:
+            try:
+                private_dir(path.parent)
+            except OSError as e:
+                log.warning("travel matrices not persisted: %s", e)
+                path = None
+        if path is not None and path.exists():
+            try:
+                check_owner(path)
+                return TravelTable.load(path, profile, digest)
+            except (ValueError, KeyError, OSError) as e:
+                log.warning("rebuilding travel matrix: %s", e)
+        base = None
+        if self.previous is not None and profile.name in self.previous._tables:
+            base = (self.previous.index, self.previous._tables[profile.name])
+        table = TravelTable.build(self.index, profile, base)
+        if path is not None:
+            try:
+                table.save(path, digest)
+            except OSError as e:
+                log.warning("travel matrix not persisted: %s", e)
+        return table
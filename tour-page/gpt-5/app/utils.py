@@ -1,9 +1,17 @@
 from __future__ import annotations
 
 import math
-from typing import Dict, Literal
+from typing import Any, Dict, List, Literal, Sequence
+
+try:  # NumPy is optional; the scalar functions below are the reference implementation
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only in minimal installs
+    np = None  # type: ignore[assignment]
 
 Lang = Literal["ru", "en"]
+Precision = Literal["float64", "float32"]
+
+HAS_NUMPY = np is not None
 
 
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -24,6 +32,55 @@ def minutes_from_km(distance_km: float, road_speed_kmh: float = 55.0) -> int:
     return max(1, int(round(minutes)))
 
 
+def _haversine_np(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> Any:
+    # Same formula as haversine_km, broadcast over arrays
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return 6371.0 * c
+
+
+def haversine_km_many(
+    lat: float, lon: float, lats: Sequence[float], lons: Sequence[float], precision: Precision = "float64"
+) -> Any:
+    """One-to-many distances in km; an ndarray with NumPy, else a list."""
+    if np is None:
+        return [haversine_km(lat, lon, la, lo) for la, lo in zip(lats, lons)]
+    dt = np.dtype(precision)
+    return _haversine_np(dt.type(lat), dt.type(lon), np.asarray(lats, dtype=dt), np.asarray(lons, dtype=dt))
+
+
+def haversine_matrix_km(
+    lats1: Sequence[float],
+    lons1: Sequence[float],
+    lats2: Sequence[float],
+    lons2: Sequence[float],
+    precision: Precision = "float64",
+) -> Any:
+    """Many-to-many distance matrix in km, shape (len(lats1), len(lats2))."""
+    if np is None:
+        return [[haversine_km(a, b, c, d) for c, d in zip(lats2, lons2)] for a, b in zip(lats1, lons1)]
+    dt = np.dtype(precision)
+    la1 = np.asarray(lats1, dtype=dt)[:, None]
+    lo1 = np.asarray(lons1, dtype=dt)[:, None]
+    la2 = np.asarray(lats2, dtype=dt)[None, :]
+    lo2 = np.asarray(lons2, dtype=dt)[None, :]
+    return _haversine_np(la1, lo1, la2, lo2)
+
+
+def minutes_from_km_many(distances_km: Any, road_speed_kmh: float = 55.0) -> List[int]:
+    """Batched minutes_from_km for a vector of distances."""
+    if road_speed_kmh <= 0:
+        road_speed_kmh = 50.0
+    if np is None:
+        return [minutes_from_km(d, road_speed_kmh) for d in distances_km]
+    # np.rint rounds half to even, like round()
+    minutes = np.rint(np.asarray(distances_km, dtype=np.float64) / road_speed_kmh * 60.0)
+    return np.maximum(minutes, 1).astype(np.int64).tolist()
+
+
 def fmt_minutes(mins: int, lang: Lang = "ru") -> str:
     if lang == "ru":
         return f"{mins} мин"
@@ -33,8 +90,8 @@ def fmt_minutes(mins: int, lang: Lang = "ru") -> str:
 def translate(msg_key: str, lang: Lang = "ru") -> str:
     t: Dict[str, Dict[str, str]] = {
         "error_invalid_days": {
-            "ru": "Параметр days должен быть 1, 2 или 3.",
-            "en": "Parameter days must be 1, 2, or 3.",
+            "ru": "Параметр days должен быть от 1 до 31.",
+            "en": "Parameter days must be between 1 and 31.",
         },
         "error_invalid_budget": {
             "ru": "Параметр budget_level должен быть economy, standard или comfort.",
@@ -48,6 +105,42 @@ def translate(msg_key: str, lang: Lang = "ru") -> str:
             "ru": "Параметр lang должен быть ru или en.",
             "en": "Parameter lang must be ru or en.",
         },
+        "error_batch_too_large": {
+            "ru": "Слишком много запросов в одном пакете.",
+            "en": "Too many requests in one batch.",
+        },
+        "error_busy": {
+            "ru": "Сервис перегружен, попробуйте через несколько секунд.",
+            "en": "The service is busy, please retry in a few seconds.",
+        },
+        "error_timeout": {
+            "ru": "Генерация маршрута заняла слишком много времени.",
+            "en": "Generating the itinerary took too long.",
+        },
+        "error_edit_day": {
+            "ru": "В маршруте нет такого дня.",
+            "en": "The itinerary has no such day.",
+        },
+        "error_edit_place": {
+            "ru": "Это место нельзя использовать в этом дне.",
+            "en": "This place cannot be used on that day.",
+        },
+        "error_edit_last": {
+            "ru": "Нельзя удалить единственное место дня.",
+            "en": "The only place of a day cannot be removed.",
+        },
+        "error_plan_expired": {
+            "ru": "Каталог обновился, запросите маршрут заново.",
+            "en": "The catalog has changed, please request the itinerary again.",
+        },
+        "plan_shortened": {
+            "ru": "Маршрут сокращён до {planned} дн. из {requested}: подходящих мест в каталоге больше нет.",
+            "en": "The itinerary was shortened to {planned} of {requested} days: the catalog has no more suitable places.",
+        },
+        "plan_shortened_limits": {
+            "ru": "Маршрут сокращён до {planned} дн. из {requested}: остальные дни не укладываются в ограничения.",
+            "en": "The itinerary was shortened to {planned} of {requested} days: no more days fit within the limits.",
+        },
         "error_general": {
             "ru": "Произошла ошибка при генерации маршрута.",
             "en": "An error occurred while generating the itinerary.",
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+
+from . import bench_api, bench_ingest, bench_memory, bench_planner, bench_records
+from .compare import compare, format_rows, load
+from .harness import environment
+from .synth import write_catalog
+
+
+# python -m benchmarks run --sizes 10,1000,10000 --out bench.json --baseline baseline.json
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Planner and API benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="run benchmarks on synthetic catalogs")
+    p_run.add_argument("--sizes", default="10,1000,10000", help="comma-separated place counts (up to 1000000)")
+    p_run.add_argument("--cities", type=int, default=50)
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--min-time", type=float, default=0.5, help="seconds spent per benchmark")
+    p_run.add_argument("--nn-max", type=int, default=2000, help="cap for the long optimize_route input")
+    p_run.add_argument("--skip-api", action="store_true")
+    p_run.add_argument(
+        "--memory-workers", type=int, default=2, help="per-worker RSS with this many server workers, 0 skips"
+    )
+    p_run.add_argument("--workdir", type=Path, default=None, help="where synthetic catalogs are written")
+    p_run.add_argument("--out", type=Path, default=None)
+    p_run.add_argument("--baseline", type=Path, default=None)
+    p_run.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+
+    p_cmp = sub.add_parser("compare", help="compare two result files")
+    p_cmp.add_argument("current", type=Path)
+    p_cmp.add_argument("baseline", type=Path)
+    p_cmp.add_argument("--threshold", type=float, default=0.2)
+
+    p_syn = sub.add_parser("synth", help="write a synthetic places.json")
+    p_syn.add_argument("--places", type=int, required=True)
+    p_syn.add_argument("--cities", type=int, default=50)
+    p_syn.add_argument("--seed", type=int, default=42)
+    p_syn.add_argument("--out", type=Path, required=True)
+
+    args = parser.parse_args()
+
+    if args.cmd == "synth":
+        write_catalog(args.out, args.places, args.cities, args.seed)
+        return 0
+
+    if args.cmd == "compare":
+        rows, regressions = compare(load(args.current), load(args.baseline), args.threshold)
+        print(format_rows(rows, args.threshold))
+        return 1 if regressions else 0
+
+    report: Dict[str, Any] = {"meta": {**environment(), "cities": args.cities, "seed": args.seed}, "results": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or Path(tmp)
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            path = write_catalog(workdir / f"places-{size}.json", size, args.cities, args.seed)
+            print(f"n={size}: planner", file=sys.stderr)
+            report["results"].update(bench_planner.run(path, size, args.min_time, args.nn_max))
+            print(f"n={size}: place representation", file=sys.stderr)
+            report["results"].update(bench_records.run(path, size, args.min_time))
+            print(f"n={size}: ingestion", file=sys.stderr)
+            report["results"].update(bench_ingest.run(path, size, args.min_time))
+            if not args.skip_api:
+                print(f"n={size}: api", file=sys.stderr)
+                report["results"].update(bench_api.run(path, size, args.min_time))
+            if args.memory_workers > 0:
+                print(f"n={size}: memory", file=sys.stderr)
+                report["results"].update(bench_memory.run(path, size, args.memory_workers))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        rows, regressions = compare(report, load(args.baseline), args.threshold)
+        print(format_rows(rows, args.threshold), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from .harness import measure
+
+
+async def asgi_call(app: Any, method: str, path: str, body: bytes = b"") -> Tuple[int, bytes]:
+    """Drive one HTTP request through an ASGI app in process, without sockets."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    inbox: List[Dict[str, Any]] = [{"type": "http.request", "body": body, "more_body": False}]
+    status = 0
+    chunks: List[bytes] = []
+
+    async def receive() -> Dict[str, Any]:
+        return inbox.pop(0) if inbox else {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+def run(catalog_path: Path, size: int, min_time: float) -> Dict[str, Dict[str, Any]]:
+    """End-to-end /api/plan benchmarks through the FastAPI app, cold and cached."""
+    from app import main
+    from app.catalog import catalog
+
+    catalog.path = Path(catalog_path)
+    catalog.reload()
+    tag = f"[n={size}]"
+    body = json.dumps({"days": 3, "budget_level": "standard", "mobility": "strict", "lang": "ru", "seed": 7}).encode()
+    results: Dict[str, Dict[str, Any]] = {}
+    loop = asyncio.new_event_loop()
+
+    def call(method: str, path: str, payload: bytes = b"") -> None:
+        status, _ = loop.run_until_complete(asgi_call(main.app, method, path, payload))
+        if status != 200:
+            raise RuntimeError(f"{method} {path} returned {status}")
+
+    async def start() -> Any:
+        ctx = main.app.router.lifespan_context(main.app)
+        await ctx.__aenter__()
+        return ctx
+
+    ctx = loop.run_until_complete(start())
+    try:
+
+        def cold() -> None:
+            main.plan_cache.clear()
+            call("POST", "/api/plan", body)
+
+        results[f"api.plan_cold{tag}"] = measure(cold, min_time)
+        results[f"api.plan_cached{tag}"] = measure(lambda: call("POST", "/api/plan", body), min_time)
+        results[f"api.healthz{tag}"] = measure(lambda: call("GET", "/healthz"), min_time)
+    finally:
+        loop.run_until_complete(ctx.__aexit__(None, None, None))
+        loop.close()
+    return results
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+import shutil
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict
+
+from app.catalog import Catalog
+from app.ingest import ingest
+
+from .harness import measure
+
+CHANGE_EVERY = 100  # 1% of the places change
+
+
+def _write_update(catalog_path: Path, out: Path) -> None:
+    """The catalog as JSON lines, with every CHANGE_EVERY-th place's price raised."""
+    with open(out, "w", encoding="utf-8") as f:
+        for i, place in enumerate(json.loads(catalog_path.read_bytes())):
+            if i % CHANGE_EVERY == 0:
+                place["cost_rub"] += 100
+            f.write(json.dumps(place, ensure_ascii=False) + "\n")
+
+
+def run(catalog_path: Path, size: int, min_time: float) -> Dict[str, Dict[str, Any]]:
+    """python -m app ingest on a 1% update, and reloading the catalog after it: patched vs from scratch."""
+    tag = f"[changes=1%][n={size}]"
+    heavy = dict(min_time=min_time, max_runs=3 if size >= 100_000 else 50, min_runs=1 if size >= 100_000 else 3)
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = Path(tmp) / "places.json"
+        shutil.copyfile(catalog_path, catalog)
+        source = Path(tmp) / "update.jsonl"
+        _write_update(catalog, source)
+
+        results[f"ingest.diff{tag}"] = measure(lambda: ingest(source, catalog, dry_run=True), **heavy)
+        tracemalloc.start()
+        try:
+            ingest(source, catalog, dry_run=True)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        results[f"ingest.python_peak{tag}"] = {
+            "peak_mb": round(peak / 2**20, 2),
+            "source_mb": round(source.stat().st_size / 2**20, 2),
+        }
+
+        before = Catalog(catalog, check_interval=-1).snapshot()
+        ingest(source, catalog)
+        after = Catalog(catalog, check_interval=-1)
+        results[f"ingest.reload[mode=full]{tag}"] = measure(lambda: after.reload(), **heavy)
+        results[f"ingest.reload[mode=patch]{tag}"] = measure(lambda: after._load(before), **heavy)
+    return results
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+SMAPS = Path("/proc/self/smaps_rollup")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int) -> List[int]:
+    out = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            cmdline = (entry / "cmdline").read_bytes()
+        except OSError:
+            continue
+        # Field 4 is the parent pid; the name in field 2 may contain spaces
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid and b"resource_tracker" not in cmdline:
+            out.append(int(entry.name))
+    return out
+
+
+def _memory_mb(pid: int) -> Dict[str, float]:
+    """Rss, Pss and private (unshared) memory of one process, in MB."""
+    kb: Dict[str, int] = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        kb[key] = int(value.split()[0])
+    return {
+        "rss_mb": kb["Rss"] / 1024,
+        "pss_mb": kb["Pss"] / 1024,
+        "private_mb": (kb["Private_Clean"] + kb["Private_Dirty"]) / 1024,
+    }
+
+
+def _get(url: str, body: bytes = b"") -> None:
+    req = urllib.request.Request(url, data=body or None, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        resp.read()
+
+
+def measure_server(catalog_path: Path, workers: int, preload: bool, timeout: float = 120.0) -> Dict[str, Any]:
+    """Start `python -m app serve`, warm every worker with plans, average their memory."""
+    port = _free_port()
+    env = {
+        **os.environ,
+        "APP_CATALOG_PATH": str(catalog_path),
+        "APP_CATALOG_BINARY": "",
+        "APP_CATALOG_CHECK_SECONDS": "-1",
+        "APP_EXECUTION_MODE": "thread",
+    }
+    cmd = [sys.executable, "-m", "app", "serve", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    cmd.append("--preload" if preload else "--no-preload")
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"server did not start: {' '.join(cmd)}")
+            try:
+                _get(f"{base}/healthz")
+            except OSError:
+                time.sleep(0.2)
+                continue
+            if len(_children(proc.pid)) >= workers:
+                break
+            time.sleep(0.2)
+        body = b'{"days":3,"budget_level":"standard","mobility":"strict","lang":"ru","seed":7}'
+        # Connections land on arbitrary workers; keep planning until every worker's memory settles
+        previous: Dict[int, float] = {}
+        while time.monotonic() < deadline:
+            for i in range(workers * 8):
+                _get(f"{base}/api/plan", body.replace(b'"seed":7', b'"seed":%d' % i))
+            current = {pid: _memory_mb(pid)["rss_mb"] for pid in _children(proc.pid)}
+            if previous and all(abs(current[p] - previous.get(p, 0.0)) < 0.5 for p in current):
+                break
+            previous = current
+            time.sleep(0.5)
+        per_worker = [_memory_mb(pid) for pid in _children(proc.pid)]
+        parent = _memory_mb(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    avg = {k: round(sum(m[k] for m in per_worker) / len(per_worker), 2) for k in per_worker[0]}
+    return {"workers": len(per_worker), **avg, "parent_rss_mb": round(parent["rss_mb"], 2)}
+
+
+def run(catalog_path: Path, size: int, workers: int) -> Dict[str, Dict[str, Any]]:
+    """Per-worker memory of `workers` uvicorn workers, each loading the catalog vs one shared preload."""
+    if not SMAPS.exists():
+        print("memory benchmark skipped: needs /proc/<pid>/smaps_rollup (Linux)", file=sys.stderr)
+        return {}
+    tag = f"[n={size},workers={workers}]"
+    separate = measure_server(catalog_path, workers, preload=False)
+    shared = measure_server(catalog_path, workers, preload=True)
+    shared["private_saved_mb"] = round(separate["private_mb"] - shared["private_mb"], 2)
+    shared["pss_saved_mb"] = round(separate["pss_mb"] - shared["pss_mb"], 2)
+    print(
+        f"n={size}: per-worker private memory {separate['private_mb']:.1f} MB -> {shared['private_mb']:.1f} MB, "
+        f"PSS {separate['pss_mb']:.1f} MB -> {shared['pss_mb']:.1f} MB",
+        file=sys.stderr,
+    )
+    return {f"memory.worker_separate{tag}": separate, f"memory.worker_preload{tag}": shared}
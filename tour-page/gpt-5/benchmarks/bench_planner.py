@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict
+
+from app.catalog import Catalog, parse_places
+from app.compiled import CompiledCatalog, compile_catalog
+from app.indexes import CompiledPlannerIndex, PlannerIndex
+from app.planner import PlannerConfig, plan_itinerary, plan_schedule
+from app.routing import optimize_route
+from app.serialization import encode_itinerary
+from app.timing import StageTimer
+
+from .harness import measure
+
+
+def run(catalog_path: Path, size: int, min_time: float, nn_max: int) -> Dict[str, Dict[str, Any]]:
+    """Micro-benchmarks of the stages plan_itinerary runs, plus plan_itinerary end to end."""
+    tag = f"[n={size}]"
+    raw = Path(catalog_path).read_bytes()
+    results: Dict[str, Dict[str, Any]] = {}
+    # Expensive stages get a single timed run on large catalogs
+    heavy = dict(min_time=min_time, max_runs=3 if size >= 100_000 else 200, min_runs=1 if size >= 100_000 else 3)
+
+    # Catalog load: parsing and the per mobility x budget indexes
+    results[f"planner.load_places{tag}"] = measure(lambda: parse_places(raw), **heavy)
+    places = parse_places(raw)
+    results[f"planner.build_index{tag}"] = measure(lambda: PlannerIndex(places), **heavy)
+    compiled_path = compile_catalog(catalog_path, Path(catalog_path).with_suffix(".tpc"))
+    results[f"planner.open_compiled{tag}"] = measure(lambda: CompiledCatalog(compiled_path), min_time)
+    # The compiled snapshot's index, built from the mapped columns without materialising the places
+    results[f"planner.load_compiled{tag}"] = measure(
+        lambda: CompiledPlannerIndex(CompiledCatalog(compiled_path)), **heavy
+    )
+    snap = Catalog(catalog_path, check_interval=-1).snapshot()
+
+    # Allocation: which city and places each day gets
+    cfg = PlannerConfig(budget_level="standard", mobility="strict", seed=42, lang="ru")
+    global_cfg = PlannerConfig(budget_level="standard", mobility="strict", seed=42, lang="ru", allocator="global")
+    for days in (3, 7):
+        results[f"planner.plan_schedule[days={days}]{tag}"] = measure(lambda: plan_schedule(days, cfg, snap), min_time)
+        results[f"planner.plan_schedule_global[days={days}]{tag}"] = measure(
+            lambda: plan_schedule(days, global_cfg, snap), min_time
+        )
+
+    # Routing: a day's picks, and the places of the largest city (capped so small runs stay quick)
+    view = snap.index.view("strict", "standard")
+    top_city = view.cities[view.ranked[0][0]]
+    for label, picks in (("k", top_city.candidates[:8]), ("n", top_city.places[:nn_max])):
+        coords = [(p.lat, p.lon) for p in picks]
+        results[f"planner.optimize_route[{label}={len(coords)}]{tag}"] = measure(
+            lambda: optimize_route(coords, top_city.center, (59.9391, 30.3158), "local", 20.0, seed=1),
+            min_time,
+            max_runs=20 if len(coords) > 100 else 200,
+        )
+
+    # Rendering: the response body of a finished plan
+    itinerary = plan_itinerary(days=3, cfg=cfg, snapshot=snap)
+    results[f"planner.render[days=3]{tag}"] = measure(lambda: encode_itinerary(itinerary), min_time)
+
+    for days in (1, 3):
+        results[f"planner.plan_itinerary[days={days}]{tag}"] = measure(
+            lambda: plan_itinerary(days=days, cfg=cfg, snapshot=snap), min_time
+        )
+    # Instrumented variant; the difference is the stage timers' overhead
+    results[f"planner.plan_itinerary_timed[days=3]{tag}"] = measure(
+        lambda: plan_itinerary(days=3, cfg=cfg, snapshot=snap, timer=StageTimer()), min_time
+    )
+    return results
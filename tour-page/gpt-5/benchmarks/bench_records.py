@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import gc
+import tracemalloc
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from app.catalog import Catalog
+from app.indexes import PlannerIndex
+from app.planner import PlannerConfig, filter_accessible, filter_budget, plan_itinerary, plan_schedule
+from app.records import PLACES_ADAPTER, parse_records
+from app.travel import TravelTables
+
+from .harness import measure
+
+
+def _to_models(raw: bytes) -> List[Any]:
+    return PLACES_ADAPTER.validate_json(raw)
+
+
+def _retained(build: Callable[[], List[Any]]) -> Dict[str, Any]:
+    """Memory still held by build()'s result, per place; strings included."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        items = build()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    per_place = round(held / max(1, len(items)), 1)
+    return {"places": len(items), "bytes_per_place": per_place, "total_mb": round(held / 2**20, 2)}
+
+
+def run(catalog_path: Path, size: int, min_time: float) -> Dict[str, Dict[str, Any]]:
+    """Planner stages on pydantic Place models (the previous representation) vs PlaceRecord."""
+    tag = f"[n={size}]"
+    raw = Path(catalog_path).read_bytes()
+    heavy = dict(min_time=min_time, max_runs=3 if size >= 100_000 else 200, min_runs=1 if size >= 100_000 else 3)
+    results: Dict[str, Dict[str, Any]] = {}
+    loaders = {"model": _to_models, "record": parse_records}
+    snap = Catalog(catalog_path, check_interval=-1).snapshot()
+    cfg = PlannerConfig(budget_level="standard", mobility="strict", seed=42, lang="ru")
+    global_cfg = replace(cfg, allocator="global")
+
+    for name, load in loaders.items():
+        t = f"[repr={name}]{tag}"
+        results[f"records.place_memory{t}"] = _retained(lambda: load(raw))
+        results[f"records.load{t}"] = measure(lambda: load(raw), **heavy)
+        places = load(raw)
+        results[f"records.build_index{t}"] = measure(lambda: PlannerIndex(places), **heavy)
+        index = PlannerIndex(places)
+        usable = index.usable
+        results[f"records.filter{t}"] = measure(
+            lambda: filter_budget(filter_accessible(usable, "strict"), "standard"), **heavy
+        )
+        # Same catalog version and candidate order, so the travel tables are interchangeable
+        variant = replace(snap, places=places, index=index, travel=TravelTables(snap.version, index, None))
+        results[f"records.plan_itinerary[days=3]{t}"] = measure(lambda: plan_itinerary(3, cfg, variant), min_time)
+        results[f"records.plan_schedule_global[days=7]{t}"] = measure(
+            lambda: plan_schedule(7, global_cfg, variant), min_time
+        )
+
+    model = results[f"records.place_memory[repr=model]{tag}"]
+    record = results[f"records.place_memory[repr=record]{tag}"]
+    record["saved_bytes_per_place"] = round(model["bytes_per_place"] - record["bytes_per_place"], 1)
+    return results
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Metric gated when an entry does not list its own under "gate"
+DEFAULT_METRIC = "median_ms"
+
+
+def load(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def gated_metrics(entry: Dict[str, Any], default: str = DEFAULT_METRIC) -> List[str]:
+    """The metrics an entry is judged on: its own "gate" list (e.g. a load test's tail latency and error rate)."""
+    return list(entry.get("gate", [default]))
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, metric: str = DEFAULT_METRIC
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Rows for every gated metric of the benchmarks present in both reports, and the regressed subset.
+
+    A metric regresses when current/baseline exceeds 1 + threshold; any
+    value above a baseline of zero (e.g. errors where there were none) is a
+    regression too.
+    """
+    rows: List[Dict[str, Any]] = []
+    for name, cur in sorted(current.get("results", {}).items()):
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for key in gated_metrics(cur, metric):
+            if key not in cur or key not in base:
+                continue
+            if base[key]:
+                ratio = cur[key] / base[key]
+            else:
+                ratio = 1.0 if not cur[key] else math.inf
+            rows.append(
+                {
+                    "name": name,
+                    "metric": key,
+                    "baseline": base[key],
+                    "current": cur[key],
+                    "ratio": round(ratio, 3) if math.isfinite(ratio) else ratio,
+                }
+            )
+    regressions = [row for row in rows if row["ratio"] > 1.0 + threshold]
+    return rows, regressions
+
+
+def format_rows(rows: List[Dict[str, Any]], threshold: float) -> str:
+    lines = [f"{'benchmark':60} {'metric':>12} {'baseline':>12} {'current':>12} {'ratio':>7}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["ratio"] > 1.0 + threshold else ""
+        lines.append(
+            f"{row['name']:60} {row['metric']:>12} {row['baseline']:12.4f} {row['current']:12.4f}"
+            f" {row['ratio']:7.3f}{flag}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import gc
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.5, max_runs: int = 200, min_runs: int = 3) -> Dict[str, Any]:
+    """Run fn until min_time has passed (bounded by min/max runs); timings in ms."""
+    fn()  # warm-up
+    samples: List[float] = []
+    started = time.perf_counter()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while len(samples) < min_runs or (len(samples) < max_runs and time.perf_counter() - started < min_time):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000.0)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+    }
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        import numpy
+
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "numpy": numpy_version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
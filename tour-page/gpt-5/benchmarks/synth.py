@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+CATEGORIES = ["museum", "park", "nature", "fortress", "palace", "history", "art", "monastery", "relax"]
+INDOOR_CATEGORIES = {"museum", "palace", "art", "relax"}
+
+# Rough bounding box of Leningrad Oblast and its neighbours
+LAT_RANGE = (58.4, 61.6)
+LON_RANGE = (27.8, 35.7)
+
+
+def city_centers(cities: int, seed: int) -> List[Tuple[float, float]]:
+    r = random.Random(f"cities:{seed}")
+    return [(r.uniform(*LAT_RANGE), r.uniform(*LON_RANGE)) for _ in range(cities)]
+
+
+def iter_places(places: int, cities: int, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    """Deterministic synthetic places in the places.json schema.
+
+    City sizes are skewed (a few large cities, many small ones) and places are
+    scattered within ~5 km of their city center.
+    """
+    cities = max(1, min(cities, places)) if places else 1
+    centers = city_centers(cities, seed)
+    weights = [1.0 / (i + 1) for i in range(cities)]
+    r = random.Random(f"places:{seed}")
+    for i in range(places):
+        # Every city gets at least one place, the rest follow the skewed weights
+        c = i if i < cities else r.choices(range(cities), weights)[0]
+        c_lat, c_lon = centers[c]
+        cats = r.sample(CATEGORIES, r.randint(1, 2))
+        indoor = any(cat in INDOOR_CATEGORIES for cat in cats)
+        yield {
+            "id": f"p{i:07d}",
+            "name_ru": f"Место {i}",
+            "name_en": f"Place {i}",
+            "city_ru": f"Город {c}",
+            "city_en": f"City {c}",
+            "lat": round(c_lat + r.uniform(-0.045, 0.045), 6),
+            "lon": round(c_lon + r.uniform(-0.09, 0.09), 6),
+            "categories": cats,
+            "indoor": indoor,
+            "stairs_level": r.choices((0, 1, 2), (4, 4, 2))[0],
+            "avg_visit_minutes": r.choice((45, 60, 75, 90, 120)),
+            "cost_rub": r.choice((0, 200, 300, 400, 500, 700, 900, 1200, 1500, 2500)),
+            "notes_ru": None,
+            "notes_en": None,
+        }
+
+
+def write_catalog(path: Path, places: int, cities: int, seed: int = 42) -> Path:
+    # Streamed so 10^6 places never sit in memory as one list
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i, place in enumerate(iter_places(places, cities, seed)):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(place, ensure_ascii=False))
+        f.write("\n]\n")
+    return path
@@ -0,0 +1,5 @@
+import os
+
+# Settings are read when app.config is imported: keep test runs from persisting travel
+# matrices next to the bundled catalog
+os.environ.setdefault("APP_TRAVEL_CACHE_DIR", "")
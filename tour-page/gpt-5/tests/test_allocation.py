@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import json
+from itertools import combinations
+
+import pytest
+
+from app import allocation
+from app.allocation import MAX_CITIES, allocate, day_options
+from app.catalog import Catalog
+from app.planner import meals_cost, transport_cost_km
+from benchmarks.synth import iter_places
+
+
+@pytest.fixture(scope="module")
+def snap(tmp_path_factory):
+    path = tmp_path_factory.mktemp("catalog") / "places.json"
+    path.write_text(json.dumps(list(iter_places(40, 4, seed=6))), encoding="utf-8")
+    return Catalog(path, check_interval=-1).snapshot()
+
+
+def exhaustive(options, days, budget):
+    """Best objective over every set of at most days options with disjoint places and cost within budget."""
+    best = 0.0
+    for size in range(1, days + 1):
+        for combo in combinations(options, size):
+            if budget is not None and sum(o.cost_rub for o in combo) > budget:
+                continue
+            places = [(o.city, i) for o in combo for i in o.picks]
+            if len(places) != len(set(places)):
+                continue
+            best = max(best, sum(o.objective for o in combo))
+    return best
+
+
+@pytest.mark.parametrize("days", [1, 2, 3])
+@pytest.mark.parametrize("budget", [None, 6000, 2500])
+@pytest.mark.parametrize("day_minutes", [600, 480])
+def test_branch_and_bound_matches_exhaustive_search(snap, monkeypatch, days, budget, day_minutes):
+    # Few candidates per city, so every combination of day options can be enumerated
+    monkeypatch.setattr(allocation, "MAX_CANDIDATES", 5)
+    view = snap.index.view("normal", "standard")
+    travel = snap.travel.table("car")
+    meals = meals_cost("standard")
+    kwargs = dict(per_day=2, day_minutes=day_minutes, trip_budget_rub=budget, meals_rub=meals)
+    result = allocate(view, days, travel, transport_rub=transport_cost_km, budget_ms=10_000, **kwargs)
+    assert result.optimal
+
+    options = []
+    for city, _, _ in view.ranked[: max(MAX_CITIES, days)]:
+        entry = view.cities[city]
+        transport = transport_cost_km(entry.dist_origin_km) * 2
+        options.extend(day_options(view, entry, travel, 2, day_minutes, meals, transport))
+    assert result.objective == pytest.approx(exhaustive(options, days, budget))
+
+    # The plan itself is feasible
+    assert len(result.days) <= days
+    assert all(o.minutes <= day_minutes for o in result.days)
+    assert result.cost_rub == sum(o.cost_rub for o in result.days)
+    if budget is not None:
+        assert result.cost_rub <= budget
+    places = [(o.city, i) for o in result.days for i in o.picks]
+    assert len(places) == len(set(places))
+    assert result.objective == pytest.approx(sum(o.objective for o in result.days))
+
+
+def test_node_limit_keeps_a_feasible_plan(snap, monkeypatch):
+    monkeypatch.setattr(allocation, "MAX_NODES", 5)
+    view = snap.index.view("normal", "comfort")
+    result = allocate(
+        view,
+        3,
+        snap.travel.table("car"),
+        per_day=3,
+        day_minutes=600,
+        trip_budget_rub=None,
+        meals_rub=meals_cost("comfort"),
+        transport_rub=transport_cost_km,
+    )
+    assert not result.optimal
+    assert result.days  # the first descent is the greedy plan
+    places = [(o.city, i) for o in result.days for i in o.picks]
+    assert len(places) == len(set(places))
+
+
+def test_same_seed_same_allocation(snap):
+    view = snap.index.view("normal", "comfort")
+    runs = [
+        allocate(
+            view,
+            4,
+            snap.travel.table("car"),
+            per_day=3,
+            day_minutes=600,
+            trip_budget_rub=20_000,
+            meals_rub=meals_cost("comfort"),
+            transport_rub=transport_cost_km,
+            seed=9,
+        )
+        for _ in range(2)
+    ]
+    assert runs[0].days == runs[1].days
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import main
+from app.cache import CachedResponse, ResponseCache
+
+BODY = {"days": 2, "budget_level": "standard"}
+QUERY = {"days": "2", "budget_level": "standard"}
+
+
+def value(n: int) -> CachedResponse:
+    return CachedResponse(body=b"%d" % n, etag=f'W/"{n}"')
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResponseCache(8, 60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return value(1)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert results == [value(1)] * 5
+    assert len(calls) == 1
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 4, 0)
+    assert asyncio.run(cache.get_or_compute("k", compute)) == value(1)
+    assert (len(calls), cache.hits) == (1, 1)
+
+
+def test_cancelled_computation_is_taken_over():
+    cache = ResponseCache(8, 60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return value(len(calls))
+
+    async def scenario():
+        first = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await waiter
+
+    assert asyncio.run(scenario()) == value(2)
+    assert len(calls) == 2
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = ResponseCache(8, 60)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute("k", fail) for _ in range(3)), return_exceptions=True)
+
+    assert [type(e) for e in asyncio.run(scenario())] == [ValueError] * 3
+    assert cache.get("k") is None
+
+
+def test_entries_expire_and_are_evicted():
+    cache = ResponseCache(2, 0.05)
+    cache.put("a", value(1))
+    cache.put("b", value(2))
+    assert cache.get("a") == value(1)
+    cache.put("c", value(3))  # "b" is the least recently used
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+    ResponseCache(0, 60).put("a", value(1))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "plan_cache", ResponseCache(16, 60))
+    transport = httpx.ASGITransport(app=main.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_conditional_get_and_cache_control(client):
+    async def scenario():
+        async with client:
+            first = await client.get("/api/plan", params=QUERY)
+            again = await client.get("/api/plan", params=QUERY, headers={"If-None-Match": first.headers["ETag"]})
+            other = await client.get("/api/plan", params={**QUERY, "days": "3"})
+            posted = await client.post("/api/plan", json=BODY, headers={"If-None-Match": first.headers["ETag"]})
+            return first, again, other, posted
+
+    first, again, other, posted = asyncio.run(scenario())
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"].startswith("public, max-age=")
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert other.headers["ETag"] != first.headers["ETag"]
+    # POST answers the same plan, with the body, and shared caches must not keep it
+    assert posted.status_code == 200
+    assert posted.headers["ETag"] == first.headers["ETag"]
+    assert posted.content == first.content
+    assert posted.headers["Cache-Control"] == "no-store"
+    assert main.plan_cache.hits == 2
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import math
+
+from app.loadtest import GATED_METRICS, Recorder, summarize
+from benchmarks.compare import compare, format_rows
+
+
+def report(**results):
+    return {"results": results}
+
+
+def load_entry(median_ms, p99_ms, errors, requests=1000):
+    rec = Recorder(warmup_until=0.0)
+    rec.latencies = [median_ms] * (requests - errors - 10) + [p99_ms] * 10
+    rec.errors = errors
+    return summarize(rec, 10.0)
+
+
+def regressed(current, baseline, threshold=0.2):
+    return [(row["name"], row["metric"]) for row in compare(current, baseline, threshold)[1]]
+
+
+def test_plain_entries_gate_on_the_median():
+    baseline = report(a={"median_ms": 10.0, "p99_ms": 20.0}, b={"median_ms": 10.0})
+    current = report(a={"median_ms": 11.0, "p99_ms": 100.0}, b={"median_ms": 13.0}, new={"median_ms": 1.0})
+    rows, _ = compare(current, baseline, 0.2)
+    assert [(row["name"], row["metric"]) for row in rows] == [("a", "median_ms"), ("b", "median_ms")]
+    assert regressed(current, baseline) == [("b", "median_ms")]
+
+
+def test_load_tests_gate_on_tail_latency_and_errors():
+    baseline = report(load=load_entry(10.0, 50.0, 0))
+    assert baseline["results"]["load"]["gate"] == list(GATED_METRICS)
+    assert regressed(report(load=load_entry(10.0, 55.0, 0)), baseline) == []
+    # Same median, but the tail doubled
+    assert regressed(report(load=load_entry(10.0, 100.0, 0)), baseline) == [("load", "p99_ms")]
+    # Errors where the baseline had none
+    assert regressed(report(load=load_entry(10.0, 50.0, 3)), baseline) == [("load", "error_rate")]
+
+
+def test_error_rate_is_compared_as_a_ratio():
+    baseline = report(load=load_entry(10.0, 50.0, 10))
+    assert regressed(report(load=load_entry(10.0, 50.0, 11)), baseline) == []
+    assert regressed(report(load=load_entry(10.0, 50.0, 20)), baseline) == [("load", "error_rate")]
+    assert regressed(report(load=load_entry(10.0, 50.0, 0)), baseline) == []
+
+
+def test_format_marks_regressions():
+    rows, _ = compare(report(load=load_entry(10.0, 50.0, 3)), report(load=load_entry(10.0, 50.0, 0)), 0.2)
+    assert math.isinf(rows[-1]["ratio"])
+    lines = format_rows(rows, 0.2).splitlines()
+    assert [line.endswith("REGRESSION") for line in lines[1:]] == [False, False, True]
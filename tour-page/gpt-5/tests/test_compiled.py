@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import json
+import random
+import struct
+from typing import get_args
+
+import pytest
+
+from app.catalog import DATA_PATH, Catalog
+from app.compiled import _HEADER, _SECTION, CompiledCatalog, StaleCatalogError, compile_catalog
+from app.indexes import CompiledPlannerIndex, PlannerIndex
+from app.models import BudgetLevel, MobilityPref
+from app.planner import PlannerConfig, render_plan_json
+from app.records import parse_records
+from benchmarks.synth import iter_places
+
+SHAPES = [(m, b) for m in get_args(MobilityPref) for b in get_args(BudgetLevel)]
+
+
+def ids(places):
+    return [p.id for p in places]
+
+
+def untimed(body: bytes):
+    """A rendered plan without its solver timings."""
+
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k != "solver_ms"}
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+
+    return strip(json.loads(body))
+
+
+def section_offset(path, wanted: str) -> int:
+    raw = path.read_bytes()
+    n_sections = _HEADER.unpack_from(raw, 0)[-1]
+    for i in range(n_sections):
+        name, _, off, _ = _SECTION.unpack_from(raw, _HEADER.size + i * _SECTION.size)
+        if name.rstrip(b"\0").decode() == wanted:
+            return off
+    raise KeyError(wanted)
+
+
+@pytest.fixture(params=["bundled", "synthetic"])
+def catalogs(request, tmp_path):
+    """The same places as JSON and compiled."""
+    if request.param == "bundled":
+        raw = DATA_PATH.read_bytes()
+    else:
+        places = list(iter_places(1500, 12, seed=9))
+        places[3]["categories"] = ["note"]  # a placeholder the planner skips
+        raw = json.dumps(places).encode("utf-8")
+    json_path = tmp_path / "places.json"
+    json_path.write_bytes(raw)
+    return json_path, compile_catalog(json_path, tmp_path / "places.tpc")
+
+
+def test_rows_round_trip(catalogs):
+    json_path, tpc = catalogs
+    compiled = CompiledCatalog(tpc)
+    places = parse_records(json_path.read_bytes())
+    assert len(compiled) == len(places)
+    assert [compiled.place(i).as_dict() for i in range(len(compiled))] == [p.as_dict() for p in places]
+    assert [compiled.place(i).seq for i in range(len(compiled))] == [p.seq for p in places]
+    compiled.close()
+
+
+def test_compiled_views_match_json(catalogs):
+    json_path, tpc = catalogs
+    memory = PlannerIndex(parse_records(json_path.read_bytes()))
+    compiled = CompiledPlannerIndex(CompiledCatalog(tpc))
+    assert ids(compiled.usable) == ids(memory.usable)
+    for shape in SHAPES:
+        a, b = memory.views[shape], compiled.views[shape]
+        assert ids(b.places) == ids(a.places)
+        assert b.ranked == a.ranked
+        assert list(b.cities) == list(a.cities)
+        for city, entry in a.cities.items():
+            other = b.cities[city]
+            assert other.center == entry.center
+            assert ids(other.places) == ids(entry.places)
+            assert ids(other.candidates) == ids(entry.candidates)
+            assert ids(other.rainy) == ids(entry.rainy)
+            assert other.indoor == entry.indoor
+            assert ids(other.candidates[:3]) == ids(entry.candidates[:3])
+
+
+def test_compiled_proximity_matches_json(catalogs):
+    json_path, tpc = catalogs
+    memory = PlannerIndex(parse_records(json_path.read_bytes()))
+    compiled = CompiledPlannerIndex(CompiledCatalog(tpc))
+    r = random.Random(4)
+    for shape in SHAPES:
+        a, b = memory.views[shape], compiled.views[shape]
+        for city, entry in a.cities.items():
+            here = r.choice(list(entry.places))
+            for radius in (0.5, 10.0):
+                expected = [(d, p.id) for d, p in memory.within(a, city, here.lat, here.lon, radius)]
+                assert [(d, p.id) for d, p in compiled.within(b, city, here.lat, here.lon, radius)] == expected
+
+
+@pytest.mark.parametrize("options", [{}, {"allocator": "global"}, {"weather": ("rain", "mixed")}])
+def test_compiled_plans_match_json(catalogs, options):
+    json_path, tpc = catalogs
+    from_json = Catalog(json_path, check_interval=-1).snapshot()
+    from_compiled = Catalog(json_path, check_interval=-1, binary_path=tpc).snapshot()
+    assert from_compiled.source == "compiled"
+    assert from_compiled.version == from_json.version
+    for mobility, budget in SHAPES:
+        cfg = PlannerConfig(budget_level=budget, mobility=mobility, seed=7, lang="en", **options)
+        assert untimed(render_plan_json(5, cfg, from_compiled)) == untimed(render_plan_json(5, cfg, from_json))
+
+
+def test_truncated_file_is_refused(tmp_path):
+    json_path = tmp_path / "places.json"
+    json_path.write_bytes(DATA_PATH.read_bytes())
+    tpc = compile_catalog(json_path, tmp_path / "places.tpc")
+    whole = tpc.read_bytes()
+    for size in (0, 10, _HEADER.size + 5, len(whole) - 3):
+        tpc.write_bytes(whole[:size])
+        with pytest.raises(ValueError):
+            CompiledCatalog(tpc)
+        assert Catalog(json_path, check_interval=-1, binary_path=tpc).snapshot().source == "json"
+
+
+@pytest.mark.parametrize("section", ["s.city_ru", "cat.ref", "str.off"])
+def test_corrupt_references_are_refused(tmp_path, section):
+    json_path = tmp_path / "places.json"
+    json_path.write_bytes(DATA_PATH.read_bytes())
+    tpc = compile_catalog(json_path, tmp_path / "places.tpc")
+    raw = bytearray(tpc.read_bytes())
+    struct.pack_into("<I", raw, section_offset(tpc, section) + 4, 0xFFFFFF00)
+    tpc.write_bytes(bytes(raw))
+    with pytest.raises(ValueError):
+        CompiledCatalog(tpc)
+    assert Catalog(json_path, check_interval=-1, binary_path=tpc).snapshot().source == "json"
+
+
+def test_stale_file_is_detected(tmp_path):
+    json_path = tmp_path / "places.json"
+    json_path.write_bytes(DATA_PATH.read_bytes())
+    tpc = compile_catalog(json_path, tmp_path / "places.tpc")
+    compiled = CompiledCatalog(tpc)
+    compiled.check_fresh(json_path)
+    places = json.loads(json_path.read_bytes())
+    places[0]["cost_rub"] += 1
+    json_path.write_text(json.dumps(places), encoding="utf-8")
+    with pytest.raises(StaleCatalogError):
+        compiled.check_fresh(json_path)
+    compiled.close()
+    snap = Catalog(json_path, check_interval=-1, binary_path=tpc).snapshot()
+    assert snap.source == "json"
+    assert snap.places[0].cost_rub == places[0]["cost_rub"]
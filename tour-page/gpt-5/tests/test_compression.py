@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+
+import httpx
+import pytest
+
+from app import main
+from app.assets import AssetStore, build_static, pick_variant
+from app.compression import ENCODINGS, accepted_encodings, choose_encoding
+
+QUERY = {"days": 3, "budget_level": "comfort", "seed": 5, "lang": "en"}
+
+
+async def requests(*calls):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return [await client.request(method, url, **kwargs) for method, url, kwargs in calls]
+
+
+def raw_get(url, **headers):
+    # httpx decodes gzip by itself; the raw stream keeps the bytes as sent
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async with client.stream("GET", url, params=QUERY, headers=headers) as resp:
+                return resp, b"".join([chunk async for chunk in resp.aiter_raw()])
+
+    return asyncio.run(run())
+
+
+def test_accept_encoding_parsing():
+    assert accepted_encodings(None) == frozenset()
+    assert accepted_encodings("gzip, deflate;q=0.5") == {"gzip", "deflate"}
+    assert accepted_encodings("GZIP;q=0, br") == {"br"}
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("*") == ENCODINGS[0]
+    assert choose_encoding("gzip, br") == ENCODINGS[0]
+    assert choose_encoding("br", ("gzip",)) is None
+
+
+@pytest.mark.skipif(main.settings.compress_min_bytes <= 0, reason="compression disabled")
+def test_plan_is_compressed_as_another_representation():
+    plain, body = raw_get("/api/plan", **{"Accept-Encoding": "identity"})
+    packed, raw = raw_get("/api/plan", **{"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers
+    assert packed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in packed.headers["vary"]
+    assert int(packed.headers["content-length"]) == len(raw) < len(body)
+    assert gzip.decompress(raw) == body
+    # Weak: byte-for-byte the two differ, but they carry the same plan
+    assert packed.headers["etag"].startswith("W/")
+    assert packed.headers["etag"].removeprefix("W/") == plain.headers["etag"].removeprefix("W/")
+
+    revalidated, _ = raw_get("/api/plan", **{"Accept-Encoding": "gzip", "If-None-Match": packed.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+@pytest.mark.skipif(main.settings.compress_min_bytes <= 0, reason="compression disabled")
+def test_small_and_streamed_responses_pass_through():
+    gz = {"Accept-Encoding": "gzip"}
+    health, stream = asyncio.run(
+        requests(
+            ("GET", "/healthz", {"headers": gz}),
+            ("POST", "/api/plan/stream", {"json": QUERY, "headers": gz}),
+        )
+    )
+    assert health.json() == {"status": "ok"}
+    assert "content-encoding" not in health.headers
+    assert "content-encoding" not in stream.headers
+    assert json.loads(stream.text.splitlines()[-1])["event"] == "end"
+
+
+@pytest.fixture
+def built(tmp_path, monkeypatch):
+    build_static(out=tmp_path)
+    store = AssetStore(tmp_path)
+    monkeypatch.setattr(main, "assets", store)
+    return store
+
+
+def test_every_variant_has_its_own_etag(built):
+    name, asset = next((n, a) for n, a in built.assets.items() if n.endswith(".js"))
+    assert set(asset.variants) == {None, *ENCODINGS}
+    etags = {asset.etag_for(enc) for enc in asset.variants}
+    assert len(etags) == len(asset.variants)
+    assert pick_variant(asset, None) == (None, asset.variants[None])
+    assert pick_variant(asset, "gzip;q=0") == (None, asset.variants[None])
+    assert pick_variant(asset, "gzip") == ("gzip", asset.variants["gzip"])
+
+    identity_etag, gzip_etag = asset.etag_for(None), asset.etag_for("gzip")
+    plain, packed, fresh, stale = asyncio.run(
+        requests(
+            ("GET", f"/assets/{name}", {"headers": {"Accept-Encoding": "identity"}}),
+            ("GET", f"/assets/{name}", {"headers": {"Accept-Encoding": "gzip"}}),
+            ("GET", f"/assets/{name}", {"headers": {"Accept-Encoding": "gzip", "If-None-Match": gzip_etag}}),
+            # The identity validator does not revalidate the gzip variant
+            ("GET", f"/assets/{name}", {"headers": {"Accept-Encoding": "gzip", "If-None-Match": identity_etag}}),
+        )
+    )
+    assert plain.headers["etag"] == identity_etag
+    assert packed.headers["etag"] == gzip_etag
+    assert packed.headers["content-encoding"] == "gzip"
+    assert packed.content == plain.content  # decoded by the client
+    for resp in (plain, packed, fresh, stale):
+        assert resp.headers["vary"] == "Accept-Encoding"
+    assert fresh.status_code == 304
+    assert stale.status_code == 200
+    assert "immutable" in packed.headers["cache-control"]
+
+
+def test_index_points_at_hashed_assets(built):
+    (index,) = asyncio.run(requests(("GET", "/", {"headers": {"Accept-Encoding": "gzip"}})))
+    assert index.headers["cache-control"] == "no-cache"
+    assert index.headers["etag"] == built.index.etag_for("gzip")
+    for hashed in built.assets:
+        assert f"/assets/{hashed}" in index.text
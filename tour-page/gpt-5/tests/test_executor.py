@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from app import executor as executor_module
+from app import main
+from app.cache import ResponseCache
+from app.catalog import DATA_PATH, Catalog, catalog
+from app.executor import CatalogVersionMismatch, ExecutorSaturated, PinnedSnapshot, PlanExecutor
+from app.planner import PlannerConfig, render_plan_json
+
+BODY = {"days": 2, "budget_level": "standard"}
+
+
+async def post(body):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post("/api/plan", json=body)
+
+
+def snapshot_version(snap):
+    return snap.version
+
+
+def test_pinned_calls_catch_up_with_the_parent(monkeypatch, tmp_path):
+    path = tmp_path / "places.json"
+    path.write_bytes(DATA_PATH.read_bytes())
+    worker_catalog = Catalog(path, check_interval=-1)
+    monkeypatch.setattr(executor_module, "catalog", worker_catalog)
+    old = worker_catalog.snapshot().version
+    assert executor_module._call_pinned(snapshot_version, PinnedSnapshot(old)) == old
+
+    # The parent loaded a new places.json before this worker looked at it
+    places = json.loads(path.read_bytes())
+    places[0]["cost_rub"] += 1
+    path.write_text(json.dumps(places), encoding="utf-8")
+    new = Catalog(path, check_interval=-1).snapshot().version
+    assert new != old
+    assert executor_module._call_pinned(snapshot_version, PinnedSnapshot(new)) == new
+    assert worker_catalog.snapshot().version == new
+
+    # A version the worker cannot load is refused, not answered from another catalog
+    with pytest.raises(CatalogVersionMismatch):
+        executor_module._call_pinned(snapshot_version, PinnedSnapshot(old))
+
+
+def test_process_workers_plan_at_the_pinned_version():
+    snap = catalog.snapshot()
+    cfg = PlannerConfig(budget_level="standard", mobility="normal", seed=3, lang="en")
+    pool = PlanExecutor("process", 1, 0, 60)
+    try:
+        pinned = pool.pin(snap)
+        assert pinned == PinnedSnapshot(snap.version)
+        body = asyncio.run(pool.run(render_plan_json, 2, cfg, pinned, False))
+        assert [day["base_city_en"] for day in json.loads(body)["days"]] == [
+            day["base_city_en"] for day in json.loads(render_plan_json(2, cfg, snap))["days"]
+        ]
+        with pytest.raises(CatalogVersionMismatch):
+            asyncio.run(pool.run(render_plan_json, 2, cfg, PinnedSnapshot("0" * 16), False))
+    finally:
+        pool.shutdown()
+    assert PlanExecutor("thread", 1, 0, 60).pin(snap) is snap
+
+
+def test_mismatched_worker_is_a_503(monkeypatch):
+    def mismatch(*args):
+        raise CatalogVersionMismatch("worker has catalog b, the call needs a")
+
+    monkeypatch.setattr(main, "render_plan_json", mismatch)
+    monkeypatch.setattr(main, "render_plan_timed", mismatch)
+    monkeypatch.setattr(main, "executor", PlanExecutor("inline", 1, 0, 10))
+    monkeypatch.setattr(main, "plan_cache", ResponseCache(0, 0))
+    response = asyncio.run(post(BODY))
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_saturated_executor_refuses_at_once():
+    pool = PlanExecutor("thread", 1, 1, 10)
+    gate = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(pool.run(gate.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert pool.outstanding == 2
+        with pytest.raises(ExecutorSaturated):
+            await pool.run(gate.wait, 5)
+        gate.set()
+        return await asyncio.gather(*running)
+
+    try:
+        assert asyncio.run(scenario()) == [True, True]
+    finally:
+        pool.shutdown()
+    assert pool.outstanding == 0
+
+
+def test_timed_out_call_keeps_its_slot_until_it_ends():
+    pool = PlanExecutor("thread", 1, 0, 0.05)
+    release = threading.Event()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(pool.run(release.wait, 5))
+        # The worker is still busy: the slot is freed when the work ends, not when the caller gave up
+        assert pool.outstanding == 1
+        release.set()
+        deadline = time.monotonic() + 5
+        while pool.outstanding and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pool.outstanding == 0
+    finally:
+        pool.shutdown()
+
+
+def test_busy_and_slow_plans_map_to_503_and_504(monkeypatch):
+    monkeypatch.setattr(main, "plan_cache", ResponseCache(0, 0))
+    release = threading.Event()
+
+    def slow(*args):
+        release.wait(5)
+        return b"{}"
+
+    monkeypatch.setattr(main, "render_plan_json", slow)
+    monkeypatch.setattr(main, "render_plan_timed", lambda *args: (slow(), {}))
+    pool = PlanExecutor("thread", 1, 0, 0.1)
+    monkeypatch.setattr(main, "executor", pool)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.ensure_future(client.post("/api/plan", json=BODY))
+            await asyncio.sleep(0.05)
+            # Another request: an identical one would wait for the first instead (single-flight)
+            busy = await client.post("/api/plan", json={**BODY, "days": 3})
+            return busy, await first
+
+    try:
+        busy, slow_response = asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"]
+    assert slow_response.status_code == 504
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+
+import pytest
+
+from app.catalog import Catalog
+from app.ingest import changes_path, file_version, ingest, read_changes
+from app.store import PlaceStore
+from benchmarks.synth import iter_places
+
+
+def write_json(path, places):
+    path.write_text(json.dumps(places, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def write_csv(path, places):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(places[0]))
+        writer.writeheader()
+        for p in places:
+            writer.writerow({**p, "categories": ";".join(p["categories"]), "indoor": int(p["indoor"])})
+    return path
+
+
+def ids(path):
+    return [p["id"] for p in json.loads(path.read_bytes())]
+
+
+def views(snap):
+    """What the planner reads from an index: ranked cities and their candidate ids."""
+    out = {}
+    for key, view in snap.index.views.items():
+        cities = {city: [p.id for p in entry.candidates] for city, entry in view.cities.items()}
+        out[key] = ([city for city, _, _ in view.ranked], cities)
+    return out
+
+
+@pytest.fixture
+def places():
+    return list(iter_places(60, 4, seed=11))
+
+
+def test_repeated_ids_and_coordinates_are_deduplicated(tmp_path, places):
+    source = places[:10]
+    source.append({**places[3], "cost_rub": 1})  # repeated id: the later record wins
+    source.append({**places[5], "id": "twin"})  # same city and coordinates under another id
+    source.append({**places[6], "lat": "north"})  # invalid
+    catalog = tmp_path / "places.json"
+
+    stats = ingest(write_csv(tmp_path / "feed.csv", source), catalog)
+    assert (stats.records, stats.duplicate_ids, stats.duplicate_coords, stats.rejected) == (13, 1, 1, 1)
+    assert stats.errors[0].startswith("line 14: lat")
+    assert not catalog.exists()  # rejected records stop the update
+
+    stats = ingest(tmp_path / "feed.csv", catalog, skip_invalid=True)
+    assert stats.added == 10
+    loaded = json.loads(catalog.read_bytes())
+    assert [p["id"] for p in loaded] == [p["id"] for p in places[:10]]
+    assert loaded[3]["cost_rub"] == 1
+    assert loaded[2] == places[2]
+
+
+def test_diff_against_the_catalog(tmp_path, places):
+    catalog = write_json(tmp_path / "places.json", places[:20])
+    before = file_version(catalog)
+    source = places[1:20] + places[20:22]  # first removed, two added
+    source[4] = {**source[4], "avg_visit_minutes": 45}  # places[5] changed
+    feed = write_json(tmp_path / "feed.json", source)
+
+    out = io.BytesIO()
+    stats = ingest(feed, catalog, dry_run=True, diff_out=out)
+    assert (stats.added, stats.changed, stats.removed) == (2, 1, 1)
+    assert file_version(catalog) == before  # dry run
+    assert not changes_path(catalog).exists()
+    header, *lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert header["from"] == before
+    assert [(line["op"], line["id"]) for line in lines] == [
+        ("change", places[5]["id"]),
+        ("add", places[20]["id"]),
+        ("add", places[21]["id"]),
+        ("remove", places[0]["id"]),
+    ]
+
+    ingest(feed, catalog)
+    assert file_version(catalog) == header["to"]
+    assert changes_path(catalog).read_bytes() == out.getvalue()
+    # Catalog order, additions appended
+    assert ids(catalog) == [p["id"] for p in places[1:22]]
+    assert json.loads(catalog.read_bytes())[4]["avg_visit_minutes"] == 45
+
+    # Same source again: nothing to write
+    stats = ingest(feed, catalog)
+    assert (stats.added, stats.changed, stats.removed) == (0, 0, 0)
+    assert file_version(catalog) == header["to"]
+
+
+def test_partial_feed_keeps_missing_places(tmp_path, places):
+    catalog = write_json(tmp_path / "places.json", places[:20])
+    feed = tmp_path / "feed.jsonl"
+    feed.write_text(json.dumps({**places[7], "cost_rub": 5}) + "\n", encoding="utf-8")
+    stats = ingest(feed, catalog, keep_missing=True)
+    assert (stats.added, stats.changed, stats.removed) == (0, 1, 0)
+    assert ids(catalog) == [p["id"] for p in places[:20]]
+
+
+def test_changes_are_read_only_between_their_versions(tmp_path, places):
+    catalog = write_json(tmp_path / "places.json", places[:20])
+    before = file_version(catalog)
+    ingest(write_json(tmp_path / "feed.json", places[:19] + places[30:31]), catalog)
+    after = file_version(catalog)
+    changes = read_changes(changes_path(catalog), before, after)
+    assert changes.removed == {places[19]["id"]}
+    assert [p.id for p in changes.added] == [places[30]["id"]]
+    assert read_changes(changes_path(catalog), after, before) is None
+    assert read_changes(tmp_path / "missing.jsonl", before, after) is None
+
+
+def test_patched_snapshot_matches_a_full_load(tmp_path, places, caplog):
+    catalog = write_json(tmp_path / "places.json", places[:40])
+    watched = Catalog(catalog, check_interval=0)
+    old = watched.snapshot()
+
+    source = [p for p in places[:40] if p["id"] != places[8]["id"]] + places[40:43]
+    source[0] = {**source[0], "lat": source[0]["lat"] + 0.01}
+    source[12] = {**source[12], "city_ru": places[30]["city_ru"], "city_en": places[30]["city_en"]}  # moves city
+    ingest(write_json(tmp_path / "feed.json", source), catalog)
+
+    with caplog.at_level(logging.INFO, logger="app.catalog"):
+        patched = watched.snapshot()
+    assert "catalog patched: 3 added, 2 changed, 1 removed" in caplog.text
+    assert patched.version == file_version(catalog) != old.version
+    full = Catalog(catalog, check_interval=-1).snapshot()
+    assert [p.id for p in patched.places] == [p.id for p in full.places]
+    assert [p.as_dict() for p in patched.places] == [p.as_dict() for p in full.places]
+    assert views(patched) == views(full)
+
+
+def test_sqlite_catalog_gets_the_same_rows(tmp_path, places):
+    db = tmp_path / "places.db"
+    ingest(write_json(tmp_path / "first.json", places[:20]), db)
+    first = PlaceStore(db).version
+    source = places[2:20] + places[25:27]
+    source[0] = {**source[0], "cost_rub": 0}
+    stats = ingest(write_json(tmp_path / "second.json", source), db)
+    assert (stats.added, stats.changed, stats.removed) == (2, 1, 2)
+
+    store = PlaceStore(db)
+    assert store.version != first
+    rows = {p.id: p.as_dict() for p in store.iter_places(("1", ()), "seq")}
+    assert sorted(rows) == sorted(p["id"] for p in source)
+    assert rows[source[0]["id"]]["cost_rub"] == 0
+    header = json.loads(changes_path(db).read_text(encoding="utf-8").splitlines()[0])
+    assert (header["from"], header["to"]) == (first, store.version)
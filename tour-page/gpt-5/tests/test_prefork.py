@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import signal
+import time
+import urllib.request
+
+import pytest
+
+from app.catalog import DATA_PATH, content_version
+from app.loadtest import _free_port, spawn_server
+from benchmarks.bench_memory import _children
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork") or not os.path.isdir("/proc"), reason="needs fork and /proc")
+
+
+def served_versions(port: int, tries: int = 8) -> set:
+    """Catalog versions reported by whichever workers answer tries requests."""
+    seen = set()
+    for _ in range(tries):
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as resp:
+            text = resp.read().decode()
+        seen.update(re.findall(r'tourplanner_catalog_places\{version="([0-9a-f]+)"', text))
+    return seen
+
+
+def wait_for(check, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = check()
+        if value:
+            return value
+        time.sleep(0.2)
+    raise AssertionError("timed out")
+
+
+def workers(proc) -> set:
+    return set(_children(proc.pid))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    path = tmp_path / "places.json"
+    path.write_bytes(DATA_PATH.read_bytes())
+    monkeypatch.setenv("APP_CATALOG_PATH", str(path))
+    monkeypatch.setenv("APP_CATALOG_BINARY", "")
+    monkeypatch.setenv("APP_CATALOG_CHECK_SECONDS", "0.2")
+    monkeypatch.setenv("APP_ADMIN_TOKEN", "secret")
+    monkeypatch.setenv("APP_METRICS", "1")
+    port = _free_port()
+    proc = spawn_server(port, 2, "thread")
+    try:
+        yield proc, port, path
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=45)
+        except Exception:
+            proc.kill()
+
+
+def test_workers_swap_to_a_new_generation(server):
+    proc, port, path = server
+    old = wait_for(lambda: len(workers(proc)) == 2 and workers(proc))
+    assert served_versions(port) == {content_version(path.read_bytes())}
+
+    places = json.loads(path.read_bytes())
+    places[0]["cost_rub"] += 1
+    path.write_text(json.dumps(places, ensure_ascii=False), encoding="utf-8")
+    new_version = content_version(path.read_bytes())
+    # The supervisor notices the change, forks new workers from it and retires the old ones
+    new = wait_for(lambda: (w := workers(proc)) and not (w & old) and len(w) == 2 and w)
+    assert wait_for(lambda: served_versions(port) == {new_version})
+
+    # A crashed worker is replaced from the current generation
+    victim = next(iter(new))
+    os.kill(victim, signal.SIGKILL)
+    replaced = wait_for(lambda: (w := workers(proc)) and victim not in w and len(w) == 2 and w)
+    assert len(replaced & new) == 1
+    assert served_versions(port) == {new_version}
+
+
+def test_admin_reload_goes_through_the_supervisor(server):
+    proc, port, path = server
+    old = wait_for(lambda: len(workers(proc)) == 2 and workers(proc))
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}/admin/catalog/reload", method="POST", headers={"X-Admin-Token": "secret"}
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        assert resp.status == 202
+        assert json.loads(resp.read())["scheduled"] is True
+    # Same content: nothing to swap
+    time.sleep(1.0)
+    assert workers(proc) == old
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import httpx
+
+from app import main
+from app.config import settings
+from app.executor import PlanExecutor
+from app.profiling import ProfileStore, profile_call
+
+BODY = {"days": 2, "budget_level": "standard"}
+
+
+def test_overlapping_calls_share_the_profiler():
+    barrier = threading.Barrier(2, timeout=5)
+    results = []
+
+    def work(n):
+        barrier.wait()  # both calls are inside their profiler at once
+        return sum(range(n))
+
+    def call():
+        results.append(profile_call("pstats", work, 1000))
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(fmt for _, fmt, _ in results) == ["collapsed", "pstats"]
+    assert all(result == sum(range(1000)) for result, _, _ in results)
+
+
+def test_concurrent_profiled_requests(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "profile_enabled", True)
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    monkeypatch.setattr(main, "profiles", ProfileStore(str(tmp_path / "profiles"), 10))
+    executor = PlanExecutor("thread", 2, 0, 10)
+    monkeypatch.setattr(main, "executor", executor)
+    barrier = threading.Barrier(2, timeout=5)
+    render = main.render_plan_json
+
+    def render_together(*args):
+        barrier.wait()
+        return render(*args)
+
+    monkeypatch.setattr(main, "render_plan_json", render_together)
+
+    async def both():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"X-Profile": "pstats", "X-Admin-Token": "secret"}
+            return await asyncio.gather(*(client.post("/api/plan", json=BODY, headers=headers) for _ in range(2)))
+
+    try:
+        responses = asyncio.run(both())
+    finally:
+        executor.shutdown()
+    assert [r.status_code for r in responses] == [200, 200]
+    names = sorted(r.headers["X-Profile-Id"] for r in responses)
+    assert sorted(p["name"] for p in main.profiles.list()) == names
+    assert sorted(p["format"] for p in main.profiles.list()) == ["collapsed", "pstats"]
+
+
+def test_only_the_newest_profiles_are_kept(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles"), 3)
+    # Many saves within the same millisecond: the counter alone orders them
+    names = [store.save("collapsed", f"main {n}\n".encode(), {"n": n}) for n in range(12)]
+    kept = store.list()
+    assert [p["name"] for p in kept] == names[:-4:-1]
+    assert [p["n"] for p in kept] == [11, 10, 9]
+    assert sorted(p.name for p in (tmp_path / "profiles").iterdir()) == sorted(
+        [*names[-3:], *(n + ".json" for n in names[-3:])]
+    )
+    assert store.path(names[0]) is None
+    assert store.path(names[-1]).read_bytes() == b"main 11\n"
+
+    # Another worker sharing the directory prunes to the same bound
+    other = ProfileStore(str(tmp_path / "profiles"), 3)
+    time.sleep(0.002)
+    newest = other.save("pstats", b"data", {})
+    assert [p["name"] for p in store.list()] == [newest, *names[:-3:-1]]
+
+
+def test_pruned_profiles_are_not_served(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    monkeypatch.setattr(main, "profiles", ProfileStore(str(tmp_path / "profiles"), 1))
+    first = main.profiles.save("collapsed", b"a 1\n", {})
+    second = main.profiles.save("collapsed", b"b 1\n", {})
+
+    async def get(path):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers={"X-Admin-Token": "secret"})
+
+    assert asyncio.run(get(f"/admin/profiles/{first}")).status_code == 404
+    served = asyncio.run(get(f"/admin/profiles/{second}"))
+    assert served.status_code == 200
+    assert served.content == b"b 1\n"
+    assert [p["name"] for p in asyncio.run(get("/admin/profiles")).json()["profiles"]] == [second]
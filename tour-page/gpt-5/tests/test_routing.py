@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import itertools
+import random
+
+import pytest
+
+from app.routing import (
+    OPTIMIZERS,
+    _Deadline,
+    _or_opt_pass,
+    _two_opt_pass,
+    greedy_path,
+    optimize_route,
+    path_km,
+)
+from app.utils import haversine_matrix_km
+
+
+def regional(r: random.Random, n: int):
+    return [(r.uniform(59.0, 61.0), r.uniform(28.0, 32.0)) for _ in range(n)]
+
+
+def matrix(points, start, end):
+    lats = [start[0]] + [p[0] for p in points] + [end[0]]
+    lons = [start[1]] + [p[1] for p in points] + [end[1]]
+    dist = haversine_matrix_km(lats, lons, lats, lons)
+    return dist.tolist() if hasattr(dist, "tolist") else dist
+
+
+def best_km(dist, n: int) -> float:
+    return min(path_km([0, *perm, n + 1], dist) for perm in itertools.permutations(range(1, n + 1)))
+
+
+@pytest.mark.parametrize("optimizer", sorted(OPTIMIZERS))
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 5, 8, 40])
+def test_never_longer_than_the_greedy_tour(optimizer, n):
+    for seed in range(5):
+        r = random.Random(seed * 100 + n)
+        points = regional(r, n)
+        start, end = regional(r, 2)
+        for stop in (end, None):
+            route = optimize_route(points, start, stop, optimizer, budget_ms=1000, seed=seed)
+            assert sorted(route.order) == list(range(n))
+            assert route.length_km <= route.nearest_km + 1e-9
+            dist = matrix(points, start, stop or start)
+            if stop is None:
+                for row in dist:
+                    row[n + 1] = 0.0
+            assert route.length_km == pytest.approx(path_km([0, *(i + 1 for i in route.order), n + 1], dist))
+
+
+def test_every_move_shortens_the_path():
+    r = random.Random(8)
+    for _ in range(20):
+        points = regional(r, 12)
+        start, end = regional(r, 2)
+        dist = matrix(points, start, end)
+        path = greedy_path(dist, len(points))
+        deadline = _Deadline(1000)
+        length = path_km(path, dist)
+        while _two_opt_pass(path, dist, r, deadline) or _or_opt_pass(path, dist, r, deadline):
+            shorter = path_km(path, dist)
+            assert shorter < length
+            length = shorter
+        assert sorted(path) == list(range(len(points) + 2))
+        assert (path[0], path[-1]) == (0, len(points) + 1)
+
+
+@pytest.mark.parametrize("n", [3, 5, 7])
+def test_local_search_is_close_to_optimal_on_small_routes(n):
+    r = random.Random(n)
+    worst = 1.0
+    for seed in range(10):
+        points = regional(r, n)
+        start, end = regional(r, 2)
+        route = optimize_route(points, start, end, "local", budget_ms=1000, seed=seed)
+        optimum = best_km(matrix(points, start, end), n)
+        assert route.length_km >= optimum - 1e-9
+        worst = max(worst, route.length_km / optimum)
+    # 2-opt + Or-opt local optima are within a few percent here
+    assert worst < 1.1
+
+
+def test_same_seed_same_route():
+    r = random.Random(4)
+    points = regional(r, 60)
+    runs = [optimize_route(points, points[0], points[-1], "local", budget_ms=5000, seed=3) for _ in range(2)]
+    assert not runs[0].truncated
+    assert runs[0].order == runs[1].order
+
+
+def test_unknown_optimizer():
+    with pytest.raises(ValueError):
+        optimize_route([(60.0, 30.0)], (60.0, 30.0), optimizer="genetic")
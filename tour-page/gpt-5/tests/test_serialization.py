@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app import main, serialization
+from app.config import settings
+from app.planner import PlannerConfig, plan_itinerary
+from app.serialization import decode_plan_request, encode_itinerary
+
+BODY = {"days": 2, "budget_level": "standard", "lang": "ru"}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_compact_plans_are_the_same_with_either_encoder(encoder):
+    itinerary = plan_itinerary(2, PlannerConfig(budget_level="standard", mobility="normal", seed=1, lang="ru"))
+    full = json.loads(encode_itinerary(itinerary))
+    body = encode_itinerary(itinerary, compact=True)
+    assert json.loads(body) == serialization.localize(full, "ru")
+    # Compact UTF-8, not \u escapes
+    assert b"\\u" not in body
+    assert full["days"][0]["base_city_ru"].encode("utf-8") in body
+
+
+def test_encoders_write_the_same_bytes(monkeypatch):
+    if serialization.orjson is None:
+        pytest.skip("orjson is not installed")
+    itinerary = plan_itinerary(3, PlannerConfig(budget_level="comfort", mobility="normal", seed=2, lang="en"))
+    fast = encode_itinerary(itinerary, compact=True)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert encode_itinerary(itinerary, compact=True) == fast
+
+
+def test_loads_matches_json(encoder):
+    raw = json.dumps({"city": "Выборг", "n": [1, 2.5, None, True]}, ensure_ascii=False).encode("utf-8")
+    assert serialization.loads(raw) == json.loads(raw)
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_request_paths_agree(encoder, monkeypatch, fast):
+    monkeypatch.setattr(settings, "fast_json", fast)
+    raw = json.dumps(BODY).encode()
+    assert main.decode_plan_request(raw) == decode_plan_request(raw)
+    with pytest.raises(main.RequestError) as e:
+        main.decode_plan_request(json.dumps({**BODY, "days": 0}).encode())
+    assert e.value.status_code == 400
+    with pytest.raises(main.RequestError):
+        main.decode_plan_request(b"{not json")
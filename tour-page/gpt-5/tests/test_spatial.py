@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+import random
+from typing import List, Tuple
+
+import pytest
+
+from app.indexes import PlannerIndex
+from app.records import parse_records
+from app.routing import SPATIAL_MIN_POINTS, greedy_path, optimize_route
+from app.spatial import SpatialIndex
+from app.utils import haversine_km, haversine_matrix_km
+from benchmarks.synth import iter_places
+
+Coord = Tuple[float, float]
+
+
+def brute_force(points: List[Coord], lat: float, lon: float) -> List[Tuple[float, int]]:
+    return sorted((haversine_km(lat, lon, p_lat, p_lon), i) for i, (p_lat, p_lon) in enumerate(points))
+
+
+def random_points(r: random.Random, n: int) -> List[Coord]:
+    return [(r.uniform(-90, 90), r.uniform(-180, 180)) for _ in range(n)]
+
+
+def antimeridian_points(r: random.Random, n: int) -> List[Coord]:
+    return [(r.uniform(-60, 60), r.choice((-1, 1)) * r.uniform(178, 180)) for _ in range(n)]
+
+
+def polar_points(r: random.Random, n: int) -> List[Coord]:
+    return [(r.choice((-1, 1)) * r.uniform(88, 90), r.uniform(-180, 180)) for _ in range(n)]
+
+
+def duplicate_points(r: random.Random, n: int) -> List[Coord]:
+    spots = [(59.9391, 30.3158), (60.7076, 28.7528), (59.7163, 30.3945)]
+    return [r.choice(spots) for _ in range(n)]
+
+
+def regional_points(r: random.Random, n: int) -> List[Coord]:
+    # North-west Russia, the planner's own scale
+    return [(r.uniform(57.5, 61.5), r.uniform(27.5, 36.0)) for _ in range(n)]
+
+
+CASES = [random_points, antimeridian_points, polar_points, duplicate_points, regional_points]
+
+
+def queries(r: random.Random, points: List[Coord]) -> List[Coord]:
+    # Random spots, the points themselves, and the awkward corners of the sphere
+    return [
+        *random_points(r, 10),
+        *r.sample(points, min(5, len(points))),
+        (90.0, 0.0),
+        (-90.0, 0.0),
+        (0.0, 180.0),
+        (0.0, -180.0),
+        (45.0, 179.999),
+    ]
+
+
+@pytest.mark.parametrize("make", CASES)
+@pytest.mark.parametrize("n", [1, 9, 200])
+def test_knn_matches_brute_force(make, n):
+    r = random.Random(n)
+    points = make(r, n)
+    index = SpatialIndex(points)
+    for lat, lon in queries(r, points):
+        expected = brute_force(points, lat, lon)
+        for k in (1, 5, n + 3):
+            assert index.knn(lat, lon, k) == expected[:k]
+
+
+@pytest.mark.parametrize("make", CASES)
+def test_pop_nearest_matches_brute_force(make):
+    r = random.Random(7)
+    points = make(r, 150)
+    visitor = SpatialIndex(points).visitor()
+    remaining = set(range(len(points)))
+    lat, lon = r.uniform(-90, 90), r.uniform(-180, 180)
+    while remaining:
+        expected = min((haversine_km(lat, lon, *points[i]), i) for i in remaining)
+        assert visitor.pop_nearest(lat, lon) == expected
+        remaining.discard(expected[1])
+        lat, lon = points[expected[1]]
+    assert visitor.pop_nearest(lat, lon) is None
+
+
+@pytest.mark.parametrize("make", CASES)
+@pytest.mark.parametrize("n", [1, 9, 200])
+def test_within_matches_brute_force(make, n):
+    r = random.Random(n)
+    points = make(r, n)
+    index = SpatialIndex(points)
+    for lat, lon in queries(r, points):
+        expected = brute_force(points, lat, lon)
+        for radius in (0.0, 1.0, 30.0, 400.0, 3000.0, 20_100.0):
+            assert index.within(lat, lon, radius) == [h for h in expected if h[0] <= radius]
+
+
+def test_empty_index():
+    index = SpatialIndex([])
+    assert index.knn(0.0, 0.0, 3) == []
+    assert index.within(0.0, 0.0, 100.0) == []
+    assert index.visitor().pop_nearest(0.0, 0.0) is None
+
+
+@pytest.mark.parametrize("make", CASES)
+def test_route_seed_matches_greedy_path(make):
+    r = random.Random(3)
+    points = make(r, SPATIAL_MIN_POINTS * 3)
+    start, end = points[0], points[-1]
+    lats = [start[0]] + [p[0] for p in points] + [end[0]]
+    lons = [start[1]] + [p[1] for p in points] + [end[1]]
+    dist = haversine_matrix_km(lats, lons, lats, lons)
+    dist = dist.tolist() if hasattr(dist, "tolist") else dist
+    route = optimize_route(points, start, end, optimizer="nearest", dist=dist)
+    assert [0, *(i + 1 for i in route.order), len(points) + 1] == greedy_path(dist, len(points))
+
+
+def test_long_route_improves_on_greedy():
+    r = random.Random(5)
+    points = regional_points(r, 300)
+    route = optimize_route(points, points[0], optimizer="local", budget_ms=10_000)
+    assert sorted(route.order) == list(range(len(points)))
+    assert route.length_km < route.nearest_km
+
+
+def test_nearest_unvisited_matches_brute_force():
+    r = random.Random(11)
+    raw = json.dumps(list(iter_places(800, 4, seed=3))).encode("utf-8")
+    index = PlannerIndex(parse_records(raw))
+    view = index.view("normal", "comfort")
+    for city, entry in view.cities.items():
+        places = list(entry.places)
+        for _ in range(20):
+            here = r.choice(places)
+            visited = {p.id for p in r.sample(places, r.randrange(len(places)))}
+            unvisited = [p for p in places if p.id not in visited]
+            expected = min(unvisited, key=lambda p: (haversine_km(here.lat, here.lon, p.lat, p.lon), p.seq))
+            assert index.nearest_unvisited(view, city, here.lat, here.lon, visited) is expected
+            # The k-d tree answers like a linear scan
+            for radius in (0.5, 3.0):
+                hits = [(haversine_km(here.lat, here.lon, p.lat, p.lon), p) for p in places]
+                expected = sorted(((d, p) for d, p in hits if d <= radius), key=lambda h: (h[0], h[1].seq))
+                assert index.within(view, city, here.lat, here.lon, radius) == expected
+        assert index.nearest_unvisited(view, city, 60.0, 30.0, {p.id for p in places}) is None
+
+
+def test_nearby_edit_swaps_in_the_closest_unused_place(tmp_path):
+    from app.catalog import Catalog
+    from app.models import PlanEdit
+    from app.planner import PlannerConfig, plan_itinerary, replan_day
+
+    path = tmp_path / "places.json"
+    path.write_text(json.dumps(list(iter_places(300, 3, seed=5))), encoding="utf-8")
+    snap = Catalog(path, check_interval=-1).snapshot()
+    cfg = PlannerConfig(budget_level="comfort", mobility="normal", seed=1, lang="en")
+    itinerary = plan_itinerary(4, cfg, snap)
+    visits = [item.place_id for item in itinerary.days[0].items if item.kind == "visit"]
+    used = {item.place_id for day in itinerary.days for item in day.items if item.kind == "visit"}
+    edited = replan_day(itinerary, PlanEdit(day=1, action="nearby", place_id=visits[0]), cfg, snap)
+    places = list(snap.index.view("normal", "comfort").cities[itinerary.days[0].base_city_ru].places)
+    here = next(p for p in places if p.id == visits[0])
+    unused = [p for p in places if p.id not in used]
+    nearest = min(unused, key=lambda p: (haversine_km(here.lat, here.lon, p.lat, p.lon), p.seq))
+    new_visits = {item.place_id for item in edited.days[0].items if item.kind == "visit"}
+    assert new_visits == set(visits[1:]) | {nearest.id}
+    assert edited.days[1:] == itinerary.days[1:]
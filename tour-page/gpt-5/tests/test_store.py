@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import random
+import sqlite3
+from typing import get_args
+
+import pytest
+
+from app.catalog import DATA_PATH, Catalog, content_version
+from app.indexes import PlannerIndex
+from app.models import BudgetLevel, MobilityPref
+from app.planner import PlannerConfig, render_plan_json
+from app.records import parse_records
+from app.store import SCHEMA_VERSION, PlaceStore, SqlPlannerIndex, import_places, patch_places
+from app.utils import haversine_km
+from benchmarks.synth import iter_places
+
+SHAPES = [(m, b) for m in get_args(MobilityPref) for b in get_args(BudgetLevel)]
+
+
+def ids(places):
+    return [p.id for p in places]
+
+
+def untimed(body: bytes):
+    """A rendered plan without its solver timings."""
+
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k != "solver_ms"}
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+
+    return strip(json.loads(body))
+
+
+@pytest.fixture(params=["bundled", "synthetic"])
+def catalogs(request, tmp_path):
+    """The same places as a JSON index and as a SQLite index."""
+    if request.param == "bundled":
+        raw = DATA_PATH.read_bytes()
+    else:
+        raw = json.dumps(list(iter_places(1500, 12, seed=9))).encode("utf-8")
+    json_path = tmp_path / "places.json"
+    json_path.write_bytes(raw)
+    db = import_places(parse_records(raw), tmp_path / "places.db", content_version(raw))
+    return json_path, db
+
+
+def test_sql_views_match_json(catalogs):
+    json_path, db = catalogs
+    memory = PlannerIndex(parse_records(json_path.read_bytes()))
+    sql = SqlPlannerIndex(PlaceStore(db))
+    assert ids(sql.usable) == ids(memory.usable)
+    for shape in SHAPES:
+        a, b = memory.views[shape], sql.views[shape]
+        assert ids(b.places) == ids(a.places)
+        assert b.ranked == a.ranked
+        assert list(b.cities) == list(a.cities)
+        for city, entry in a.cities.items():
+            other = b.cities[city]
+            assert other.center == entry.center
+            assert ids(other.places) == ids(entry.places)
+            assert ids(other.candidates) == ids(entry.candidates)
+            assert ids(other.rainy) == ids(entry.rainy)
+            assert other.indoor == entry.indoor
+
+
+def test_sql_proximity_matches_json(catalogs):
+    json_path, db = catalogs
+    memory = PlannerIndex(parse_records(json_path.read_bytes()))
+    sql = SqlPlannerIndex(PlaceStore(db))
+    r = random.Random(4)
+    for shape in SHAPES:
+        a, b = memory.views[shape], sql.views[shape]
+        for city, entry in a.cities.items():
+            places = list(entry.places)
+            for _ in range(5):
+                here = r.choice(places)
+                lat, lon = here.lat + r.uniform(-0.05, 0.05), here.lon + r.uniform(-0.05, 0.05)
+                for radius in (0.5, 2.0, 10.0, 200.0):
+                    expected = [(d, p.id) for d, p in memory.within(a, city, lat, lon, radius)]
+                    assert [(d, p.id) for d, p in sql.within(b, city, lat, lon, radius)] == expected
+                visited = {p.id for p in r.sample(places, r.randrange(len(places)))}
+                found = memory.nearest_unvisited(a, city, lat, lon, visited)
+                other = sql.nearest_unvisited(b, city, lat, lon, visited)
+                assert (other and other.id) == (found and found.id)
+
+
+@pytest.mark.parametrize("options", [{}, {"allocator": "global"}, {"weather": ("rain", "mixed")}])
+def test_sql_plans_match_json(catalogs, options):
+    json_path, db = catalogs
+    from_json = Catalog(json_path, check_interval=-1).snapshot()
+    from_sql = Catalog(json_path, check_interval=-1, db_path=db).snapshot()
+    assert from_sql.source == "sqlite"
+    for mobility, budget in SHAPES:
+        cfg = PlannerConfig(budget_level=budget, mobility=mobility, seed=7, lang="en", **options)
+        assert untimed(render_plan_json(5, cfg, from_sql)) == untimed(render_plan_json(5, cfg, from_json))
+
+
+def test_within_matches_brute_force_across_the_globe(tmp_path):
+    # Points around the antimeridian and the poles, where lat/lon boxes wrap
+    r = random.Random(2)
+    raw = []
+    for i in range(600):
+        lat, lon = r.choice(
+            [
+                (r.uniform(-60, 60), r.choice((-1, 1)) * r.uniform(178, 180)),
+                (r.choice((-1, 1)) * r.uniform(85, 90), r.uniform(-180, 180)),
+                (r.uniform(-90, 90), r.uniform(-180, 180)),
+            ]
+        )
+        raw.append({**next(iter_places(1, 1, seed=i)), "id": f"g{i}", "lat": lat, "lon": lon})
+    places = parse_records(json.dumps(raw).encode("utf-8"))
+    store = PlaceStore(import_places(places, tmp_path / "globe.db", "v"))
+    queries = [(p.lat, p.lon) for p in r.sample(places, 20)]
+    queries += [(90.0, 0.0), (-90.0, 45.0), (0.0, 180.0), (10.0, -180.0), (89.9, 179.9), (-30.0, -179.99)]
+    for lat, lon in queries:
+        for radius in (1.0, 50.0, 500.0, 3000.0, 20_100.0):
+            expected = sorted(
+                (haversine_km(lat, lon, p.lat, p.lon), p.seq, p.id)
+                for p in places
+                if haversine_km(lat, lon, p.lat, p.lon) <= radius
+            )
+            assert [(d, p.seq, p.id) for d, p in store.within(lat, lon, radius)] == expected
+
+
+def test_patch_keeps_the_rtree_in_sync(tmp_path):
+    raw = json.dumps(list(iter_places(50, 2, seed=1))).encode("utf-8")
+    places = parse_records(raw)
+    db = import_places(places, tmp_path / "places.db", "v1")
+    moved = parse_records(json.dumps([{**places[0].as_dict(), "lat": 10.0, "lon": 20.0}]).encode("utf-8"))[0]
+    added = parse_records(json.dumps([{**places[1].as_dict(), "id": "new", "lat": -10.0, "lon": -20.0}]).encode())[0]
+    patch_places(db, [places[2].id], [moved, added], "v2")
+    store = PlaceStore(db)
+    assert [p.id for _, p in store.within(10.0, 20.0, 1.0)] == [places[0].id]
+    assert [p.id for _, p in store.within(-10.0, -20.0, 1.0)] == ["new"]
+    assert places[2].id not in {p.id for _, p in store.within(places[2].lat, places[2].lon, 50.0)}
+    assert places[0].id not in {p.id for _, p in store.within(places[0].lat, places[0].lon, 50.0)}
+
+
+def test_older_schema_is_rejected(tmp_path):
+    db = import_places(parse_records(DATA_PATH.read_bytes()), tmp_path / "places.db", "v")
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'schema'", (str(SCHEMA_VERSION - 1),))
+    with pytest.raises(ValueError, match="schema"):
+        PlaceStore(db)
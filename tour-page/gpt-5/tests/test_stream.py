@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import main
+from app.executor import PlanExecutor
+from app.models import MAX_DAYS
+
+
+def untimed(value):
+    """A decoded plan without its solver timings."""
+    if isinstance(value, dict):
+        return {k: untimed(v) for k, v in value.items() if k != "solver_ms"}
+    if isinstance(value, list):
+        return [untimed(v) for v in value]
+    return value
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Two workers, so days are computed ahead and have to be put back in order
+    executor = PlanExecutor("thread", 2, 4, 30)
+    monkeypatch.setattr(main, "executor", executor)
+    yield executor
+    executor.shutdown()
+
+
+async def fetch(body):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        streamed = await client.post("/api/plan/stream", json=body)
+        whole = await client.post("/api/plan", json=body)
+    return streamed, whole
+
+
+@pytest.mark.parametrize("options", [{}, {"allocator": "global"}, {"weather": "rain,dry,mixed"}])
+def test_streamed_days_match_the_plan(pool, options):
+    body = {"days": 5, "budget_level": "comfort", "seed": 3, "lang": "en", **options}
+    streamed, whole = asyncio.run(fetch(body))
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    plan = whole.json()
+    assert lines[0]["event"] == "start"
+    assert lines[0]["days_requested"] == 5
+    days = [line["plan"] for line in lines[1:-1]]
+    assert [line["event"] for line in lines[1:-1]] == ["day"] * len(days)
+    assert untimed(days) == untimed(plan["days"])
+    end = lines[-1]
+    assert end["event"] == "end"
+    assert end["days"] == len(days)
+    assert end["total_budget_rub"] == plan["total_budget_rub"]
+    assert end.get("message") == plan["message"]
+    assert untimed(end.get("allocation")) == untimed(plan["allocation"])
+
+
+def test_longest_trip_streams(pool):
+    streamed, whole = asyncio.run(fetch({"days": MAX_DAYS, "budget_level": "comfort"}))
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert lines[-1]["event"] == "end"
+    assert lines[-1]["days"] == len(whole.json()["days"])
+
+
+def test_failed_day_ends_the_stream(pool, monkeypatch):
+    render = main.render_day_json
+
+    def fail_on_third(day, *args):
+        if day == 3:
+            raise RuntimeError("boom")
+        return render(day, *args)
+
+    monkeypatch.setattr(main, "render_day_json", fail_on_third)
+    streamed, _ = asyncio.run(fetch({"days": 5, "budget_level": "comfort"}))
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [line["event"] for line in lines] == ["start", "day", "day", "error"]
+    assert [line["plan"]["day"] for line in lines[1:3]] == [1, 2]
+    assert lines[-1]["day"] == 3
+    assert lines[-1]["ok"] is False
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import json
+import os
+import stat
+
+import pytest
+
+from app.catalog import DATA_PATH, content_version
+from app.config import app_cache_dir, check_owner, private_dir
+from app.indexes import PlannerIndex
+from app.records import parse_records
+from app.travel import MATRIX_TOP, PROFILES, TravelTables, build_city_matrix
+from benchmarks.synth import iter_places
+
+POSIX = hasattr(os, "getuid")
+
+
+def matrices(table):
+    return {key: (m.km, m.minutes) for key, m in table.cities.items()}
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    raw = json.dumps(list(iter_places(400, 5, seed=2))).encode("utf-8")
+    return content_version(raw), PlannerIndex(parse_records(raw))
+
+
+def test_tables_are_persisted_and_loaded(catalog, tmp_path):
+    version, index = catalog
+    built = TravelTables(version, index, tmp_path).table("car")
+    path = tmp_path / f"travel-{version}-car.tpm"
+    assert path.exists()
+    loaded = TravelTables(version, index, tmp_path).table("car")
+    assert loaded is not built
+    assert matrices(loaded) == matrices(built)
+
+
+def test_tables_match_the_matrices_built_on_the_fly(catalog):
+    version, index = catalog
+    tables = TravelTables(version, index, None)
+    for name in PROFILES:
+        table = tables.table(name)
+        view = index.view("normal", "comfort")
+        for entry in view.cities.values():
+            picks = [0, 2, 1][: len(entry.candidates)]
+            fresh = build_city_matrix(entry, picks, PROFILES[name])
+            assert table.day_matrix(view, entry, picks) == (fresh.km, fresh.minutes)
+            # Deeper than the stored candidates: computed on the fly
+            deep = [min(MATRIX_TOP, len(entry.candidates) - 1)]
+            fresh = build_city_matrix(entry, deep, PROFILES[name])
+            assert table.day_matrix(view, entry, deep) == (fresh.km, fresh.minutes)
+    with pytest.raises(ValueError):
+        tables.table("bicycle")
+
+
+def test_slower_profiles_take_longer(catalog):
+    version, index = catalog
+    tables = TravelTables(version, index, None)
+    key = next(iter(tables.table("car").cities))
+    car, slow = tables.table("car").cities[key], tables.table("accessible").cities[key]
+    assert car.km == slow.km
+    assert all(a <= b for row_a, row_b in zip(car.minutes, slow.minutes) for a, b in zip(row_a, row_b))
+
+
+def test_other_versions_and_corrupt_files_are_rebuilt(catalog, tmp_path, caplog):
+    version, index = catalog
+    expected = matrices(TravelTables(version, index, None).table("car"))
+    path = tmp_path / f"travel-{version}-car.tpm"
+    # A file written for another catalog version under this name
+    TravelTables("0" * 16, index, tmp_path).table("car")
+    os.replace(tmp_path / f"travel-{'0' * 16}-car.tpm", path)
+    assert matrices(TravelTables(version, index, tmp_path).table("car")) == expected
+    assert "another catalog version" in caplog.text
+    path.write_bytes(path.read_bytes()[:100])
+    assert matrices(TravelTables(version, index, tmp_path).table("car")) == expected
+
+
+@pytest.mark.skipif(not POSIX, reason="POSIX permissions")
+def test_cache_directories_are_private(tmp_path):
+    created = private_dir(tmp_path / "a" / "cache")
+    assert stat.S_IMODE(created.stat().st_mode) & 0o077 == 0
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        private_dir(shared)
+    assert os.path.basename(app_cache_dir(str(DATA_PATH), "travel")) == f".tourplanner-{os.getuid()}-travel"
+
+
+@pytest.mark.skipif(not POSIX or os.getuid() != 0, reason="needs to hand a file to another user")
+def test_foreign_files_are_refused(catalog, tmp_path):
+    version, index = catalog
+    foreign = tmp_path / "foreign"
+    foreign.mkdir(mode=0o700)
+    os.chown(foreign, 12345, -1)
+    with pytest.raises(PermissionError):
+        private_dir(foreign)
+    # A matrix file for this version and profile, with other contents, left by another user
+    other = PlannerIndex(parse_records(json.dumps(list(iter_places(400, 5, seed=3))).encode("utf-8")))
+    TravelTables(version, other, tmp_path).table("car")
+    path = tmp_path / f"travel-{version}-car.tpm"
+    os.chown(path, 12345, -1)
+    with pytest.raises(PermissionError):
+        check_owner(path)
+    expected = matrices(TravelTables(version, index, None).table("car"))
+    assert matrices(TravelTables(version, index, tmp_path).table("car")) == expected
+
+
+@pytest.mark.skipif(not POSIX, reason="POSIX permissions")
+def test_shared_directory_is_not_used(catalog, tmp_path):
+    version, index = catalog
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    table = TravelTables(version, index, shared).table("car")
+    assert table.cities
+    assert list(shared.iterdir()) == []
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from app import utils
+from app.utils import haversine_km, haversine_km_many, haversine_matrix_km, minutes_from_km, minutes_from_km_many
+
+
+@pytest.fixture(params=["numpy", "python"])
+def kernels(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(utils, "np", None)
+    elif not utils.HAS_NUMPY:
+        pytest.skip("numpy is not installed")
+    return request.param
+
+
+def coords(n, seed=0):
+    r = random.Random(seed)
+    return [r.uniform(-90, 90) for _ in range(n)], [r.uniform(-180, 180) for _ in range(n)]
+
+
+def test_one_to_many_matches_the_scalar_formula(kernels):
+    lats, lons = coords(200)
+    got = haversine_km_many(59.9391, 30.3158, lats, lons)
+    expected = [haversine_km(59.9391, 30.3158, la, lo) for la, lo in zip(lats, lons)]
+    assert [float(d) for d in got] == pytest.approx(expected, rel=1e-12, abs=1e-9)
+
+
+def test_matrix_matches_the_scalar_formula(kernels):
+    lats1, lons1 = coords(30, seed=1)
+    lats2, lons2 = coords(20, seed=2)
+    got = haversine_matrix_km(lats1, lons1, lats2, lons2)
+    assert len(got) == 30 and len(got[0]) == 20
+    for i, (a, b) in enumerate(zip(lats1, lons1)):
+        expected = [haversine_km(a, b, c, d) for c, d in zip(lats2, lons2)]
+        assert [float(d) for d in got[i]] == pytest.approx(expected, rel=1e-12, abs=1e-9)
+
+
+def test_float32_stays_within_a_metre_at_city_scale():
+    if not utils.HAS_NUMPY:
+        pytest.skip("numpy is not installed")
+    r = random.Random(3)
+    lats = [r.uniform(59.8, 60.1) for _ in range(100)]
+    lons = [r.uniform(30.1, 30.5) for _ in range(100)]
+    got = haversine_matrix_km(lats, lons, lats, lons, precision="float32")
+    exact = haversine_matrix_km(lats, lons, lats, lons)
+    assert abs(got - exact).max() < 1e-3
+
+
+@pytest.mark.parametrize("speed", [55.0, 30.0, 0.0])
+def test_minutes_round_like_the_scalar_version(kernels, speed):
+    # Exact halves included: both round half to even
+    distances = [0.0, 0.1, 4.0, 27.5, 55.0 / 120, 1000.0] + [d / 7 for d in range(200)]
+    assert minutes_from_km_many(distances, speed) == [minutes_from_km(d, speed) for d in distances]